@@ -0,0 +1,237 @@
+\
+import os
+import json
+import time
+import shutil
+import hashlib
+import resource
+import threading
+from dataclasses import asdict
+
+import typer
+from rich import box
+from rich.console import Console
+from rich.table import Table
+
+from bench.synth import SynthSpec, generate
+from bench.stubs import StubServer, GitDaemon
+from src.clients.bitbucket_server import BitbucketServerClient
+from src.clients.gitflic import GitFlicClient
+from src.core.discovery import discover_targets, build_work_queue
+from src.core.migrator import migrate_repositories
+from src.core.metrics import TIMED_STAGES
+from src.core.workdir import dir_size
+from src.core.utils import human_bytes
+
+PROJECT_KEY = "BENCH"
+
+# Метрики, которые сравниваются с прошлым прогоном (--compare); True — больше лучше
+COMPARED = {
+    "repos_per_min": True,
+    "mib_per_s": True,
+    "wall_s": False,
+    "peak_rss_mib": False,
+    "peak_rss_git_mib": False,
+    "peak_disk_bytes": False,
+}
+
+app = typer.Typer(help="Бенчмарк bb2gf migrate на локальных заглушках Bitbucket/GitFlic", add_completion=False)
+console = Console()
+
+
+class DiskSampler:
+    """Пиковый объём каталога: замер раз в interval секунд в фоновом потоке."""
+
+    def __init__(self, path: str, interval: float = 0.5) -> None:
+        self.path = path
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="bench-disk", daemon=True)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        if os.path.isdir(self.path):
+            self.peak = max(self.peak, dir_size(self.path))
+
+    def __enter__(self) -> "DiskSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+def _spec_dir(data_dir: str, spec: SynthSpec) -> str:
+    digest = hashlib.sha1(json.dumps(asdict(spec), sort_keys=True).encode()).hexdigest()[:10]
+    return os.path.join(data_dir, f"synth-{digest}")
+
+
+def _maxrss_mib(who: int) -> float:
+    # ru_maxrss в Linux — КиБ
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+@app.command()
+def run(
+    repos: int = typer.Option(20, help="Число синтетических репозиториев"),
+    depth: int = typer.Option(50, help="Коммитов в истории каждого репозитория"),
+    refs: int = typer.Option(10, help="Дополнительных веток и тегов на репозиторий"),
+    file_kb: int = typer.Option(16, help="Объём изменений в коммите, КиБ (случайные, несжимаемые данные)"),
+    lfs_mb: float = typer.Option(0.0, help="LFS-объектов на репозиторий, МиБ (нужен git-lfs)"),
+    lfs_object_mb: float = typer.Option(1.0, help="Размер одного LFS-объекта, МиБ"),
+    jobs: int = typer.Option(4, "--jobs", "-j", help="Параллельных репозиториев (fetch и push)"),
+    transport: str = typer.Option("file", help="Доставка git: file (file://) или daemon (git daemon, git://)"),
+    transfer: str = typer.Option("mirror", help="Способ переноса мигратора: mirror или relay"),
+    push_batch: int = typer.Option(0, help="Пушить refs порциями такого размера (0 — push --mirror)"),
+    api_latency: float = typer.Option(0.0, help="Искусственная задержка ответов API, с"),
+    data_dir: str = typer.Option("/tmp/bb2gf-bench", help="Каталог данных бенчмарка (синтетика кэшируется)"),
+    out: str = typer.Option(None, help="Сохранить результат в JSON-файл"),
+    compare: str = typer.Option(None, help="JSON прошлого прогона для сравнения"),
+    seed: int = typer.Option(42, help="Seed генератора"),
+):
+    """Генерирует репозитории, поднимает заглушки и прогоняет migrate_repositories."""
+    if transport not in ("file", "daemon"):
+        raise typer.BadParameter("transport: file или daemon")
+    spec = SynthSpec(
+        repos=repos, depth=depth, refs=refs, file_kb=file_kb,
+        lfs_mb=lfs_mb, lfs_object_mb=lfs_object_mb, seed=seed,
+    )
+    data_dir = os.path.abspath(data_dir)
+    src_root = _spec_dir(data_dir, spec)
+    run_dir = os.path.join(data_dir, "run")
+    shutil.rmtree(run_dir, ignore_errors=True)
+    dst_root, workdir = os.path.join(run_dir, "gf"), os.path.join(run_dir, "work")
+    os.makedirs(dst_root)
+
+    t0 = time.perf_counter()
+    with console.status("Генерация синтетических репозиториев..."):
+        generated = generate(src_root, PROJECT_KEY, spec)
+    console.print(f"Синтетика: {len(generated)} репозиториев в {src_root} ({time.perf_counter() - t0:.1f} c)")
+    src_bytes = sum(dir_size(g["path"]) for g in generated)
+
+    daemon = GitDaemon(data_dir).start() if transport == "daemon" else None
+    stub = StubServer(
+        src_root, dst_root, data_dir,
+        git_base=daemon.url if daemon else None, api_latency=api_latency,
+    ).start()
+    cwd = os.getcwd()
+    os.chdir(run_dir)  # report.json мигратора пишется в текущий каталог
+    try:
+        started = time.perf_counter()
+        discovered = discover_targets(
+            [(stub.url, PROJECT_KEY)],
+            lambda base: BitbucketServerClient(base, auth_type="TOKEN", token="bench"),
+            global_owner_alias="bench",
+        )
+        work = build_work_queue(discovered)
+        discovery_s = time.perf_counter() - started
+        with DiskSampler(workdir) as disk:
+            summary = migrate_repositories(
+                repos=work,
+                owner_alias="bench",
+                owner_type="TEAM",
+                visibility_private=True,
+                language_default=None,
+                use_ssh=False,
+                dry_run=False,
+                workdir=workdir,
+                keep_clones=False,
+                bb_client=None,
+                gf_client=GitFlicClient(stub.url, "bench"),
+                gf_git_user=None,
+                gf_git_pass=None,
+                bb_git_user=None,
+                bb_git_pass=None,
+                jobs=jobs,
+                transfer=transfer,
+                push_batch=push_batch or None,
+            )
+        wall_s = time.perf_counter() - started
+    finally:
+        os.chdir(cwd)
+        stub.stop()
+        if daemon:
+            daemon.stop()
+
+    items = summary["items"]
+    ok = sum(1 for it in items if it.get("status") == "OK")
+    lfs_bytes = sum(g["lfs_bytes"] for g in generated)
+    stages = {s: round(sum((it.get("timings_s") or {}).get(s, 0.0) for it in items), 2) for s in TIMED_STAGES}
+    result = {
+        "spec": asdict(spec),
+        "jobs": jobs,
+        "transport": transport,
+        "transfer": transfer,
+        "push_batch": push_batch,
+        "repos_ok": ok,
+        "repos_failed": sum(1 for it in items if it.get("status") == "FAILED"),
+        "src_bytes": src_bytes,
+        "lfs_bytes": lfs_bytes,
+        "wall_s": round(wall_s, 2),
+        "discovery_s": round(discovery_s, 2),
+        "repos_per_min": round(ok / wall_s * 60, 1) if wall_s else 0.0,
+        "mib_per_s": round(src_bytes / 1024 / 1024 / wall_s, 2) if wall_s else 0.0,
+        "peak_rss_mib": _maxrss_mib(resource.RUSAGE_SELF),
+        "peak_rss_git_mib": _maxrss_mib(resource.RUSAGE_CHILDREN),
+        "peak_disk_bytes": disk.peak,
+        "api_requests": stub.requests,
+        "stages_s": stages,
+    }
+    print_result(result, load_result(compare) if compare else None)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        console.print(f"[green]Результат сохранён[/green]: {out}")
+    if result["repos_failed"]:
+        raise typer.Exit(1)
+
+
+def load_result(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_result(result: dict, previous: dict | None = None) -> None:
+    tbl = Table(title="Результат бенчмарка", box=box.SIMPLE_HEAVY)
+    tbl.add_column("Метрика")
+    tbl.add_column("Значение", justify="right")
+    if previous:
+        tbl.add_column("Было", justify="right")
+        tbl.add_column("Изменение", justify="right")
+
+    def fmt(key: str, value) -> str:
+        return human_bytes(value) if key.endswith("_bytes") else str(value)
+
+    for key in ("repos_ok", "repos_failed", "src_bytes", "lfs_bytes", "wall_s", "discovery_s",
+                "repos_per_min", "mib_per_s", "peak_rss_mib", "peak_rss_git_mib", "peak_disk_bytes", "api_requests"):
+        row = [key, fmt(key, result[key])]
+        if previous:
+            before = previous.get(key)
+            row.append(fmt(key, before) if before is not None else "—")
+            if key in COMPARED and before:
+                change = (result[key] - before) / before
+                better = (change > 0) == COMPARED[key]
+                color = "green" if better or change == 0 else "red"
+                row.append(f"[{color}]{change:+.1%}[/{color}]")
+            else:
+                row.append("")
+        tbl.add_row(*row)
+    console.print(tbl)
+    stages = Table(title="Время по этапам (сумма по репозиториям), с", box=box.SIMPLE)
+    for stage in result["stages_s"]:
+        stages.add_column(stage, justify="right")
+    stages.add_row(*(str(v) for v in result["stages_s"].values()))
+    console.print(stages)
+    if previous and previous.get("spec") != result["spec"]:
+        console.print("[yellow]Спецификация синтетики отличается от сравниваемого прогона[/yellow]")
+
+
+if __name__ == "__main__":
+    app()
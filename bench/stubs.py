@@ -0,0 +1,189 @@
+\
+import os
+import json
+import time
+import shutil
+import socket
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Локальные заменители серверов для бенчмарка:
+# - Bitbucket REST: /rest/api/1.0/projects/{key}/repos (постранично) и /projects/{key}/repos/{slug}/sizes;
+# - GitFlic REST: POST /project, GET /project/{owner}/{alias}, GET /team/{owner}/project;
+# - git: bare-репозитории по file:// или через git daemon (git://).
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, fn)) for fn in files)
+    return total
+
+
+class StubServer:
+    """
+    HTTP-заглушка Bitbucket + GitFlic в отдельном потоке.
+    src_root — <src_root>/<PROJECT_KEY>/<slug>.git, dst_root — сюда создаются проекты GitFlic
+    (<dst_root>/<owner>/<alias>.git); оба каталога лежат внутри git_root.
+    git_base — префикс clone/push URL для git_root: по умолчанию file://<git_root>,
+    для git daemon — git://127.0.0.1:<port>. api_latency — задержка каждого ответа API, с.
+    """
+
+    def __init__(self, src_root: str, dst_root: str, git_root: str, git_base: str | None = None,
+                 page_size: int = 25, api_latency: float = 0.0) -> None:
+        self.src_root = os.path.abspath(src_root)
+        self.dst_root = os.path.abspath(dst_root)
+        self.git_root = os.path.abspath(git_root)
+        self.git_base = (git_base or f"file://{self.git_root}").rstrip("/")
+        self.page_size = page_size
+        self.api_latency = api_latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="bench-stub", daemon=True)
+
+    def _git_url(self, path: str) -> str:
+        rel = os.path.relpath(path, self.git_root)
+        return f"{self.git_base}/{rel}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code: int, obj):
+                body = json.dumps(obj).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _enter(self):
+                with stub._lock:
+                    stub.requests += 1
+                if stub.api_latency:
+                    time.sleep(stub.api_latency)
+
+            def do_GET(self):
+                self._enter()
+                u = urlparse(self.path)
+                q = parse_qs(u.query)
+                parts = u.path.strip("/").split("/")
+                # /rest/api/1.0/projects/{key}/repos
+                if parts[:3] == ["rest", "api", "1.0"] and len(parts) == 6 and parts[5] == "repos":
+                    return self._repos(parts[4], int(q.get("start", [0])[0]), int(q.get("limit", [stub.page_size])[0]))
+                # /projects/{key}/repos/{slug}/sizes
+                if len(parts) == 5 and parts[0] == "projects" and parts[4] == "sizes":
+                    path = os.path.join(stub.src_root, parts[1], f"{parts[3]}.git")
+                    if not os.path.isdir(path):
+                        return self._send(404, {})
+                    return self._send(200, {"repository": _dir_bytes(path), "attachments": 0})
+                # /team/{owner}/project
+                if len(parts) == 3 and parts[0] in ("team", "company") and parts[2] == "project":
+                    owner_dir = os.path.join(stub.dst_root, parts[1])
+                    names = sorted(n[:-4] for n in os.listdir(owner_dir)) if os.path.isdir(owner_dir) else []
+                    page, size = int(q.get("page", [0])[0]), int(q.get("size", [100])[0])
+                    items = [self._project(parts[1], n) for n in names[page * size:(page + 1) * size]]
+                    total_pages = (len(names) + size - 1) // size
+                    return self._send(200, {"_embedded": {"projectList": items}, "page": {"totalPages": total_pages}})
+                # /project/{owner}/{alias}
+                if len(parts) == 3 and parts[0] == "project":
+                    if os.path.isdir(os.path.join(stub.dst_root, parts[1], f"{parts[2]}.git")):
+                        return self._send(200, self._project(parts[1], parts[2]))
+                return self._send(404, {"errors": [{"message": "not found"}]})
+
+            def do_POST(self):
+                self._enter()
+                if urlparse(self.path).path.rstrip("/") != "/project":
+                    return self._send(404, {})
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                owner, alias = payload["ownerAlias"], payload["alias"]
+                path = os.path.join(stub.dst_root, owner, f"{alias}.git")
+                if os.path.isdir(path):
+                    return self._send(409, {"message": "Проект с таким alias уже существует"})
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                subprocess.run(["git", "init", "-q", "--bare", path], check=True)
+                return self._send(200, self._project(owner, alias))
+
+            def _project(self, owner: str, alias: str) -> dict:
+                url = stub._git_url(os.path.join(stub.dst_root, owner, f"{alias}.git"))
+                return {"alias": alias, "ownerAlias": owner, "httpTransportUrl": url, "sshTransportUrl": url}
+
+            def _repos(self, key: str, start: int, limit: int):
+                project_dir = os.path.join(stub.src_root, key)
+                names = sorted(n[:-4] for n in os.listdir(project_dir) if n.endswith(".git")) if os.path.isdir(project_dir) else []
+                page = names[start:start + limit]
+                values = [
+                    {
+                        "slug": n,
+                        "name": n,
+                        "description": "bench",
+                        "links": {"clone": [{"name": "http", "href": stub._git_url(os.path.join(project_dir, f"{n}.git"))}]},
+                    }
+                    for n in page
+                ]
+                last = start + limit >= len(names)
+                return self._send(200, {"values": values, "isLastPage": last, "nextPageStart": start + limit})
+
+        return Handler
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class GitDaemon:
+    """git daemon над общим корнем (clone и push), URL вида git://127.0.0.1:<port>/<путь>."""
+
+    def __init__(self, base_path: str) -> None:
+        self.base_path = os.path.abspath(base_path)
+        self.port = free_port()
+        self.url = f"git://127.0.0.1:{self.port}"
+        self._proc: subprocess.Popen | None = None
+
+    def start(self) -> "GitDaemon":
+        if shutil.which("git") is None:
+            raise RuntimeError("git не найден")
+        self._proc = subprocess.Popen(
+            [
+                "git", "daemon", "--reuseaddr", "--export-all", "--enable=receive-pack",
+                f"--base-path={self.base_path}", f"--port={self.port}", "--listen=127.0.0.1",
+                self.base_path,
+            ],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            with socket.socket() as s:
+                if s.connect_ex(("127.0.0.1", self.port)) == 0:
+                    return self
+            time.sleep(0.05)
+        self.stop()
+        raise RuntimeError("git daemon не запустился")
+
+    def stop(self) -> None:
+        if self._proc is not None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+            self._proc = None
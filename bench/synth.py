@@ -0,0 +1,110 @@
+\
+import os
+import random
+import shutil
+import hashlib
+import subprocess
+from dataclasses import dataclass
+from typing import Dict, List
+
+# Синтетические репозитории для бенчмарка: история через git fast-import,
+# LFS-объекты — в <repo>.git/lfs/objects (так их отдаёт git-lfs для file://)
+
+
+@dataclass
+class SynthSpec:
+    repos: int = 20
+    depth: int = 50              # коммитов в истории
+    refs: int = 10               # дополнительных веток и тегов (пополам)
+    file_kb: int = 16            # объём изменений в каждом коммите, КиБ
+    lfs_mb: float = 0.0          # LFS-объектов на репозиторий, МиБ
+    lfs_object_mb: float = 1.0   # размер одного LFS-объекта, МиБ
+    seed: int = 42
+
+
+def _lfs_pointer(oid: str, size: int) -> bytes:
+    return f"version https://git-lfs.github.com/spec/v1\noid sha256:{oid}\nsize {size}\n".encode()
+
+
+def _fast_import_stream(spec: SynthSpec, rng: random.Random, lfs_objects: Dict[str, bytes]) -> bytes:
+    out: List[bytes] = []
+
+    def data(payload: bytes):
+        out.append(f"data {len(payload)}\n".encode())
+        out.append(payload)
+        out.append(b"\n")
+
+    ts = 1_600_000_000
+    for i in range(1, spec.depth + 1):
+        out.append(f"blob\nmark :{i * 2}\n".encode())
+        data(rng.randbytes(spec.file_kb * 1024))
+        out.append(f"commit refs/heads/main\nmark :{i * 2 + 1}\n".encode())
+        out.append(f"committer Bench <bench@example.com> {ts + i * 60} +0000\n".encode())
+        data(f"commit {i}".encode())
+        if i > 1:
+            out.append(f"from :{(i - 1) * 2 + 1}\n".encode())
+        out.append(f"M 100644 :{i * 2} data/file_{i % 10}.bin\n".encode())
+        if i == spec.depth and lfs_objects:
+            attrs = b"*.lfs filter=lfs diff=lfs merge=lfs -text\n"
+            out.append(b"M 100644 inline .gitattributes\n")
+            data(attrs)
+            for n, (oid, blob) in enumerate(lfs_objects.items()):
+                out.append(f"M 100644 inline assets/object_{n}.lfs\n".encode())
+                data(_lfs_pointer(oid, len(blob)))
+    for j in range(spec.refs):
+        mark = rng.randint(1, spec.depth) * 2 + 1
+        ref = f"refs/heads/feature/{j}" if j % 2 == 0 else f"refs/tags/v{j}"
+        out.append(f"reset {ref}\nfrom :{mark}\n\n".encode())
+    return b"".join(out)
+
+
+def make_repo(path: str, spec: SynthSpec, rng: random.Random) -> int:
+    """Создаёт bare-репозиторий по спецификации; возвращает объём LFS-объектов в байтах."""
+    subprocess.run(["git", "init", "-q", "--bare", "--initial-branch=main", path], check=True)
+    lfs_objects: Dict[str, bytes] = {}
+    if spec.lfs_mb > 0:
+        left = int(spec.lfs_mb * 1024 * 1024)
+        chunk = max(1, int(spec.lfs_object_mb * 1024 * 1024))
+        while left > 0:
+            blob = rng.randbytes(min(chunk, left))
+            lfs_objects[hashlib.sha256(blob).hexdigest()] = blob
+            left -= len(blob)
+    subprocess.run(
+        ["git", "fast-import", "--quiet"], cwd=path, check=True,
+        input=_fast_import_stream(spec, rng, lfs_objects),
+    )
+    for oid, blob in lfs_objects.items():
+        obj_dir = os.path.join(path, "lfs", "objects", oid[:2], oid[2:4])
+        os.makedirs(obj_dir, exist_ok=True)
+        with open(os.path.join(obj_dir, oid), "wb") as f:
+            f.write(blob)
+    return sum(len(b) for b in lfs_objects.values())
+
+
+def _lfs_size(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(os.path.join(path, "lfs", "objects")):
+        total += sum(os.path.getsize(os.path.join(root, fn)) for fn in files)
+    return total
+
+
+def generate(root: str, project_key: str, spec: SynthSpec) -> List[Dict]:
+    """Генерирует spec.repos репозиториев в <root>/<project_key>/; [{slug, path, lfs_bytes}]."""
+    rng = random.Random(spec.seed)
+    base = os.path.join(root, project_key)
+    os.makedirs(base, exist_ok=True)
+    repos = []
+    for i in range(spec.repos):
+        slug = f"repo-{i:04d}"
+        path = os.path.join(base, f"{slug}.git")
+        # повторный запуск с той же спецификацией переиспользует сгенерированное
+        if os.path.isdir(path):
+            lfs_bytes = _lfs_size(path)
+        else:
+            try:
+                lfs_bytes = make_repo(path, spec, rng)
+            except BaseException:
+                shutil.rmtree(path, ignore_errors=True)
+                raise
+        repos.append({"slug": slug, "path": path, "lfs_bytes": lfs_bytes})
+    return repos
@@ -1,7 +1,38 @@
 \
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
 import requests
-from tenacity import retry, wait_exponential, stop_after_attempt
+
+from src.clients.ratelimit import RateController
+
+try:
+    import httpx
+except ImportError:  # асинхронный клиент опционален: pip install "bb2gf[async]"
+    httpx = None
+
+
+def _parse_repo(it: dict, project_key: str) -> Dict:
+    """Элемент ответа /projects/{key}/repos → словарь репозитория для мигратора."""
+    name = it.get("name") or it.get("slug")
+    slug = it.get("slug")
+    desc = it.get("description") or ""
+    clone_http, clone_ssh = None, None
+    for link in it.get("links", {}).get("clone", []):
+        if link.get("name") == "http":
+            clone_http = link.get("href")
+        elif link.get("name") == "ssh":
+            clone_ssh = link.get("href")
+    return {
+        "id": it.get("id"),
+        "name": name,
+        "slug": slug,
+        "description": desc,
+        "clone_http": clone_http,
+        "clone_ssh": clone_ssh,
+        "project_key": project_key,
+    }
+
 
 class BitbucketServerClient:
     def __init__(
@@ -13,9 +44,12 @@ class BitbucketServerClient:
         token: str = "",
         verify: bool = True,
         ca_cert: Optional[str] = None,
+        rate: RateController | None = None,
     ) -> None:
         self.base = base_url.rstrip("/")
         self.api = f"{self.base}/rest/api/1.0"
+        # регулятор запросов общий для всех потоков, работающих с этим сервером
+        self.rate = rate or RateController(f"Bitbucket {self.base}")
         self.session = requests.Session()
         self.verify = ca_cert or verify  
         self.auth_type = auth_type.upper()
@@ -26,38 +60,143 @@ class BitbucketServerClient:
         else:
             raise ValueError("Unsupported BITBUCKET_AUTH_TYPE; use BASIC or TOKEN")
 
-    @retry(wait=wait_exponential(min=1, max=10), stop=stop_after_attempt(5))
     def _get(self, url: str, params: dict = None) -> requests.Response:
-        r = self.session.get(url, params=params or {}, timeout=30, verify=self.verify)
+        # повторы (429/503 с Retry-After, 5xx, сетевые сбои) — в RateController; 4xx сразу ошибка
+        r = self.rate.request(lambda: self.session.get(url, params=params or {}, timeout=30, verify=self.verify))
         r.raise_for_status()
         return r
 
-    def list_repositories(self, project_key: str) -> List[Dict]:
-        """Return a list of repositories with fields: name, slug, clone_http, clone_ssh, description"""
+    def repository_size(self, project_key: str, slug: str) -> Dict | None:
+        """
+        Размер репозитория из /projects/{key}/repos/{slug}/sizes (не REST API, но есть в Server/DC):
+        {"repository": байт git-данных, "attachments": байт вложений}. None, если недоступно.
+        Без повторов: 404/403 на старых версиях или без прав — нормальная ситуация.
+        """
+        url = f"{self.base}/projects/{project_key}/repos/{slug}/sizes"
+        try:
+            r = self.rate.request(lambda: self.session.get(url, timeout=30, verify=self.verify), attempts=1)
+            if r.status_code != 200:
+                return None
+            data = r.json()
+        except Exception:
+            return None
+        return {
+            "repository": int(data.get("repository") or 0),
+            "attachments": int(data.get("attachments") or 0),
+        }
+
+    def fill_sizes(self, repos: List[Dict], workers: int = 8) -> None:
+        """Проставляет size_bytes (git-данные + вложения) и size_detail; параллельно по репозиториям."""
+        def one(r: Dict):
+            sizes = self.repository_size(r["project_key"], r["slug"])
+            r["size_detail"] = sizes
+            r["size_bytes"] = (sizes["repository"] + sizes["attachments"]) if sizes else None
+
+        if not repos:
+            return
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(repos))), thread_name_prefix="bb-size") as pool:
+            list(pool.map(one, repos))
+
+    def list_repositories(self, project_key: str, with_sizes: bool = False) -> List[Dict]:
+        """
+        Return a list of repositories with fields: name, slug, clone_http, clone_ssh, description.
+        with_sizes=True also fills size_bytes / size_detail (see fill_sizes).
+        """
         results: List[Dict] = []
         start = 0
         while True:
             url = f"{self.api}/projects/{project_key}/repos"
             resp = self._get(url, params={"limit": 100, "start": start}).json()
             for it in resp.get("values", []):
-                name = it.get("name") or it.get("slug")
-                slug = it.get("slug")
-                desc = it.get("description") or ""
-                clone_http, clone_ssh = None, None
-                for link in it.get("links", {}).get("clone", []):
-                    if link.get("name") == "http":
-                        clone_http = link.get("href")
-                    elif link.get("name") == "ssh":
-                        clone_ssh = link.get("href")
-                results.append({
-                    "name": name,
-                    "slug": slug,
-                    "description": desc,
-                    "clone_http": clone_http,
-                    "clone_ssh": clone_ssh,
-                    "project_key": project_key,
-                })
+                results.append(_parse_repo(it, project_key))
             if resp.get("isLastPage", True):
                 break
             start = resp.get("nextPageStart", 0)
+        if with_sizes:
+            self.fill_sizes(results)
         return results
+
+
+class AsyncBitbucketServerClient:
+    """
+    Асинхронный вариант BitbucketServerClient (httpx) с явным пулом соединений и keep-alive.
+    Позволяет перекрывать сотни запросов к API без потока на каждый запрос.
+    Повторы и лимит запросов — в RateController, как у синхронного клиента (rate можно разделить).
+    Использование: async with AsyncBitbucketServerClient(...) as bb: ...
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        auth_type: str = "BASIC",
+        username: str = "",
+        password: str = "",
+        token: str = "",
+        verify: bool = True,
+        ca_cert: Optional[str] = None,
+        pool_size: int = 20,
+        keepalive_expiry: float = 30.0,
+        rate: RateController | None = None,
+        transport=None,
+    ) -> None:
+        if httpx is None:
+            raise RuntimeError('Для асинхронного клиента нужен httpx: pip install "bb2gf[async]"')
+        self.base = base_url.rstrip("/")
+        self.api = f"{self.base}/rest/api/1.0"
+        self.rate = rate or RateController(f"Bitbucket {self.base}")
+        self.auth_type = auth_type.upper()
+        auth, headers = None, {}
+        if self.auth_type == "BASIC":
+            auth = httpx.BasicAuth(username, password)
+        elif self.auth_type == "TOKEN":
+            headers["Authorization"] = f"Bearer {token}"
+        else:
+            raise ValueError("Unsupported BITBUCKET_AUTH_TYPE; use BASIC or TOKEN")
+        self.client = httpx.AsyncClient(
+            auth=auth,
+            headers=headers,
+            verify=ca_cert or verify,
+            timeout=30,
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            transport=transport,
+        )
+
+    async def __aenter__(self) -> "AsyncBitbucketServerClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def _get(self, url: str, params: dict = None) -> "httpx.Response":
+        # повторы 429/503, 5xx и сетевых сбоев — в RateController; 4xx сразу ошибка
+        r = await self.rate.arequest(
+            lambda: self.client.get(url, params=params or {}), errors=(httpx.TransportError,)
+        )
+        r.raise_for_status()
+        return r
+
+    async def list_repositories(self, project_key: str) -> List[Dict]:
+        """Асинхронный аналог BitbucketServerClient.list_repositories."""
+        results: List[Dict] = []
+        start = 0
+        while True:
+            url = f"{self.api}/projects/{project_key}/repos"
+            resp = (await self._get(url, params={"limit": 100, "start": start})).json()
+            for it in resp.get("values", []):
+                results.append(_parse_repo(it, project_key))
+            if resp.get("isLastPage", True):
+                break
+            start = resp.get("nextPageStart", 0)
+        return results
+
+    async def list_many(self, project_keys: List[str]) -> Dict[str, List[Dict]]:
+        """Листинг нескольких проектов одновременно через общий пул соединений."""
+        lists = await asyncio.gather(*(self.list_repositories(k) for k in project_keys))
+        return dict(zip(project_keys, lists))
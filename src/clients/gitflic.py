@@ -1,28 +1,150 @@
 \
-from typing import Dict, Tuple
+import asyncio
+from typing import Dict, List, Tuple
 import requests
-from tenacity import retry, wait_exponential, stop_after_attempt
+
+from src.clients.ratelimit import RateController
+
+try:
+    import httpx
+except ImportError:  # асинхронный клиент опционален: pip install "bb2gf[async]"
+    httpx = None
+
+
+def _response_data(r) -> dict | str:
+    try:
+        return r.json()
+    except Exception:
+        return r.text
 
 class GitFlicClient:
-    def __init__(self, base_url: str, api_token: str) -> None:
+    def __init__(self, base_url: str, api_token: str, rate: RateController | None = None) -> None:
         self.base = base_url.rstrip("/")
+        # повторы и ограничение параллелизма — в RateController (общий для всех потоков)
+        self.rate = rate or RateController("GitFlic API")
         self.session = requests.Session()
         self.session.headers.update({
             "Authorization": f"token {api_token}",
             "Content-Type": "application/json",
         })
 
-    @retry(wait=wait_exponential(min=1, max=10), stop=stop_after_attempt(5))
     def create_project(self, payload: Dict) -> Tuple[bool, int, dict | str]:
         """POST /project -> returns (ok, status_code, data or text)"""
         url = f"{self.base}/project"
-        r = self.session.post(url, json=payload, timeout=60)
+        r = self.rate.request(lambda: self.session.post(url, json=payload, timeout=60))
         if r.status_code == 200:
             return True, r.status_code, r.json()
         else:
             # return both status code and text for diagnostics
-            try:
-                data = r.json()
-            except Exception:
-                data = r.text
-            return False, r.status_code, data
+            return False, r.status_code, _response_data(r)
+
+    def get_project(self, owner_alias: str, alias: str) -> dict | None:
+        """GET /project/{ownerAlias}/{alias} -> данные проекта или None, если его нет"""
+        url = f"{self.base}/project/{owner_alias}/{alias}"
+        r = self.rate.request(lambda: self.session.get(url, timeout=60))
+        if r.status_code == 200:
+            return r.json()
+        if r.status_code in (403, 404):
+            return None
+        r.raise_for_status()
+        return None
+
+    def list_projects(self, owner_alias: str, owner_type: str, page_size: int = 100) -> List[dict]:
+        """
+        Все проекты команды или компании (GET /{team|company}/{ownerAlias}/project, постранично).
+        Исключение — если листинг недоступен (нет прав, старая версия API).
+        """
+        kind = "company" if (owner_type or "").upper() == "COMPANY" else "team"
+        url = f"{self.base}/{kind}/{owner_alias}/project"
+        projects: List[dict] = []
+        page = 0
+        while True:
+            r = self._get_page(url, page, page_size)
+            if r.status_code != 200:
+                raise RuntimeError(f"Листинг проектов {owner_alias}: HTTP {r.status_code}")
+            data = r.json()
+            chunk = _page_items(data)
+            projects.extend(chunk)
+            total_pages = (data.get("page") or {}).get("totalPages") if isinstance(data, dict) else None
+            page += 1
+            if not chunk or (total_pages is not None and page >= total_pages) or (
+                total_pages is None and len(chunk) < page_size
+            ):
+                return projects
+
+    def _get_page(self, url: str, page: int, size: int) -> requests.Response:
+        return self.rate.request(lambda: self.session.get(url, params={"page": page, "size": size}, timeout=60))
+
+
+def _page_items(data) -> List[dict]:
+    """Элементы страницы: HAL (_embedded.<имя списка>) или простой JSON-массив."""
+    if isinstance(data, list):
+        return data
+    embedded = (data or {}).get("_embedded") or {}
+    for value in embedded.values():
+        if isinstance(value, list):
+            return value
+    return []
+
+
+class AsyncGitFlicClient:
+    """
+    Асинхронный вариант GitFlicClient (httpx) с явным пулом соединений и keep-alive.
+    Повторы и лимит запросов — в RateController; передайте rate синхронного клиента,
+    чтобы оба клиента делили один лимит и автомат.
+    Использование: async with AsyncGitFlicClient(...) as gf: ...
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_token: str,
+        pool_size: int = 20,
+        keepalive_expiry: float = 30.0,
+        rate: RateController | None = None,
+        transport=None,
+    ) -> None:
+        if httpx is None:
+            raise RuntimeError('Для асинхронного клиента нужен httpx: pip install "bb2gf[async]"')
+        self.base = base_url.rstrip("/")
+        self.rate = rate or RateController("GitFlic API")
+        self.client = httpx.AsyncClient(
+            headers={
+                "Authorization": f"token {api_token}",
+                "Content-Type": "application/json",
+            },
+            timeout=60,
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            transport=transport,
+        )
+
+    async def __aenter__(self) -> "AsyncGitFlicClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def create_project(self, payload: Dict) -> Tuple[bool, int, dict | str]:
+        """POST /project -> returns (ok, status_code, data or text)"""
+        url = f"{self.base}/project"
+        r = await self.rate.arequest(lambda: self.client.post(url, json=payload), errors=(httpx.TransportError,))
+        if r.status_code == 200:
+            return True, r.status_code, r.json()
+        return False, r.status_code, _response_data(r)
+
+    async def create_projects(self, payloads: List[Dict], concurrency: int = 10) -> List[Tuple[bool, int, dict | str]]:
+        """Создаёт несколько проектов, не более concurrency запросов одновременно; порядок результатов = порядок payloads."""
+        sem = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(payload: Dict):
+            async with sem:
+                return await self.create_project(payload)
+
+        return list(await asyncio.gather(*(one(p) for p in payloads)))
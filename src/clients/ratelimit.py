@@ -0,0 +1,244 @@
+\
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable
+
+import requests
+
+# Коды, при которых сервер просит подождать (учитывается Retry-After)
+THROTTLE_CODES = (429, 503)
+
+# Как часто асинхронный запрос перепроверяет свободный слот, с
+ASYNC_POLL = 0.05
+
+
+class CircuitOpenError(RuntimeError):
+    """Сервер деградировал: автомат разомкнут дольше, чем готов ждать запрос."""
+
+
+def retry_after_seconds(value: str | None) -> float | None:
+    """Retry-After в секундах: число секунд или HTTP-дата; None — заголовка нет или он не разобран."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateController:
+    """
+    Общий для всех потоков регулятор запросов к одному API-серверу.
+    - Лимит одновременных запросов подстраивается по AIMD: растёт на 1/limit после
+      каждого быстрого успешного ответа и уменьшается вдвое при 429/503, ошибке 5xx,
+      сетевом сбое или ответе медленнее latency_target.
+    - Retry-After (429/503) приостанавливает все запросы к серверу, а не только упавший.
+    - После failure_threshold сбоев подряд автомат размыкается: запросы ждут cooldown,
+      затем проходит один пробный запрос (half-open); успех замыкает автомат.
+    - Повторяются только 429/503, 5xx и сетевые ошибки; 4xx возвращаются сразу.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        latency_target: float = 5.0,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+        max_attempts: int = 5,
+        max_wait: float = 600.0,
+    ) -> None:
+        self.name = name
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.min_concurrency = max(1, min(int(min_concurrency), self.max_concurrency))
+        self.latency_target = latency_target
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown = cooldown
+        self.max_attempts = max(1, int(max_attempts))
+        self.max_wait = max_wait
+        self.limit = float(self.max_concurrency)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "errors": 0, "circuit_opened": 0}
+
+    @property
+    def circuit_open(self) -> bool:
+        with self._cond:
+            return self._opened_at is not None
+
+    def _pause_left(self, now: float) -> float:
+        """Сколько ещё ждать из-за Retry-After или разомкнутого автомата (0 — можно слать)."""
+        left = self._blocked_until - now
+        if self._opened_at is not None:
+            if self._probing:
+                return max(left, 0.5)
+            left = max(left, self._opened_at + self.cooldown - now)
+        return max(left, 0.0)
+
+    def _take(self) -> None:
+        """Занимает слот (вызывается под блокировкой)."""
+        if self._opened_at is not None:
+            # пробный запрос после cooldown; остальные ждут его результата
+            self._probing = True
+        self._in_flight += 1
+        self.stats["requests"] += 1
+
+    def _acquire(self) -> None:
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                pause = self._pause_left(now)
+                if pause <= 0 and self._in_flight < max(self.min_concurrency, int(self.limit)):
+                    break
+                if now >= deadline:
+                    raise CircuitOpenError(f"{self.name}: сервер недоступен дольше {int(self.max_wait)} с")
+                self._cond.wait(timeout=min(pause or 1.0, deadline - now))
+            self._take()
+
+    async def _aacquire(self) -> None:
+        """_acquire для asyncio: цикл событий не блокируется, слот перепроверяется короткими паузами."""
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                pause = self._pause_left(now)
+                if pause <= 0 and self._in_flight < max(self.min_concurrency, int(self.limit)):
+                    self._take()
+                    return
+            if now >= deadline:
+                raise CircuitOpenError(f"{self.name}: сервер недоступен дольше {int(self.max_wait)} с")
+            await asyncio.sleep(min(pause or ASYNC_POLL, deadline - now))
+
+    def _release(self, ok: bool | None, latency: float, retry_after: float | None = None) -> None:
+        """ok=None — исход запроса неизвестен (исключение не сетевое): слот освобождается без учёта в AIMD и автомате."""
+        with self._cond:
+            self._in_flight -= 1
+            self._probing = False
+            if ok:
+                self._failures = 0
+                self._opened_at = None
+                if latency > self.latency_target:
+                    self.limit = max(float(self.min_concurrency), self.limit / 2)
+                else:
+                    self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            elif ok is False:
+                self._failures += 1
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                if retry_after is not None:
+                    self.stats["throttled"] += 1
+                    self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+                else:
+                    self.stats["errors"] += 1
+                if self._failures >= self.failure_threshold or self._opened_at is not None:
+                    if self._opened_at is None:
+                        self.stats["circuit_opened"] += 1
+                    self._opened_at = time.monotonic()
+            self._cond.notify_all()
+
+    def wait_available(self, on_wait: Callable[[float], None] | None = None) -> None:
+        """Блокирует, пока автомат разомкнут или действует Retry-After (для паузы приёма задач)."""
+        notified = False
+        while True:
+            with self._cond:
+                pause = self._pause_left(time.monotonic())
+                if pause <= 0:
+                    return
+                if notified or on_wait is None:
+                    self._cond.wait(timeout=pause)
+                    continue
+            notified = True
+            on_wait(pause)
+
+    def _verdict(self, resp, attempt: int) -> tuple:
+        """(успех, Retry-After) по ответу: 429/503 и 5xx — сбой сервера, остальное — успех."""
+        if resp.status_code in THROTTLE_CODES:
+            wait = retry_after_seconds(resp.headers.get("Retry-After"))
+            return False, wait if wait is not None else self._delay(attempt)
+        if resp.status_code >= 500:
+            return False, None
+        return True, None
+
+    def request(self, send: Callable[[], requests.Response], attempts: int | None = None) -> requests.Response:
+        """
+        Выполняет send() с учётом лимита и повторами. Возвращает последний ответ
+        (в том числе 4xx/5xx — проверку статуса делает вызывающий); сетевую ошибку
+        последней попытки пробрасывает, прочие исключения send() — сразу.
+        """
+        attempts = max(1, int(attempts or self.max_attempts))
+        resp = None
+        for attempt in range(1, attempts + 1):
+            self._acquire()
+            started = time.monotonic()
+            ok, retry_after = None, None
+            try:
+                resp = send()
+                ok, retry_after = self._verdict(resp, attempt)
+            except requests.RequestException:
+                ok, resp = False, None
+                if attempt == attempts:
+                    raise
+            finally:
+                # слот (и пробный запрос half-open) освобождается при любом исходе
+                self._release(ok, time.monotonic() - started, retry_after)
+            if ok or attempt == attempts:
+                return resp
+            # после 429/503 паузу выдерживает следующий _acquire (Retry-After общий для всех)
+            self._backoff(attempt, sleep=resp is None or resp.status_code not in THROTTLE_CODES)
+        return resp
+
+    async def arequest(
+        self,
+        send: Callable[[], Awaitable],
+        errors: tuple = (),
+        attempts: int | None = None,
+    ):
+        """
+        request для asyncio: send() возвращает корутину запроса (httpx.AsyncClient),
+        errors — сетевые исключения клиента, которые повторяются как сбой сервера.
+        """
+        attempts = max(1, int(attempts or self.max_attempts))
+        resp = None
+        for attempt in range(1, attempts + 1):
+            await self._aacquire()
+            started = time.monotonic()
+            ok, retry_after = None, None
+            try:
+                resp = await send()
+                ok, retry_after = self._verdict(resp, attempt)
+            except errors:
+                ok, resp = False, None
+                if attempt == attempts:
+                    raise
+            finally:
+                self._release(ok, time.monotonic() - started, retry_after)
+            if ok or attempt == attempts:
+                return resp
+            self._backoff(attempt, sleep=False)
+            if resp is None or resp.status_code not in THROTTLE_CODES:
+                await asyncio.sleep(self._delay(attempt))
+        return resp
+
+    @staticmethod
+    def _delay(attempt: int) -> float:
+        # экспоненциальная задержка с джиттером: 1, 2, 4, 8, 10 с
+        return min(10.0, 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+    def _backoff(self, attempt: int, sleep: bool = True) -> None:
+        with self._cond:
+            self.stats["retries"] += 1
+        if sleep:
+            time.sleep(self._delay(attempt))
@@ -0,0 +1,311 @@
+\
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from src.core.utils import parse_size
+
+# Как часто регулятор пересчитывает бюджет и останавливает/продолжает передачи, с
+TICK = 0.2
+
+# Запас бюджета, который передача может выбрать вперёд, с: git сообщает объём раз в секунду
+BURST_S = 1.0
+
+# Дольше этого передача подряд не останавливается (таймауты сервера), с
+MAX_STOP_S = 30.0
+
+_DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+# Регулятор процесса: git_ops.run(transfer=True) проходит через него
+_installed: "BandwidthGovernor | None" = None
+
+
+def install(governor: "BandwidthGovernor | None") -> None:
+    """Делает регулятор общим для всех git- и LFS-передач процесса (None — снять)."""
+    global _installed
+    _installed = governor
+
+
+def installed() -> "BandwidthGovernor | None":
+    return _installed
+
+
+def _parse_clock(value) -> int:
+    """'08:00' → минуты от полуночи; '24:00' — конец суток."""
+    text = str(value).strip()
+    try:
+        hours, minutes = text.split(":")
+        total = int(hours) * 60 + int(minutes)
+    except ValueError:
+        raise ValueError(f"Некорректное время {text!r}, ожидается ЧЧ:ММ")
+    if not (0 <= int(minutes) < 60 and 0 <= total <= 24 * 60):
+        raise ValueError(f"Некорректное время {text!r}, ожидается ЧЧ:ММ")
+    return total
+
+
+class TimeWindow:
+    """
+    Окно [from, to) по местному времени с долей лимита percent (0 — передачи не начинаются).
+    Окно может переходить через полночь (from > to); days — дни начала окна (mon..sun).
+    """
+
+    def __init__(self, start: int, end: int, percent: int, days: List[str] | None = None) -> None:
+        self.start = start
+        self.end = end
+        self.percent = percent
+        self.days = {_DAYS.index(d) for d in days} if days else None
+
+    @classmethod
+    def from_config(cls, raw: Dict) -> "TimeWindow":
+        if not isinstance(raw, dict) or "from" not in raw or "to" not in raw:
+            raise ValueError(f"Окно {raw!r}: нужны from и to")
+        percent = int(raw.get("percent", 100))
+        if not 0 <= percent <= 100:
+            raise ValueError(f"Окно {raw!r}: percent должен быть от 0 до 100")
+        days = [str(d).strip().lower()[:3] for d in raw.get("days") or []]
+        unknown = [d for d in days if d not in _DAYS]
+        if unknown:
+            raise ValueError(f"Окно {raw!r}: неизвестные дни {unknown}, ожидается {', '.join(_DAYS)}")
+        return cls(_parse_clock(raw["from"]), _parse_clock(raw["to"]), percent, days)
+
+    def matches(self, now: datetime) -> bool:
+        minute = now.hour * 60 + now.minute
+        weekday = now.weekday()
+        if self.start < self.end:
+            return self.start <= minute < self.end and (self.days is None or weekday in self.days)
+        # через полночь: хвост после полуночи относится к окну, начавшемуся накануне
+        if minute >= self.start:
+            return self.days is None or weekday in self.days
+        if minute < self.end:
+            return self.days is None or (weekday - 1) % 7 in self.days
+        return False
+
+    def label(self) -> str:
+        text = f"{self.start // 60:02d}:{self.start % 60:02d}–{self.end // 60:02d}:{self.end % 60:02d}"
+        if self.days is not None:
+            text += " " + ",".join(_DAYS[d] for d in sorted(self.days))
+        return text
+
+
+class Transfer:
+    """Передача (один git- или git-lfs-процесс), учитываемая регулятором; см. BandwidthGovernor.transfer."""
+
+    def __init__(self, governor: "BandwidthGovernor") -> None:
+        self.governor = governor
+        self.pgid: int | None = None
+        self.bytes = 0
+        self.recent = 0
+        self.stopped_at: float | None = None
+        self._last: Dict[str, int] = {}
+
+    def attach(self, pid: int) -> None:
+        """Группа процессов передачи (run запускает git в своей сессии: pgid = pid)."""
+        self.pgid = pid
+
+    def on_progress(self, prog: Dict) -> None:
+        """Учитывает объём из строки прогресса git/git-lfs (накопительный по фазе)."""
+        size = prog.get("bytes")
+        if size is None:
+            return
+        phase = prog.get("phase") or ""
+        last = self._last.get(phase, 0)
+        # объём упал — та же фаза началась заново (следующий процесс fetch/push)
+        delta = size - last if size >= last else size
+        self._last[phase] = size
+        if delta > 0:
+            self.governor._account(self, delta)
+
+
+class BandwidthGovernor:
+    """
+    Общий бюджет полосы (байт/с) на все одновременные git- и LFS-передачи.
+    git сам работает с сетью, поэтому регулятор не ограничивает сокеты, а управляет
+    процессами: объём передачи берётся из строк прогресса git/git-lfs, и когда суммарно
+    передано больше, чем позволяет бюджет, самые быстрые передачи (выше равной доли)
+    останавливаются SIGSTOP на группу процессов, пока бюджет не догонит, затем SIGCONT.
+    Лимит — средний: git сообщает объём раз в секунду, поэтому передача идёт рывками.
+    windows — окна времени с долей лимита; окно с 0% — пауза: новые передачи ждут
+    следующего окна, а уже идущие (в т.ч. push) доводятся до конца с прежней скоростью.
+    """
+
+    def __init__(
+        self,
+        limit: int | None,
+        windows: List[TimeWindow] | None = None,
+        on_change: Callable[[str], None] | None = None,
+        clock: Callable[[], datetime] = datetime.now,
+    ) -> None:
+        self.limit = limit
+        self.windows = list(windows or [])
+        self.on_change = on_change
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._active: set[Transfer] = set()
+        self._allowance = 0.0
+        self._bytes = 0
+        self._drain_rate: float | None = None
+        self._last_tick = time.monotonic()
+        self._window, self._percent = self._current_percent()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.stats = {"bytes": 0, "stopped_s": 0.0, "waited_s": 0.0, "stops": 0}
+
+    @classmethod
+    def from_config(cls, cfg: Dict | None, limit: str | None = None, on_change=None) -> "BandwidthGovernor | None":
+        """
+        Раздел bandwidth из config.yml: limit (байт/с, K/M/G) и windows. limit переопределяет
+        лимит конфигурации (BANDWIDTH_LIMIT). None — ни лимита, ни окон.
+        """
+        cfg = cfg or {}
+        limit_bps = parse_size(limit if limit else cfg.get("limit"))
+        windows = [TimeWindow.from_config(w) for w in cfg.get("windows") or []]
+        if limit_bps is None and any(0 < w.percent < 100 for w in windows):
+            raise ValueError("Окна с долей от 0 до 100% требуют bandwidth.limit (BANDWIDTH_LIMIT)")
+        if limit_bps is None and not windows:
+            return None
+        return cls(limit_bps, windows, on_change=on_change)
+
+    def _current_percent(self) -> tuple:
+        now = self.clock()
+        for w in self.windows:
+            if w.matches(now):
+                return w, w.percent
+        return None, 100
+
+    def rate(self) -> float | None:
+        """Текущий бюджет, байт/с: None — без ограничения, 0 — пауза."""
+        if self._percent == 0:
+            return 0.0
+        if self.limit is None:
+            return None
+        return self.limit * self._percent / 100
+
+    def describe(self) -> str:
+        rate = self.rate()
+        if rate == 0:
+            text = "пауза"
+        elif rate is None:
+            text = "без ограничения"
+        else:
+            text = f"{rate / 1024 / 1024:.1f} МиБ/с ({self._percent}%)"
+        return text + (f", окно {self._window.label()}" if self._window is not None else "")
+
+    def transfer(self) -> "_Slot":
+        """Контекст передачи: ждёт открытого окна, затем учитывает и регулирует процесс."""
+        return _Slot(self)
+
+    def _acquire(self) -> Transfer:
+        started = time.monotonic()
+        with self._cond:
+            while self.rate() == 0 and not self._stop.is_set():
+                self._cond.wait(timeout=1.0)
+            t = Transfer(self)
+            self._active.add(t)
+            self.stats["waited_s"] += time.monotonic() - started
+        return t
+
+    def _release(self, t: Transfer) -> None:
+        with self._cond:
+            self._active.discard(t)
+            self._resume(t)
+
+    def _account(self, t: Transfer, n: int) -> None:
+        with self._cond:
+            t.bytes += n
+            t.recent += n
+            self._bytes += n
+            self.stats["bytes"] += n
+
+    def _signal(self, t: Transfer, sig) -> bool:
+        if t.pgid is None:
+            return False
+        try:
+            os.killpg(t.pgid, sig)
+            return True
+        except (ProcessLookupError, PermissionError):
+            return False
+
+    def _resume(self, t: Transfer) -> None:
+        if t.stopped_at is not None:
+            self._signal(t, signal.SIGCONT)
+            self.stats["stopped_s"] += time.monotonic() - t.stopped_at
+            t.stopped_at = None
+
+    def _tick(self) -> None:
+        now = time.monotonic()
+        dt, self._last_tick = now - self._last_tick, now
+        window, percent = self._current_percent()
+        with self._cond:
+            changed = percent != self._percent or window is not self._window
+            self._window, self._percent = window, percent
+            rate = self.rate()
+            if rate != 0:
+                self._drain_rate = rate
+                self._cond.notify_all()
+            # в паузу идущие передачи доводятся со скоростью предыдущего окна
+            effective = rate if rate != 0 else self._drain_rate
+            active = list(self._active)
+            if effective is None:
+                for t in active:
+                    self._resume(t)
+                self._allowance = float(self._bytes)
+            else:
+                self._allowance = min(self._allowance + effective * dt, self._bytes + effective * BURST_S)
+                deficit = self._bytes - self._allowance
+                if deficit > 0 and active:
+                    share = effective * dt / len(active)
+                    hogs = [t for t in active if t.recent >= share] or active
+                    for t in hogs:
+                        if t.stopped_at is None and self._signal(t, signal.SIGSTOP):
+                            t.stopped_at = now
+                            self.stats["stops"] += 1
+                    # слишком долгая остановка рискует таймаутом на сервере
+                    for t in active:
+                        if t.stopped_at is not None and now - t.stopped_at > MAX_STOP_S:
+                            self._resume(t)
+                else:
+                    for t in active:
+                        self._resume(t)
+            for t in active:
+                t.recent = 0
+        if changed and self.on_change is not None:
+            waiting = f", в работе передач: {len(active)}" if percent == 0 and active else ""
+            self.on_change(f"Полоса: {self.describe()}{waiting}")
+
+    def _loop(self):
+        while not self._stop.wait(TICK):
+            self._tick()
+
+    def start(self) -> "BandwidthGovernor":
+        if self._thread is None:
+            self._last_tick = time.monotonic()
+            self._thread = threading.Thread(target=self._loop, name="bandwidth", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        """Останавливает регулятор: все остановленные передачи продолжаются, ожидающие — стартуют."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._cond:
+            for t in list(self._active):
+                self._resume(t)
+            self._cond.notify_all()
+
+
+class _Slot:
+    def __init__(self, governor: BandwidthGovernor) -> None:
+        self.governor = governor
+        self.transfer: Transfer | None = None
+
+    def __enter__(self) -> Transfer:
+        self.transfer = self.governor._acquire()
+        return self.transfer
+
+    def __exit__(self, *exc) -> None:
+        self.governor._release(self.transfer)
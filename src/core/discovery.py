@@ -0,0 +1,121 @@
+\
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Tuple
+from rich import box
+from rich.console import Console
+from rich.panel import Panel
+from rich.table import Table
+
+from src.core.utils import human_bytes, repo_size
+from src.core.inventory import InventoryStore, snapshot_age, carry_sizes
+
+
+def discover_targets(
+    targets: List[Tuple[str, str]],
+    get_bb_client: Callable,
+    global_owner_alias: str = "",
+    workers: int = 8,
+    with_sizes: bool = True,
+    inventory: InventoryStore | None = None,
+    max_age: float = 0,
+    sizes_max_age: float = 0,
+) -> List[Dict]:
+    """
+    Параллельно получает списки репозиториев всех проектов (в т.ч. с разных инстансов Bitbucket).
+    Возвращает по записи на проект: base_url, project_key, owner_alias, repos, error,
+    а также previous (репозитории прошлого снимка inventory или None), cached и taken_at.
+    Каждому репозиторию проставляются project_key, base_url и owner_alias;
+    with_sizes=True дополнительно запрашивает размеры репозиториев (size_bytes).
+    Со снимками inventory: снимок моложе max_age секунд используется вместо листинга
+    (без запросов к API); если моложе sizes_max_age — размеры известных по нему
+    репозиториев берутся из снимка, и запрашиваются только размеры новых.
+    """
+    # клиенты создаём заранее: кэш get_bb_client не рассчитан на конкурентный доступ
+    clients = {base: get_bb_client(base) for base in dict.fromkeys(b for b, _ in targets)}
+
+    def list_one(target: Tuple[str, str]) -> Dict:
+        base, key = target
+        owner_alias = (global_owner_alias or str(key)).strip().lower()
+        entry = {
+            "base_url": base,
+            "project_key": key,
+            "owner_alias": owner_alias,
+            "repos": [],
+            "error": None,
+            "previous": None,
+            "cached": False,
+            "taken_at": time.time(),
+        }
+        snap = inventory.load(base, key) if inventory is not None else None
+        age = snapshot_age(snap)
+        if snap is not None:
+            entry["previous"] = snap["repos"]
+        try:
+            if snap is not None and max_age > 0 and age < max_age:
+                repos = [dict(r) for r in snap["repos"]]
+                entry["cached"], entry["taken_at"] = True, snap["taken_at"]
+                unsized = [r for r in repos if r.get("size_bytes") is None]
+            else:
+                repos = clients[base].list_repositories(project_key=key)
+                reuse = snap is not None and sizes_max_age > 0 and age < sizes_max_age
+                unsized = carry_sizes(snap["repos"], repos) if reuse else repos
+            if with_sizes:
+                clients[base].fill_sizes(unsized)
+        except Exception as e:
+            entry["error"] = str(e)
+            return entry
+        for r in repos:
+            r["project_key"] = key
+            r["base_url"] = base
+            r["owner_alias"] = owner_alias
+        entry["repos"] = repos
+        return entry
+
+    if not targets:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(targets))), thread_name_prefix="discover") as pool:
+        return list(pool.map(list_one, targets))
+
+
+def build_work_queue(discovered: List[Dict]) -> List[Dict]:
+    """Единая очередь репозиториев всех проектов, крупные — первыми (стабильно к порядку листинга)."""
+    work = [r for entry in discovered for r in entry["repos"]]
+    return sorted(work, key=repo_size, reverse=True)
+
+
+def print_discovery(discovered: List[Dict], console: Console) -> None:
+    """Таблица объёма работ до начала переноса: число репозиториев и байт по проектам."""
+    tbl = Table(box=box.SIMPLE_HEAVY)
+    tbl.add_column("Проект", style="bold")
+    tbl.add_column("Bitbucket")
+    tbl.add_column("Репозиториев")
+    tbl.add_column("Объём")
+    total_repos, total_bytes, unknown = 0, 0, 0
+    for entry in discovered:
+        repos = entry["repos"]
+        known = [r for r in repos if r.get("size_bytes") is not None]
+        size = sum(repo_size(r) for r in known)
+        total_repos += len(repos)
+        total_bytes += size
+        unknown += len(repos) - len(known)
+        if entry["error"]:
+            count = f"[red]ошибка: {entry['error'][:80]}[/red]"
+        else:
+            count = str(len(repos)) + (" (снимок)" if entry.get("cached") else "")
+        tbl.add_row(
+            entry["project_key"],
+            entry["base_url"],
+            count,
+            human_bytes(size) if known else "н/д",
+        )
+    console.print(tbl)
+    size_line = human_bytes(total_bytes) if total_bytes or not unknown else "н/д"
+    if unknown and total_bytes:
+        size_line += f" (без учёта {unknown} репозиториев неизвестного размера)"
+    console.print(Panel(
+        f"[bold]Проектов:[/bold] {len(discovered)}    "
+        f"[bold]Репозиториев:[/bold] {total_repos}    "
+        f"[bold]Объём:[/bold] {size_line}",
+        title="Объём миграции", border_style="blue",
+    ))
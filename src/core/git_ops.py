@@ -2,24 +2,201 @@
 import os
 import shlex
 import re
+import signal
 import subprocess
+import threading
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, urlunparse, quote
 
+from src.core import bandwidth
+
 
 def _mask_secrets(s: str) -> str:
     return re.sub(r'(https?://)([^:@/\s]+):([^@/\s]+)@', r'\1***:***@', s)
 
-def run(cmd: str, cwd: str | None = None, env: dict | None = None):
+# Сколько последних строк stdout/stderr хранить для сообщения об ошибке
+OUTPUT_TAIL_LINES = 200
+
+# Сколько refspec передавать в один git push (длина командной строки, лимиты сервера)
+PUSH_BATCH_REFS = 500
+
+# Строка прогресса git / git-lfs, например:
+#   Receiving objects:  45% (4500/10000), 1.20 MiB | 2.00 MiB/s
+#   Uploading LFS objects:  50% (1/2), 1.2 MB | 1.0 MB/s
+_PROGRESS_RE = re.compile(
+    r"^(?:remote:\s*)?(?P<phase>[A-Za-z][A-Za-z ]+?):\s+(?P<percent>\d+)%\s+\((?P<done>\d+)/(?P<total>\d+)\)"
+    r"(?:,\s+(?P<size>[\d.]+\s*[KMGT]?i?B)(?:\s+\|\s+(?P<rate>[\d.]+\s*[KMGT]?i?B)/s)?)?"
+)
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def _parse_size(s: str | None) -> int | None:
+    if not s:
+        return None
+    m = re.match(r"([\d.]+)\s*([KMGT]?)i?B", s)
+    if not m:
+        return None
+    return int(float(m.group(1)) * _UNITS[m.group(2)])
+
+
+def parse_progress(line: str) -> dict | None:
+    """Разбирает строку прогресса git/git-lfs в словарь (phase, percent, done, total, bytes, rate_bps)."""
+    m = _PROGRESS_RE.match(line.strip())
+    if not m:
+        return None
+    return {
+        "phase": m.group("phase").strip(),
+        "percent": int(m.group("percent")),
+        "done": int(m.group("done")),
+        "total": int(m.group("total")),
+        "bytes": _parse_size(m.group("size")),
+        "rate_bps": _parse_size(m.group("rate")),
+    }
+
+
+def _kill_group(proc: subprocess.Popen, grace_s: float = 5.0):
+    """Завершает процесс вместе с дочерними (git-remote-https, ssh, pack-objects)."""
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        # группа могла быть остановлена регулятором полосы — иначе SIGTERM не дойдёт
+        os.killpg(proc.pid, signal.SIGCONT)
+    except (ProcessLookupError, PermissionError):
+        return
+    try:
+        proc.wait(timeout=grace_s)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        proc.wait()
+
+
+def _pump(stream, on_text_line, split_cr: bool):
+    """Читает поток кусками и отдаёт строки по одной; \r (прогресс git) тоже считается концом строки."""
+    buf = b""
+    seps = re.compile(rb"[\r\n]" if split_cr else rb"\n")
+    while True:
+        chunk = stream.read1(65536) if hasattr(stream, "read1") else stream.read(65536)
+        if not chunk:
+            break
+        buf += chunk
+        parts = seps.split(buf)
+        buf = parts.pop()
+        for part in parts:
+            if part:
+                on_text_line(part.decode("utf-8", errors="replace"))
+    if buf:
+        on_text_line(buf.decode("utf-8", errors="replace"))
+
+
+def run(
+    cmd: str,
+    cwd: str | None = None,
+    env: dict | None = None,
+    timeout: float | None = None,
+    on_progress=None,
+    on_line=None,
+    capture: bool = True,
+    transfer: bool = False,
+):
+    """
+    Запускает команду, читая stdout/stderr потоково.
+    - capture=True: возвращает весь stdout (для коротких выводов вроде for-each-ref);
+      при capture=False возвращается только хвост из OUTPUT_TAIL_LINES строк.
+    - on_line(line) вызывается на каждую строку stdout; если вернул True — команда
+      останавливается досрочно (без ошибки).
+    - on_progress(dict) вызывается на строки прогресса git из stderr (см. parse_progress).
+    - timeout — лимит в секундах; по истечении вся группа процессов убивается.
+    - transfer=True — сетевая передача (clone/fetch/push, git lfs fetch/push): если
+      установлен регулятор полосы (bandwidth.install), команда ждёт открытого окна и её
+      объём учитывается в общем бюджете. Паузы регулятора входят в timeout.
+    Для сообщения об ошибке хранится только хвост вывода, поэтому память ограничена.
+    """
+    governor = bandwidth.installed() if transfer else None
+    with (governor.transfer() if governor is not None else nullcontext()) as slot:
+        return _run(cmd, cwd, env, timeout, on_progress, on_line, capture, slot)
+
+
+def _run(cmd: str, cwd, env, timeout, on_progress, on_line, capture: bool, slot):
     e = os.environ.copy()
     if env:
         e.update(env)
-    proc = subprocess.run(shlex.split(cmd), cwd=cwd, env=e, capture_output=True, text=True)
-    if proc.returncode != 0:
-        cmd_safe = _mask_secrets(cmd)
-        out_safe = _mask_secrets(proc.stdout or "")
-        err_safe = _mask_secrets(proc.stderr or "")
+    if slot is not None:
+        # без терминала git-lfs молчит о прогрессе, а регулятору нужен объём
+        e.setdefault("GIT_LFS_FORCE_PROGRESS", "1")
+    proc = subprocess.Popen(
+        shlex.split(cmd),
+        cwd=cwd,
+        env=e,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
+        start_new_session=True,  # своя группа процессов — чтобы убить и дочерние git-процессы
+    )
+    if slot is not None:
+        slot.attach(proc.pid)
+    out_all: list[str] = []
+    out_tail: deque = deque(maxlen=OUTPUT_TAIL_LINES)
+    err_tail: deque = deque(maxlen=OUTPUT_TAIL_LINES)
+    stopped = threading.Event()
+
+    def on_out(line: str):
+        if capture:
+            out_all.append(line)
+        out_tail.append(line)
+        if on_line is not None and not stopped.is_set() and on_line(line):
+            stopped.set()
+            _kill_group(proc, grace_s=1.0)
+
+    def on_err(line: str):
+        # прогресс git перерисовывается через \r — в хвост кладём только строки, отличные от прогресса
+        prog = parse_progress(line)
+        if prog is not None:
+            if slot is not None:
+                slot.on_progress(prog)
+            if on_progress is not None:
+                try:
+                    on_progress(prog)
+                except Exception:
+                    pass
+            if err_tail and parse_progress(err_tail[-1]) is not None:
+                err_tail[-1] = line
+                return
+        err_tail.append(line)
+
+    readers = [
+        threading.Thread(target=_pump, args=(proc.stdout, on_out, False), daemon=True),
+        threading.Thread(target=_pump, args=(proc.stderr, on_err, True), daemon=True),
+    ]
+    for t in readers:
+        t.start()
+    timed_out = False
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        _kill_group(proc)
+    except BaseException:
+        # KeyboardInterrupt и т.п. — не оставляем осиротевших git-процессов
+        _kill_group(proc, grace_s=1.0)
+        raise
+    for t in readers:
+        t.join()
+
+    cmd_safe = _mask_secrets(cmd)
+    if timed_out:
+        err_safe = _mask_secrets("\n".join(err_tail))
+        raise RuntimeError(f"Command timed out after {timeout} s: {cmd_safe}\nSTDERR (tail):\n{err_safe}")
+    if proc.returncode != 0 and not stopped.is_set():
+        out_safe = _mask_secrets("\n".join(out_tail))
+        err_safe = _mask_secrets("\n".join(err_tail))
         raise RuntimeError(f"Command failed: {cmd_safe}\nSTDOUT:\n{out_safe}\nSTDERR:\n{err_safe}")
-    return proc.stdout
+    if capture:
+        return "\n".join(out_all) + ("\n" if out_all else "")
+    return "\n".join(out_tail)
 
 def with_https_creds(url: str, username: str | None, password: str | None) -> str:
     if not (username and password):
@@ -31,40 +208,213 @@ def with_https_creds(url: str, username: str | None, password: str | None) -> st
     netloc = f"{quote(username, safe='')}:{quote(password, safe='')}@{host}"
     return urlunparse((p.scheme, netloc, p.path, "", p.query or "", p.fragment or ""))
 
-def clone_mirror(src_url: str, dest_path: str, git_ssl_no_verify: bool = False):
+def strip_creds(url: str | None) -> str | None:
+    """Убирает логин/пароль из https-URL (для хранения в состоянии и отчётах)."""
+    if not url:
+        return url
+    p = urlparse(url)
+    if not (p.username or p.password):
+        return url
+    host = p.hostname or ""
+    if p.port:
+        host += f":{p.port}"
+    return urlunparse((p.scheme, host, p.path, "", p.query or "", p.fragment or ""))
+
+def clone_mirror(
+    src_url: str,
+    dest_path: str,
+    git_ssl_no_verify: bool = False,
+    timeout: float | None = None,
+    on_progress=None,
+    references: list[str] | None = None,
+):
+    """
+    git clone --mirror. references — локальные репозитории, объекты которых не нужно
+    скачивать заново (--reference-if-able: подключаются через alternates, если существуют).
+    """
     env = {"GIT_TERMINAL_PROMPT": "0"}
     if git_ssl_no_verify:
         env["GIT_SSL_NO_VERIFY"] = "true"
-    run(f"git clone --mirror {shlex.quote(src_url)} {shlex.quote(dest_path)}", env=env)
+    refs_opt = "".join(f" --reference-if-able {shlex.quote(p)}" for p in references or [])
+    run(
+        f"git clone --mirror --progress{refs_opt} {shlex.quote(src_url)} {shlex.quote(dest_path)}",
+        env=env, timeout=timeout, on_progress=on_progress, capture=False, transfer=True,
+    )
 
-def lfs_fetch_all(repo_path: str, git_ssl_no_verify: bool = False):
+def ls_remote(url: str, git_ssl_no_verify: bool = False, timeout: float | None = None) -> dict[str, str]:
+    """git ls-remote: {ref: sha} без скачивания объектов."""
     env = {"GIT_TERMINAL_PROMPT": "0"}
     if git_ssl_no_verify:
         env["GIT_SSL_NO_VERIFY"] = "true"
-    try:
-        run("git lfs fetch --all", cwd=repo_path, env=env)
-        return True
-    except Exception:
-        return False
-    
-def lfs_repo_has_content(repo_path: str) -> bool:
+    out = run(f"git ls-remote {shlex.quote(url)}", env=env, timeout=timeout)
+    refs = {}
+    for line in out.splitlines():
+        sha, _, ref = line.partition("\t")
+        if ref:
+            refs[ref] = sha
+    return refs
+
+def root_commits(repo_path: str) -> list[str]:
+    """Корневые коммиты истории HEAD (если HEAD пуст или битый — всех refs)."""
+    for rev in ("HEAD", "--all"):
+        try:
+            out = run(f"git rev-list --max-parents=0 {rev}", cwd=repo_path)
+        except Exception:
+            continue
+        roots = sorted(set(out.split()))
+        if roots:
+            return roots
+    return []
+
+def add_alternate(repo_path: str, other_repo: str):
+    """Подключает объекты other_repo к repo_path через objects/info/alternates."""
+    info_dir = os.path.join(repo_path, "objects", "info")
+    os.makedirs(info_dir, exist_ok=True)
+    path = os.path.join(info_dir, "alternates")
+    objects_dir = os.path.abspath(os.path.join(other_repo, "objects"))
+    existing = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            existing = [line.strip() for line in f if line.strip()]
+    if objects_dir not in existing:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(objects_dir + "\n")
+
+def repack_local(repo_path: str, timeout: float | None = None):
+    """Переупаковывает только собственные объекты: всё, что есть в alternates, удаляется из репозитория."""
+    run("git repack -a -d -l -q", cwd=repo_path, timeout=timeout)
+
+def update_mirror(repo_path: str, remote_name: str = "origin", git_ssl_no_verify: bool = False, timeout: float | None = None, on_progress=None):
+    """
+    Обновляет существующее зеркало: git fetch --prune указанного remote (то же, что
+    git remote update --prune, но с прогрессом — по нему считается объём передачи).
+    """
+    env = {"GIT_TERMINAL_PROMPT": "0"}
+    if git_ssl_no_verify:
+        env["GIT_SSL_NO_VERIFY"] = "true"
+    run(
+        f"git fetch --progress --prune {remote_name}",
+        cwd=repo_path, env=env, timeout=timeout, on_progress=on_progress, capture=False, transfer=True,
+    )
+
+def set_remote_url(repo_path: str, name: str, url: str):
+    run(f"git remote set-url {name} {shlex.quote(url)}", cwd=repo_path)
+
+def get_remote_url(repo_path: str, name: str) -> str:
+    """URL remote из конфигурации репозитория (git remote get-url)."""
+    return run(f"git remote get-url {name}", cwd=repo_path).strip()
+
+def cat_file_stream(
+    repo_path: str,
+    specs,
+    on_object,
+    check: bool = False,
+    timeout: float | None = None,
+) -> None:
     """
-    Возвращает True, если в bare-репозитории есть LFS-файлы/объекты.
-    1) Пробуем `git lfs ls-files --all` с GIT_DIR=repo_path (bare-режим).
-    2) Фоллбэк: проверяем на файловой системе наличие объектов в lfs/objects.
+    git cat-file --batch потоково: on_object(spec, данные) вызывается на каждый объект
+    по мере чтения; данные — содержимое (check=True: заголовок "<sha> <тип> <размер>"
+    из --batch-check) или None для отсутствующего объекта. Если on_object вернул True,
+    процесс останавливается досрочно. Как и run, процесс запускается в своей группе,
+    по timeout группа убивается, от stderr хранится только хвост.
     """
-    env = {"GIT_DIR": repo_path, "GIT_TERMINAL_PROMPT": "0"}
+    specs = list(specs)
+    if not specs:
+        return
+    proc = subprocess.Popen(
+        ["git", "cat-file", "--batch-check" if check else "--batch"],
+        cwd=repo_path,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+    err_tail: deque = deque(maxlen=OUTPUT_TAIL_LINES)
+    expired = threading.Event()
+
+    def feed():
+        try:
+            for spec in specs:
+                proc.stdin.write(f"{spec}\n".encode())
+            proc.stdin.close()
+        except OSError:
+            pass  # процесс остановлен досрочно или убит
+
+    def expire():
+        expired.set()
+        _kill_group(proc, grace_s=1.0)
+
+    threads = [
+        threading.Thread(target=feed, daemon=True),
+        threading.Thread(target=_pump, args=(proc.stderr, err_tail.append, False), daemon=True),
+    ]
+    for t in threads:
+        t.start()
+    timer = threading.Timer(timeout, expire) if timeout else None
+    if timer is not None:
+        timer.start()
+    read, stopped = 0, False
     try:
-        out = run("git lfs ls-files --all", env=env)
-        if out and out.strip():
-            return True
-    except Exception:
-        pass
-    objects_dir = os.path.join(repo_path, "lfs", "objects")
-    for _root, _dirs, files in os.walk(objects_dir):
-        if files:
-            return True
-    return False
+        for spec in specs:
+            header = proc.stdout.readline()
+            if not header:
+                break
+            parts = header.split()
+            if len(parts) < 3 or parts[-1] in (b"missing", b"ambiguous"):
+                data = None
+            elif check:
+                data = header.rstrip(b"\n")
+            else:
+                size = int(parts[2])
+                data = proc.stdout.read(size + 1)[:size]  # содержимое завершается переводом строки
+            read += 1
+            if on_object(spec, data):
+                stopped = True
+                break
+    except BaseException:
+        _kill_group(proc, grace_s=1.0)
+        raise
+    finally:
+        if timer is not None:
+            timer.cancel()
+    if stopped:
+        _kill_group(proc, grace_s=1.0)
+    proc.wait()
+    for t in threads:
+        t.join()
+    proc.stdout.close()
+    if expired.is_set():
+        raise RuntimeError(f"Command timed out after {timeout} s: git cat-file ({repo_path})")
+    if not stopped and (proc.returncode != 0 or read < len(specs)):
+        raise RuntimeError(f"git cat-file --batch failed: {chr(10).join(err_tail)[-2000:]}")
+
+def cat_file_batch(repo_path: str, specs: list[str], timeout: float | None = None) -> dict[str, bytes | None]:
+    """
+    Содержимое объектов одним процессом git cat-file --batch (см. cat_file_stream).
+    specs — <sha>, <rev>:<path> и т.п.; для отсутствующих объектов значение None.
+    """
+    result: dict[str, bytes | None] = {}
+
+    def keep(spec: str, data: bytes | None) -> None:
+        result[spec] = data
+
+    cat_file_stream(repo_path, specs, keep, timeout=timeout)
+    return result
+
+def list_refs(repo_path: str, exclude_prefixes: tuple = ("refs/remotes/",)) -> dict[str, str]:
+    """Возвращает {ref: sha} для всех refs зеркала."""
+    out = run("git for-each-ref --format=%(objectname)%20%(refname)", cwd=repo_path)
+    refs = {}
+    for line in out.splitlines():
+        sha, _, ref = line.partition(" ")
+        if ref and not ref.startswith(exclude_prefixes):
+            refs[ref] = sha
+    return refs
+
+def delete_refs(repo_path: str, refs: list[str]):
+    """Удаляет refs локального репозитория (git update-ref -d)."""
+    for ref in refs:
+        run(f"git update-ref -d {shlex.quote(ref)}", cwd=repo_path)
 
 def add_remote(repo_path: str, name: str, url: str):
     try:
@@ -73,18 +423,115 @@ def add_remote(repo_path: str, name: str, url: str):
         pass
     run(f"git remote add {name} {shlex.quote(url)}", cwd=repo_path)
 
-def push_mirror(repo_path: str, remote_name: str = "gitflic", git_ssl_no_verify: bool = False):
+def push_mirror(repo_path: str, remote_name: str = "gitflic", git_ssl_no_verify: bool = False, timeout: float | None = None, on_progress=None):
     env = {"GIT_TERMINAL_PROMPT": "0"}
     if git_ssl_no_verify:
         env["GIT_SSL_NO_VERIFY"] = "true"
-    run(f"git push --mirror {remote_name}", cwd=repo_path, env=env)
+    run(
+        f"git push --mirror --progress {remote_name}",
+        cwd=repo_path, env=env, timeout=timeout, on_progress=on_progress, capture=False, transfer=True,
+    )
 
-def lfs_push_all(repo_path: str, remote_name: str = "gitflic", git_ssl_no_verify: bool = False):
+def push_refs(repo_path: str, remote_name: str, refspecs: list[str], git_ssl_no_verify: bool = False, timeout: float | None = None, on_progress=None):
+    """git push с явным списком refspec (+ref:ref — обновить, :ref — удалить)."""
+    if not refspecs:
+        return
     env = {"GIT_TERMINAL_PROMPT": "0"}
     if git_ssl_no_verify:
         env["GIT_SSL_NO_VERIFY"] = "true"
+    specs = " ".join(shlex.quote(s) for s in refspecs)
+    run(
+        f"git push --progress {remote_name} {specs}",
+        cwd=repo_path, env=env, timeout=timeout, on_progress=on_progress, capture=False, transfer=True,
+    )
+
+def diff_refs(local: dict[str, str], pushed: dict[str, str]) -> tuple[dict[str, str], list[str]]:
+    """Возвращает (изменённые/новые refs, удалённые refs) относительно последнего push."""
+    changed = {ref: sha for ref, sha in local.items() if pushed.get(ref) != sha}
+    deleted = sorted(ref for ref in pushed if ref not in local)
+    return changed, deleted
+
+def order_refs(refs: dict[str, str], head_sha: str | None = None) -> list[str]:
+    """
+    Порядок переноса refs: ветка HEAD (основная история) первой, затем остальные
+    ветки, теги и прочие refs — последующие порции в основном передают только свои коммиты.
+    """
+    head_sha = head_sha or refs.get("HEAD")
+    names = [r for r in refs if r != "HEAD" and not r.endswith("^{}")]
+
+    def rank(ref: str):
+        if ref.startswith("refs/heads/"):
+            group = 0 if refs[ref] == head_sha else 1
+        elif ref.startswith("refs/tags/"):
+            group = 2
+        else:
+            group = 3
+        return group, ref
+
+    return sorted(names, key=rank)
+
+def push_ref_batches(
+    repo_path: str,
+    remote_name: str,
+    changed: dict[str, str],
+    deleted: list[str] = (),
+    batch_refs: int = PUSH_BATCH_REFS,
+    jobs: int = 1,
+    git_ssl_no_verify: bool = False,
+    timeout: float | None = None,
+    on_progress=None,
+    on_batch=None,
+) -> int:
+    """
+    Пушит изменённые (+ref:ref) и удаляет (:ref) refs порциями по batch_refs.
+    Первая порция (с веткой HEAD) идёт одна, остальные — в jobs параллельных push.
+    on_batch(changed: dict, deleted: list) вызывается после каждой успешной порции,
+    чтобы повтор дослал только недостающее. Упавшие порции не останавливают остальные;
+    в конце поднимается RuntimeError с числом неудачных порций. Возвращает число порций.
+    """
+    batch_refs = max(1, int(batch_refs or PUSH_BATCH_REFS))
+    head_sha = None
     try:
-        run(f"git lfs push --all {remote_name}", cwd=repo_path, env=env)
-        return True
+        head_sha = run("git rev-parse --verify -q HEAD", cwd=repo_path).strip() or None
     except Exception:
-        return False
+        pass
+    specs = [f"+{ref}:{ref}" for ref in order_refs(changed, head_sha)] + [f":{ref}" for ref in sorted(deleted)]
+    batches = [specs[i:i + batch_refs] for i in range(0, len(specs), batch_refs)]
+    errors = []
+
+    def push_one(batch: list[str]):
+        try:
+            push_refs(
+                repo_path, remote_name, batch,
+                git_ssl_no_verify=git_ssl_no_verify, timeout=timeout, on_progress=on_progress,
+            )
+        except Exception as e:
+            errors.append(e)
+            return
+        if on_batch is not None:
+            refs = [s.lstrip("+").split(":", 1)[-1] for s in batch]
+            on_batch(
+                {ref: changed[ref] for ref in refs if ref in changed},
+                [ref for ref in refs if ref not in changed],
+            )
+
+    if batches:
+        push_one(batches[0])
+        with ThreadPoolExecutor(max_workers=max(1, int(jobs or 1)), thread_name_prefix="push-batch") as pool:
+            list(pool.map(push_one, batches[1:]))
+    if errors:
+        raise RuntimeError(f"Не запушено порций refs: {len(errors)} из {len(batches)}; первая ошибка: {errors[0]}")
+    return len(batches)
+
+def fetch_refs(repo_path: str, remote_name: str, refspecs: list[str], git_ssl_no_verify: bool = False, timeout: float | None = None, on_progress=None):
+    """git fetch с явным списком refspec (без тегов по умолчанию и без remote-tracking веток)."""
+    if not refspecs:
+        return
+    env = {"GIT_TERMINAL_PROMPT": "0"}
+    if git_ssl_no_verify:
+        env["GIT_SSL_NO_VERIFY"] = "true"
+    specs = " ".join(shlex.quote(s) for s in refspecs)
+    run(
+        f"git fetch --progress --no-tags --no-write-fetch-head {remote_name} {specs}",
+        cwd=repo_path, env=env, timeout=timeout, on_progress=on_progress, capture=False, transfer=True,
+    )
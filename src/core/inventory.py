@@ -0,0 +1,148 @@
+\
+import os
+import re
+import json
+import time
+from typing import Dict, Iterable, List
+from urllib.parse import urlparse
+
+# Каталог снимков инвентаря под WORKDIR
+INVENTORY_DIR = "inventory"
+
+SNAPSHOT_VERSION = 1
+
+# Поля репозитория, сохраняемые в снимке (служебные owner_alias/base_url проставляет discovery)
+_SNAPSHOT_FIELDS = (
+    "id", "name", "slug", "description", "clone_http", "clone_ssh", "project_key", "size_bytes", "size_detail",
+)
+
+
+def snapshot_name(base_url: str, project_key: str) -> str:
+    """Имя файла снимка: хост и путь Bitbucket + ключ проекта, только безопасные символы."""
+    u = urlparse(base_url)
+    server = re.sub(r"[^A-Za-z0-9._-]+", "_", f"{u.netloc}{u.path}".strip("/")) or "bitbucket"
+    key = re.sub(r"[^A-Za-z0-9._-]+", "_", str(project_key))
+    return f"{server}__{key}.json"
+
+
+def repo_identity(r: Dict):
+    """Идентичность репозитория между снимками: id Bitbucket (не меняется при переименовании), иначе slug."""
+    return ("id", r["id"]) if r.get("id") is not None else ("slug", r.get("slug"))
+
+
+class InventoryStore:
+    """
+    Снимки списка репозиториев проекта Bitbucket на диске — по файлу на (base URL, project key).
+    Снимок: {"version", "base_url", "project_key", "taken_at", "repos": [...]}; taken_at — время
+    листинга в Bitbucket. Запись атомарная (временный файл + rename).
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    @classmethod
+    def for_workdir(cls, workdir: str) -> "InventoryStore":
+        return cls(os.path.join(workdir, INVENTORY_DIR))
+
+    def path(self, base_url: str, project_key: str) -> str:
+        return os.path.join(self.root, snapshot_name(base_url, project_key))
+
+    def load(self, base_url: str, project_key: str) -> Dict | None:
+        """Снимок или None (нет файла, повреждён, другая версия формата)."""
+        try:
+            with open(self.path(base_url, project_key), encoding="utf-8") as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(snap, dict) or snap.get("version") != SNAPSHOT_VERSION:
+            return None
+        return snap
+
+    def save(self, base_url: str, project_key: str, repos: Iterable[Dict], taken_at: float | None = None) -> str:
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(base_url, project_key)
+        snap = {
+            "version": SNAPSHOT_VERSION,
+            "base_url": base_url,
+            "project_key": project_key,
+            "taken_at": taken_at if taken_at is not None else time.time(),
+            "repos": [{k: r.get(k) for k in _SNAPSHOT_FIELDS} for r in repos],
+        }
+        tmp = f"{path}.tmp.{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snap, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+        return path
+
+
+def snapshot_age(snap: Dict | None) -> float | None:
+    if not snap:
+        return None
+    return max(0.0, time.time() - float(snap.get("taken_at") or 0))
+
+
+def diff_inventory(old: Iterable[Dict] | None, new: Iterable[Dict]) -> Dict:
+    """
+    Разница между снимком и текущим списком: added, removed, renamed ([{"old", "new"}] —
+    тот же id, другое имя или slug) и unchanged (число). Без id в снимке переименование
+    видно только как удаление + добавление.
+    """
+    old_by_id = {repo_identity(r): r for r in old or []}
+    seen = set()
+    diff = {"added": [], "removed": [], "renamed": [], "unchanged": 0}
+    for r in new:
+        ident = repo_identity(r)
+        before = old_by_id.get(ident)
+        if before is None and ident[0] == "id":
+            # снимок без id (или старый формат): сопоставляем по slug
+            ident = ("slug", r.get("slug"))
+            before = old_by_id.get(ident)
+        if before is None:
+            diff["added"].append(r)
+            continue
+        seen.add(ident)
+        if before.get("slug") != r.get("slug") or before.get("name") != r.get("name"):
+            diff["renamed"].append({"old": before, "new": r})
+        else:
+            diff["unchanged"] += 1
+    diff["removed"] = [r for ident, r in old_by_id.items() if ident not in seen]
+    return diff
+
+
+def delta_repos(diff: Dict) -> List[Dict]:
+    """Репозитории, которые нужно перенести: новые и переименованные (новое имя — новый alias)."""
+    return list(diff["added"]) + [pair["new"] for pair in diff["renamed"]]
+
+
+def carry_sizes(old: Iterable[Dict] | None, new: Iterable[Dict]) -> List[Dict]:
+    """
+    Переносит size_bytes/size_detail из снимка в репозитории текущего списка с той же
+    идентичностью; возвращает репозитории, размер которых нужно запросить.
+    """
+    known = {repo_identity(r): r for r in old or [] if r.get("size_bytes") is not None}
+    missing = []
+    for r in new:
+        before = known.get(repo_identity(r))
+        if before is None:
+            missing.append(r)
+            continue
+        r["size_bytes"] = before["size_bytes"]
+        r["size_detail"] = before.get("size_detail")
+    return missing
+
+
+def snapshot_after_run(previous: Iterable[Dict] | None, current: Iterable[Dict], failed: Iterable[Dict]) -> List[Dict]:
+    """
+    Снимок после migrate: текущий список, но упавшие репозитории остаются в прежнем виде
+    (или отсутствуют, если их не было) — следующий --delta возьмёт их снова.
+    """
+    failed_ids = {repo_identity(r) for r in failed}
+    old_by_id = {repo_identity(r): r for r in previous or []}
+    repos = []
+    for r in current:
+        ident = repo_identity(r)
+        if ident not in failed_ids:
+            repos.append(r)
+        elif ident in old_by_id:
+            repos.append(old_by_id[ident])
+    return repos
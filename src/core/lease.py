@@ -0,0 +1,180 @@
+\
+import os
+import time
+import socket
+import sqlite3
+import threading
+from typing import Dict, Iterable
+
+# Время жизни аренды без heartbeat, с: после него репозиторий упавшего хоста берёт другой
+LEASE_TTL = 300.0
+
+# Как часто хост, закончивший свою часть, перепроверяет репозитории других хостов, с
+LEASE_POLL = 10.0
+
+# Результаты claim
+LEASE_CLAIMED = "claimed"    # репозиторий взят этим хостом
+LEASE_BUSY = "busy"          # его переносит другой живой хост
+LEASE_FINISHED = "finished"  # уже перенесён (или упал) на каком-то хосте
+
+LEASE_RUNNING = "running"
+LEASE_DONE = "done"
+LEASE_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    key        TEXT PRIMARY KEY,
+    holder     TEXT NOT NULL,
+    status     TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def default_holder() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseStore:
+    """
+    Распределение репозиториев между несколькими запусками migrate (на разных хостах)
+    через общий SQLite-файл, например на общем NFS/SMB-ресурсе.
+    Хост берёт репозиторий в аренду (claim) перед переносом; пока перенос идёт,
+    фоновый heartbeat продлевает аренду раз в ttl/3. Если хост упал, аренда истекает
+    через ttl секунд, и репозиторий забирает другой хост. Завершённые (done) и
+    упавшие (failed) репозитории повторно не выдаются; reopen_failed() возвращает
+    упавшие в работу (migrate --resume).
+    Журнал SQLite — rollback (не WAL): WAL не работает на сетевых файловых системах.
+    Безопасно для использования из нескольких потоков.
+    """
+
+    def __init__(self, path: str, holder: str | None = None, ttl: float = LEASE_TTL) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.holder = holder or default_holder()
+        self.ttl = max(10.0, float(ttl))
+        self.heartbeat_interval = self.ttl / 3
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=DELETE")
+        self._db.executescript(_SCHEMA)
+        self._held: set[str] = set()
+        self.lost: set[str] = set()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _tx(self, fn):
+        # BEGIN IMMEDIATE сразу берёт блокировку записи: два хоста не возьмут один ключ
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    def claim(self, key: str) -> str:
+        """LEASE_CLAIMED, LEASE_BUSY или LEASE_FINISHED."""
+        def op(db):
+            now = time.time()
+            row = db.execute("SELECT holder, status, expires_at FROM leases WHERE key = ?", (key,)).fetchone()
+            if row:
+                holder, status, expires_at = row
+                if status in (LEASE_DONE, LEASE_FAILED):
+                    return LEASE_FINISHED
+                if holder != self.holder and expires_at > now:
+                    return LEASE_BUSY
+            db.execute(
+                "INSERT INTO leases (key, holder, status, expires_at, attempts, updated_at) VALUES (?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT(key) DO UPDATE SET holder = excluded.holder, status = excluded.status, "
+                "expires_at = excluded.expires_at, attempts = attempts + 1, updated_at = excluded.updated_at",
+                (key, self.holder, LEASE_RUNNING, now + self.ttl, now),
+            )
+            return LEASE_CLAIMED
+
+        result = self._tx(op)
+        if result == LEASE_CLAIMED:
+            with self._lock:
+                self._held.add(key)
+        return result
+
+    def release(self, key: str, ok: bool = True) -> None:
+        """Завершает аренду: done или failed. Ключи, которые хост не держит, не трогает."""
+        with self._lock:
+            if key not in self._held:
+                return
+            self._held.discard(key)
+        status = LEASE_DONE if ok else LEASE_FAILED
+        self._tx(lambda db: db.execute(
+            "UPDATE leases SET status = ?, expires_at = 0, updated_at = ? WHERE key = ? AND holder = ?",
+            (status, time.time(), key, self.holder),
+        ))
+
+    def renew(self) -> set[str]:
+        """Продлевает все аренды хоста; возвращает ключи, перехваченные другими хостами."""
+        with self._lock:
+            held = list(self._held)
+        if not held:
+            return set()
+
+        def op(db):
+            now = time.time()
+            lost = set()
+            for key in held:
+                cur = db.execute(
+                    "UPDATE leases SET expires_at = ?, updated_at = ? WHERE key = ? AND holder = ? AND status = ?",
+                    (now + self.ttl, now, key, self.holder, LEASE_RUNNING),
+                )
+                if cur.rowcount == 0:
+                    lost.add(key)
+            return lost
+
+        lost = self._tx(op)
+        if lost:
+            with self._lock:
+                self._held -= lost
+                self.lost |= lost
+        return lost
+
+    def reopen_failed(self, keys: Iterable[str] | None = None) -> int:
+        """Возвращает упавшие репозитории (все или из keys) в работу."""
+        def op(db):
+            if keys is None:
+                return db.execute("DELETE FROM leases WHERE status = ?", (LEASE_FAILED,)).rowcount
+            n = 0
+            for key in keys:
+                n += db.execute("DELETE FROM leases WHERE key = ? AND status = ?", (key, LEASE_FAILED)).rowcount
+            return n
+        return self._tx(op)
+
+    def counts(self) -> Dict[str, int]:
+        """Число аренд по статусам (running — включая истёкшие)."""
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM leases GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+    def _loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.renew()
+            except sqlite3.Error:
+                # общий ресурс временно недоступен — попробуем на следующем такте
+                pass
+
+    def start(self) -> "LeaseStore":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="lease-heartbeat", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,423 @@
+\
+import os
+import re
+import json
+import shlex
+import threading
+from typing import Dict, List
+from urllib.parse import urlparse, urlunparse, unquote
+
+import requests
+
+from src.core.git_ops import run, list_refs, cat_file_batch, cat_file_stream, _parse_size
+from src.core.state import StateStore
+
+# Общее хранилище LFS-объектов всех репозиториев: <WORKDIR>/.lfs-objects (lfs.storage)
+LFS_STORE_DIR = ".lfs-objects"
+
+# Объектов в одном запросе LFS batch API (рекомендация спецификации git-lfs)
+LFS_BATCH_OBJECTS = 100
+
+# Сколько oid передавать в один git lfs push --object-id (длина командной строки)
+LFS_PUSH_OIDS = 200
+
+# Признак LFS в .gitattributes и сигнатура файла-указателя
+_LFS_ATTR_RE = re.compile(rb"filter\s*=\s*lfs\b")
+LFS_POINTER_PREFIX = b"version https://git-lfs.github.com/spec/"
+# Указатель — маленький текстовый blob (спецификация: < 1024 байт)
+LFS_POINTER_MAX_SIZE = 1024
+# Указатель без расширений: строки version (43 байта), oid (76) и size (6 + цифры)
+LFS_PLAIN_POINTER_SIZES = (126, 145)
+
+# Сколько объектов проверять одним git cat-file при поиске указателей
+POINTER_BATCH = 1000
+
+# git lfs ls-files --json появился в git-lfs 3.3
+LFS_JSON_VERSION = (3, 3)
+
+# Режимы определения LFS: tips — все .gitattributes вершин refs, затем указатели без
+# расширений среди всех объектов (по размеру заголовка — дёшево); full — указатели
+# любого вида (все blob до 1 КиБ)
+LFS_DETECT_MODES = ("tips", "full")
+
+
+class LfsError(RuntimeError):
+    """Сбой передачи LFS-объектов (в отличие от отсутствия git-lfs)."""
+
+
+def lfs_batch_url(remote_url: str) -> str:
+    """URL LFS batch API по адресу git-репозитория (правило git-lfs: <repo>.git/info/lfs)."""
+    base = remote_url.rstrip("/")
+    if not base.endswith(".git"):
+        base += ".git"
+    return base + "/info/lfs/objects/batch"
+
+
+def new_lfs_stats(objects: Dict[str, int] | None = None) -> Dict:
+    objects = objects or {}
+    return {
+        "objects": len(objects),
+        "bytes": sum(objects.values()),
+        "downloaded_objects": 0,
+        "downloaded_bytes": 0,
+        "uploaded_objects": 0,
+        "uploaded_bytes": 0,
+        "skipped_objects": 0,
+    }
+
+
+def parse_pointer(data: bytes | None) -> tuple | None:
+    """(oid, size) из содержимого файла-указателя LFS; None — не указатель."""
+    if not data or not data.startswith(LFS_POINTER_PREFIX):
+        return None
+    oid, size = None, None
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        key, _, value = line.partition(" ")
+        if key == "oid" and value.startswith("sha256:"):
+            oid = value[len("sha256:"):]
+        elif key == "size" and value.isdigit():
+            size = int(value)
+    return (oid, size) if oid and size is not None else None
+
+
+class _PointerScan:
+    """
+    Поиск LFS-указателей по заголовкам "<sha> <тип> <размер>": маленькие blob читаются
+    git cat-file порциями по POINTER_BATCH — в памяти только текущая порция.
+    first_only — остановиться на первом найденном указателе.
+    """
+
+    def __init__(
+        self,
+        repo_path: str,
+        first_only: bool = False,
+        sizes: tuple = (0, LFS_POINTER_MAX_SIZE),
+        timeout: float | None = None,
+    ) -> None:
+        self.repo_path = repo_path
+        self.first_only = first_only
+        self.min_size, self.max_size = sizes
+        self.timeout = timeout
+        self.objects: Dict[str, int] = {}
+        self._batch: List[str] = []
+
+    def header(self, line) -> bool:
+        """Учитывает объект; True — можно остановиться (first_only и указатель найден)."""
+        parts = (line.decode() if isinstance(line, bytes) else line).split()
+        if len(parts) == 3 and parts[1] == "blob" and self.min_size <= int(parts[2]) <= self.max_size:
+            self._batch.append(parts[0])
+            if len(self._batch) >= POINTER_BATCH:
+                return self.flush()
+        return False
+
+    def flush(self) -> bool:
+        batch, self._batch = self._batch, []
+
+        def check(spec: str, data: bytes | None) -> bool:
+            pointer = parse_pointer(data)
+            if pointer is not None:
+                self.objects[pointer[0]] = pointer[1]
+            return self.first_only and pointer is not None
+
+        cat_file_stream(self.repo_path, batch, check, timeout=self.timeout)
+        return self.first_only and bool(self.objects)
+
+
+class LfsEngine:
+    """
+    Передача LFS-объектов с настраиваемым параллелизмом (lfs.concurrenttransfers).
+    - Объекты всех репозиториев хранятся в общем каталоге WORKDIR/.lfs-objects
+      (lfs.storage): бинарник, лежащий в десяти репозиториях, скачивается один раз.
+    - Перед загрузкой в GitFlic выполняется запрос LFS batch API (operation=upload):
+      объекты, которые сервер уже хранит, не загружаются; если есть всё — git lfs push
+      не запускается вовсе.
+    - По каждому репозиторию возвращается статистика: число и объём объектов,
+      скачано / загружено / пропущено.
+    Если git-lfs не установлен, LFS пропускается (available=False) вместо ошибки.
+    Полный скан (ls-files --all) запускается только для репозиториев, где detect()
+    нашёл признаки LFS; результат проверки вершин кэшируется в state.
+    """
+
+    def __init__(
+        self,
+        workdir: str,
+        concurrency: int = 8,
+        shared_store: bool = True,
+        verify_tls: bool = True,
+        http_timeout: float = 60.0,
+        state: StateStore | None = None,
+        detect_mode: str = "tips",
+    ) -> None:
+        self.store = os.path.abspath(os.path.join(workdir, LFS_STORE_DIR)) if shared_store else None
+        self.concurrency = max(1, int(concurrency or 1))
+        self.verify_tls = verify_tls
+        self.http_timeout = http_timeout
+        self.state = state
+        self.detect_mode = detect_mode if detect_mode in LFS_DETECT_MODES else "tips"
+        self._available: bool | None = None
+        self._version: tuple | None = None
+        self._lock = threading.Lock()
+
+    def _probe(self) -> None:
+        with self._lock:
+            if self._available is None:
+                try:
+                    out = run("git lfs version")
+                    self._available = True
+                except Exception:
+                    self._available = False
+                    return
+                # "git-lfs/3.4.1 (GitHub; linux amd64; go 1.21.5)"
+                m = re.search(r"git-lfs/(\d+)\.(\d+)", out)
+                self._version = (int(m.group(1)), int(m.group(2))) if m else None
+
+    @property
+    def available(self) -> bool:
+        self._probe()
+        return bool(self._available)
+
+    @property
+    def json_output(self) -> bool:
+        """Поддерживает ли git-lfs ls-files --json (неизвестная версия считается новой)."""
+        self._probe()
+        return self._version is None or self._version >= LFS_JSON_VERSION
+
+    def _git(self, cmd: str, repo_path: str, timeout=None, on_progress=None, capture=True, transfer=False) -> str:
+        env = {"GIT_TERMINAL_PROMPT": "0", "GIT_DIR": repo_path}
+        opts = f"-c lfs.concurrenttransfers={self.concurrency}"
+        if self.store:
+            opts += f" -c lfs.storage={shlex.quote(self.store)}"
+        return run(
+            f"git {opts} lfs {cmd}",
+            cwd=repo_path, env=env, timeout=timeout, on_progress=on_progress, capture=capture, transfer=transfer,
+        )
+
+    def _object_path(self, repo_path: str, oid: str) -> str:
+        root = self.store or os.path.join(repo_path, "lfs")
+        return os.path.join(root, "objects", oid[:2], oid[2:4], oid)
+
+    def _local(self, repo_path: str, objects: Dict[str, int]) -> Dict[str, int]:
+        return {oid: size for oid, size in objects.items() if os.path.exists(self._object_path(repo_path, oid))}
+
+    def detect(self, repo_path: str, refs: Dict[str, str] | None = None) -> bool:
+        """
+        Быстрая проверка, использует ли репозиторий LFS, без обхода истории git-lfs:
+        - все .gitattributes на вершинах refs (в том числе вложенные: git ls-tree -r
+          --name-only), содержимое читается git cat-file --batch;
+        - если filter=lfs не найден — blob-указатели среди всех объектов по заголовкам
+          git cat-file --batch-check (в режиме tips — только размера указателя без
+          расширений, в режиме full — все blob до 1 КиБ).
+        Результат по вершинам сохраняется в state и при повторе не пересчитывается.
+        """
+        tips = sorted(set((refs if refs is not None else list_refs(repo_path)).values()))
+        known = self.state.lfs_tips(tips, mode=self.detect_mode) if self.state is not None else {}
+        if any(known.values()):
+            return True
+        todo = [t for t in tips if t not in known]
+        if not todo:
+            return False
+        results = {}
+        for t in todo:
+            results[t] = self._tip_has_lfs_attrs(repo_path, t)
+            if results[t]:
+                break
+        found = any(results.values())
+        if not found:
+            sizes = (0, LFS_POINTER_MAX_SIZE) if self.detect_mode == "full" else LFS_PLAIN_POINTER_SIZES
+            found = self._has_pointer_blobs(repo_path, sizes)
+            results = {t: found for t in todo}
+        if self.state is not None:
+            self.state.save_lfs_tips(results, mode=self.detect_mode)
+        return found
+
+    def _tip_has_lfs_attrs(self, repo_path: str, tip: str) -> bool:
+        """Есть ли filter=lfs в каком-либо .gitattributes дерева вершины."""
+        paths = [
+            p for p in run(f"git ls-tree -r --name-only -z {tip}", cwd=repo_path).split("\0")
+            if p == ".gitattributes" or p.endswith("/.gitattributes")
+        ]
+        if not paths:
+            return False
+        blobs = cat_file_batch(repo_path, [f"{tip}:{p}" for p in paths])
+        return any(b and _LFS_ATTR_RE.search(b) for b in blobs.values())
+
+    def _has_pointer_blobs(self, repo_path: str, sizes: tuple = (0, LFS_POINTER_MAX_SIZE)) -> bool:
+        """Есть ли среди объектов репозитория blob с сигнатурой LFS-указателя (размер в пределах sizes)."""
+        scan = _PointerScan(repo_path, first_only=True, sizes=sizes)
+        run(
+            "git cat-file --batch-all-objects --batch-check='%(objectname) %(objecttype) %(objectsize)'",
+            cwd=repo_path, on_line=scan.header, capture=False,
+        )
+        return scan.flush()
+
+    def scan_range(
+        self,
+        repo_path: str,
+        tips: List[str],
+        exclude: List[str] | None = None,
+        timeout: float | None = None,
+    ) -> Dict[str, int]:
+        """
+        {oid: size} LFS-указателей во всех коммитах, достижимых из tips и недостижимых
+        из exclude (git rev-list --objects tips --not exclude) — для инкрементального sync:
+        объекты промежуточных коммитов, а не только вершин. git-lfs не нужен.
+        """
+        if not tips:
+            return {}
+        scan = _PointerScan(repo_path, timeout=timeout)
+        pending: List[str] = []
+        failed: List[Exception] = []
+
+        def check_pending() -> None:
+            batch = pending[:]
+            pending.clear()
+            cat_file_stream(
+                repo_path, batch,
+                lambda spec, header: header is not None and scan.header(header),
+                check=True, timeout=timeout,
+            )
+
+        def on_object(line: str) -> bool:
+            pending.append(line.strip())
+            if len(pending) >= POINTER_BATCH:
+                try:
+                    check_pending()
+                except Exception as e:
+                    # ошибка в потоке чтения вывода: останавливаем rev-list и пробрасываем ниже
+                    failed.append(e)
+                    return True
+            return False
+
+        cmd = "git rev-list --objects --no-object-names --ignore-missing "
+        cmd += f"--filter=blob:limit={LFS_POINTER_MAX_SIZE} " + " ".join(tips)
+        if exclude:
+            cmd += " --not " + " ".join(exclude)
+        try:
+            run(cmd, cwd=repo_path, on_line=on_object, capture=False, timeout=timeout)
+            if failed:
+                raise failed[0]
+            check_pending()
+            scan.flush()
+        except Exception as e:
+            raise LfsError(f"поиск LFS-указателей: {e}") from e
+        return scan.objects
+
+    def scan(self, repo_path: str, refs: List[str] | None = None) -> Dict[str, int]:
+        """{oid: size} LFS-объектов истории всех refs (или вершин refs)."""
+        if not refs and not list_refs(repo_path):
+            return {}  # пустой репозиторий
+        target = " ".join(shlex.quote(r) for r in refs) if refs else "--all"
+        if self.json_output:
+            try:
+                data = json.loads(self._git(f"ls-files --json {target}", repo_path) or "{}")
+            except ValueError as e:
+                raise LfsError(f"git lfs ls-files: некорректный JSON: {e}") from e
+            except Exception as e:
+                raise LfsError(f"git lfs ls-files: {e}") from e
+            return {f["oid"]: int(f.get("size") or 0) for f in data.get("files") or []}
+        # git-lfs < 3.3: без --json, размер только в человекочитаемом виде
+        objects = {}
+        for line in self._git(f"ls-files --long --size {target}", repo_path).splitlines():
+            parts = line.split()
+            if len(parts) >= 3:
+                size = line.rsplit("(", 1)[-1].rstrip(")") if line.endswith(")") else ""
+                objects[parts[0]] = _parse_size(size) or 0
+        return objects
+
+    def fetch(
+        self,
+        repo_path: str,
+        stats: Dict,
+        objects: Dict[str, int],
+        refs: List[str] | None = None,
+        remote_name: str = "origin",
+        timeout: float | None = None,
+        on_progress=None,
+    ) -> Dict:
+        """Скачивает недостающие локально объекты; уже лежащие в общем хранилище не качаются."""
+        missing = {oid: size for oid, size in objects.items() if oid not in self._local(repo_path, objects)}
+        if not missing:
+            return stats
+        target = " ".join(shlex.quote(r) for r in refs) if refs else "--all"
+        try:
+            self._git(f"fetch {remote_name} {target}", repo_path, timeout=timeout, on_progress=on_progress, capture=False, transfer=True)
+        except Exception as e:
+            raise LfsError(f"git lfs fetch: {e}") from e
+        got = self._local(repo_path, missing)
+        stats["downloaded_objects"] += len(got)
+        stats["downloaded_bytes"] += sum(got.values())
+        return stats
+
+    def missing_on_server(self, remote_url: str, objects: Dict[str, int]) -> Dict[str, int] | None:
+        """
+        Объекты, которых нет на LFS-сервере (batch API, operation=upload: сервер
+        возвращает actions только для отсутствующих). None — проверка недоступна
+        (SSH-адрес, ошибка API): тогда решение остаётся за git lfs push.
+        """
+        u = urlparse(remote_url)
+        if u.scheme not in ("http", "https") or not objects:
+            return None if objects else {}
+        auth = (unquote(u.username or ""), unquote(u.password or "")) if u.username else None
+        netloc = u.hostname + (f":{u.port}" if u.port else "")
+        url = lfs_batch_url(urlunparse(u._replace(netloc=netloc)))
+        headers = {"Accept": "application/vnd.git-lfs+json", "Content-Type": "application/vnd.git-lfs+json"}
+        items = list(objects.items())
+        missing = {}
+        try:
+            for i in range(0, len(items), LFS_BATCH_OBJECTS):
+                chunk = items[i:i + LFS_BATCH_OBJECTS]
+                resp = requests.post(
+                    url,
+                    json={
+                        "operation": "upload",
+                        "transfers": ["basic"],
+                        "objects": [{"oid": oid, "size": size} for oid, size in chunk],
+                    },
+                    headers=headers, auth=auth, verify=self.verify_tls, timeout=self.http_timeout,
+                )
+                if resp.status_code != 200:
+                    return None
+                for obj in resp.json().get("objects") or []:
+                    if obj.get("error") or obj.get("actions"):
+                        missing[obj["oid"]] = int(obj.get("size") or objects.get(obj["oid"], 0))
+        except (requests.RequestException, ValueError, KeyError):
+            return None
+        return missing
+
+    def push(
+        self,
+        repo_path: str,
+        stats: Dict,
+        objects: Dict[str, int],
+        remote_name: str,
+        remote_url: str,
+        only_objects: bool = False,
+        timeout: float | None = None,
+        on_progress=None,
+    ) -> Dict:
+        """
+        Загружает в GitFlic только отсутствующие на сервере объекты. only_objects — и без
+        проверки на сервере загружать только objects (по oid), а не всю историю (--all).
+        """
+        local = self._local(repo_path, objects)
+        missing = self.missing_on_server(remote_url, local)
+        try:
+            if missing is None and not only_objects:
+                self._git(f"push {remote_name} --all", repo_path, timeout=timeout, on_progress=on_progress, capture=False, transfer=True)
+                stats["uploaded_objects"] += len(local)
+                stats["uploaded_bytes"] += sum(local.values())
+                return stats
+            upload = missing if missing is not None else local
+            oids = sorted(upload)
+            for i in range(0, len(oids), LFS_PUSH_OIDS):
+                chunk = " ".join(oids[i:i + LFS_PUSH_OIDS])
+                self._git(
+                    f"push --object-id {remote_name} {chunk}",
+                    repo_path, timeout=timeout, on_progress=on_progress, capture=False, transfer=True,
+                )
+        except Exception as e:
+            raise LfsError(f"git lfs push: {e}") from e
+        stats["uploaded_objects"] += len(upload)
+        stats["uploaded_bytes"] += sum(upload.values())
+        stats["skipped_objects"] += len(local) - len(upload)
+        return stats
@@ -0,0 +1,136 @@
+\
+import os
+import time
+import threading
+from typing import Dict
+
+# Этапы переноса репозитория, время которых учитывается отдельно (item["timings_s"])
+TIMED_STAGES = ("api_create", "clone", "lfs_detect", "lfs_fetch", "push", "lfs_push", "cleanup")
+
+# Объём передачи по направлениям (item["bytes"])
+BYTE_KINDS = ("clone", "push", "lfs_downloaded", "lfs_uploaded")
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsExporter:
+    """
+    Метрики прогона в формате Prometheus textfile (node_exporter --collector.textfile).
+    Файл перезаписывается атомарно (временный файл + rename) не чаще раза в interval
+    секунд по ходу миграции и в конце прогона, поэтому по нему можно строить графики
+    пропускной способности и искать узкие этапы на многочасовых миграциях.
+    Для textfile collector имя файла должно оканчиваться на .prom.
+    Безопасно для использования из нескольких потоков.
+    """
+
+    def __init__(self, path: str, interval: float = 10.0) -> None:
+        self.path = path
+        self.interval = max(0.0, float(interval))
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+        self._started = time.time()
+        self.planned = 0
+        self.in_progress = 0
+        self.repos: Dict[str, int] = {}
+        self.stage_seconds: Dict[str, float] = {s: 0.0 for s in TIMED_STAGES}
+        self.stage_runs: Dict[str, int] = {s: 0 for s in TIMED_STAGES}
+        self.bytes: Dict[str, int] = {k: 0 for k in BYTE_KINDS}
+        self.rates: list = []
+
+    def attach_rate(self, rate) -> None:
+        """Добавляет в экспорт статистику RateController (запросы, повторы, автомат)."""
+        if rate is not None:
+            with self._lock:
+                self.rates.append(rate)
+
+    def set_planned(self, n: int) -> None:
+        with self._lock:
+            self.planned = n
+        self.flush()
+
+    def repo_started(self) -> None:
+        with self._lock:
+            self.in_progress += 1
+        self.flush()
+
+    def repo_finished(self, status: str, transferred: Dict[str, int] | None = None, started: bool = True) -> None:
+        with self._lock:
+            if started:
+                self.in_progress = max(0, self.in_progress - 1)
+            self.repos[status] = self.repos.get(status, 0) + 1
+            for kind, n in (transferred or {}).items():
+                self.bytes[kind] = self.bytes.get(kind, 0) + int(n or 0)
+        self.flush()
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+            self.stage_runs[stage] = self.stage_runs.get(stage, 0) + 1
+        self.flush()
+
+    def render(self) -> str:
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+
+        with self._lock:
+            metric("bb2gf_run_start_timestamp_seconds", "gauge", "Время начала прогона (unix)", [({}, round(self._started, 3))])
+            metric("bb2gf_repos_planned", "gauge", "Репозиториев в прогоне", [({}, self.planned)])
+            metric("bb2gf_repos_in_progress", "gauge", "Репозиториев в работе", [({}, self.in_progress)])
+            metric(
+                "bb2gf_repos_finished_total", "counter", "Завершённые репозитории по статусу",
+                [({"status": s}, n) for s, n in sorted(self.repos.items())],
+            )
+            metric(
+                "bb2gf_stage_seconds_total", "counter", "Суммарное время этапа переноса, с",
+                [({"stage": s}, round(v, 3)) for s, v in self.stage_seconds.items()],
+            )
+            metric(
+                "bb2gf_stage_runs_total", "counter", "Число выполнений этапа переноса",
+                [({"stage": s}, n) for s, n in self.stage_runs.items()],
+            )
+            metric(
+                "bb2gf_transfer_bytes_total", "counter", "Передано байт по направлениям",
+                [({"kind": k}, n) for k, n in self.bytes.items()],
+            )
+            rates = list(self.rates)
+        for rate in rates:
+            stats = dict(rate.stats)
+            metric(
+                "bb2gf_api_events_total", "counter", "Запросы к API: отправлено, повторов, 429/503, ошибок, размыканий",
+                [({"server": rate.name, "event": k}, v) for k, v in stats.items()],
+            )
+            metric("bb2gf_api_concurrency_limit", "gauge", "Текущий лимит одновременных запросов к API",
+                   [({"server": rate.name}, round(rate.limit, 2))])
+            metric("bb2gf_api_circuit_open", "gauge", "Автомат API разомкнут (1) или замкнут (0)",
+                   [({"server": rate.name}, int(rate.circuit_open))])
+        metric("bb2gf_last_update_timestamp_seconds", "gauge", "Время обновления файла (unix)", [({}, round(time.time(), 3))])
+        return "\n".join(lines) + "\n"
+
+    def flush(self, force: bool = False) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_write < self.interval:
+                return
+            self._last_write = now
+        text = self.render()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, self.path)
+        except OSError:
+            # метрики — вспомогательный вывод: ошибка записи не прерывает миграцию
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
@@ -2,9 +2,12 @@
 import os
 import json
 import time
+import queue
+import shutil
+import threading
+from contextlib import contextmanager
 from typing import List, Dict
 from rich.console import Console
-from rich.json import JSON
 from rich.progress import (
     Progress,
     SpinnerColumn,
@@ -15,19 +18,924 @@ from rich.progress import (
     TimeRemainingColumn,
 )
 
-from src.core.utils import load_yaml, make_alias, match_any
+from src.core.utils import load_yaml, human_bytes, repo_size
+from src.core.state import StateStore, repo_key, mirror_path, stage_index, STATUS_DONE
+from src.core.objcache import ObjectCache
+from src.core.workdir import WorkdirManager
+from src.core.relay import relay_repository, RELAY_BATCH_REFS
+from src.core.lfs import LfsEngine, new_lfs_stats
+from src.core.projects import ProjectIndex
+from src.core.metrics import MetricsExporter
+from src.core.report import ReportWriter
+from src.core.naming import NamingEngine, collision_message
+from src.core.lease import LeaseStore, LEASE_BUSY, LEASE_FINISHED, LEASE_POLL
 from src.core.git_ops import (
     with_https_creds,
+    strip_creds,
     clone_mirror,
-    lfs_fetch_all,
+    update_mirror,
+    set_remote_url,
+    list_refs,
     add_remote,
     push_mirror,
-    lfs_push_all,
-    lfs_repo_has_content,
+    push_ref_batches,
+    diff_refs,
 )
 
 console = Console()
 
+REPO_STEPS = 5
+
+# Стадии конвейера: fetch нагружает Bitbucket (create + clone + lfs fetch),
+# push нагружает GitFlic (push --mirror + lfs push)
+STAGES = ("fetch", "push")
+
+OVERALL_TITLE = "[bold]Миграция репозиториев[/bold]"
+
+
+def _new_stage_stats(workers: int) -> dict:
+    return {
+        "workers": workers,
+        "processed": 0,
+        "wait_s_total": 0.0,
+        "wait_s_max": 0.0,
+        "busy_s_total": 0.0,
+    }
+
+
+COUNTERS = ("total", "created", "exists", "lfs_pushed", "skipped", "errors")
+
+
+def summarize_items(items: List[Dict]) -> Dict:
+    """Счётчики сводки по списку элементов отчёта (например, по одному проекту)."""
+    return {
+        "total": len(items),
+        "created": sum(1 for it in items if it.get("created")),
+        "exists": sum(1 for it in items if it.get("exists")),
+        "lfs_pushed": sum(1 for it in items if it.get("lfs_pushed")),
+        "skipped": sum(1 for it in items if it.get("status") == "SKIPPED"),
+        "errors": sum(1 for it in items if it.get("status") == "FAILED"),
+        "lfs_objects": sum((it.get("lfs") or {}).get("objects", 0) for it in items),
+        "lfs_bytes": sum((it.get("lfs") or {}).get("bytes", 0) for it in items),
+        "lfs_uploaded_bytes": sum((it.get("lfs") or {}).get("uploaded_bytes", 0) for it in items),
+    }
+
+
+def _lfs_summary(stats: dict | None) -> str:
+    if stats is None:
+        return "н/д"
+    if not stats["objects"]:
+        return "нет"
+    return (
+        f"{stats['objects']} объектов, {human_bytes(stats['bytes'])}, "
+        f"загружено {human_bytes(stats['uploaded_bytes'])}"
+    )
+
+
+class MigrationPipeline:
+    """
+    Конвейер переноса из двух стадий. fetch-воркеры (fetch_jobs) нагружают Bitbucket:
+    фильтры, проект в GitFlic, clone --mirror и lfs fetch; готовый ctx репозитория
+    уходит в очередь ёмкостью queue_size. push-воркеры (push_jobs) нагружают GitFlic:
+    push --mirror (или порциями push_batch, или relay) и lfs push. Когда push не
+    успевает, fetch останавливается, а не копит клоны на диске.
+    Этапы репозитория фиксируются в state: resume продолжает с последнего этапа.
+    Репозитории идут от крупных к мелким; если размеры известны, прогресс считается
+    в байтах. lease — аренда для запуска на нескольких хостах по одному списку.
+    """
+
+    def __init__(
+        self,
+        owner_alias: str,
+        owner_type: str,
+        visibility_private: bool,
+        language_default: str,
+        use_ssh: bool,
+        dry_run: bool,
+        workdir: str,
+        keep_clones: bool,
+        gf_client,
+        naming_engine: NamingEngine,
+        gf_git_user: str | None = None,
+        gf_git_pass: str | None = None,
+        bb_git_user: str | None = None,
+        bb_git_pass: str | None = None,
+        jobs: int = 1,
+        fetch_jobs: int | None = None,
+        push_jobs: int | None = None,
+        queue_size: int | None = None,
+        state: StateStore | None = None,
+        resume: bool = False,
+        git_timeout: float | None = None,
+        object_cache: ObjectCache | None = None,
+        workspace: WorkdirManager | None = None,
+        transfer: str = "mirror",
+        relay_batch: int | None = None,
+        push_batch: int | None = None,
+        push_batch_jobs: int = 1,
+        lfs_engine: LfsEngine | None = None,
+        project_index: ProjectIndex | None = None,
+        metrics: MetricsExporter | None = None,
+        report_writer: ReportWriter | None = None,
+        lease: LeaseStore | None = None,
+    ) -> None:
+        jobs = max(1, int(jobs or 1))
+        self.owner_alias = owner_alias
+        self.owner_type = owner_type
+        self.visibility_private = visibility_private
+        self.language_default = language_default
+        self.use_ssh = use_ssh
+        self.dry_run = dry_run
+        self.workdir = workdir
+        self.keep_clones = keep_clones
+        self.naming_engine = naming_engine
+        self.gf_git_user, self.gf_git_pass = gf_git_user, gf_git_pass
+        self.bb_git_user, self.bb_git_pass = bb_git_user, bb_git_pass
+        self.fetch_jobs = max(1, int(fetch_jobs or jobs))
+        self.push_jobs = max(1, int(push_jobs or jobs))
+        self.queue_size = max(1, int(queue_size or self.push_jobs))
+        self.parallel = self.fetch_jobs > 1 or self.push_jobs > 1
+        self.resume = resume
+        self.git_timeout = git_timeout
+        self.object_cache = object_cache
+        self.workspace = workspace
+        self.transfer = transfer
+        self.relay_batch = max(1, int(relay_batch or RELAY_BATCH_REFS))
+        self.push_batch = push_batch
+        self.push_batch_jobs = push_batch_jobs
+        self.metrics = metrics
+        self.report_writer = report_writer
+        self.lease = lease
+        self.api_rate = getattr(gf_client, "rate", None)
+
+        os.makedirs(workdir, exist_ok=True)
+        self.lfs_engine = lfs_engine if lfs_engine is not None else LfsEngine(workdir)
+        self.project_index = project_index if project_index is not None else ProjectIndex(gf_client, owner_type)
+        if state is None and not dry_run:
+            state = StateStore.for_workdir(workdir)
+        self.state = state
+
+        # summary изменяется из нескольких потоков — все изменения только под локом
+        self._lock = threading.Lock()
+        self.summary = {
+            "total": 0,
+            "created": 0,
+            "exists": 0,
+            "lfs_pushed": 0,
+            "skipped": 0,
+            "errors": 0,
+            "lfs_objects": 0,
+            "lfs_bytes": 0,
+            "lfs_uploaded_bytes": 0,
+            "other_hosts": 0,
+            "items": [],
+            "pipeline": {
+                "queue_size": self.queue_size,
+                "queue_depth_max": 0,
+                "queue_depth_avg": 0.0,
+                "stages": {
+                    "fetch": _new_stage_stats(self.fetch_jobs),
+                    "push": _new_stage_stats(self.push_jobs),
+                },
+            },
+        }
+        self._depth_samples: List[int] = []
+        self._collided: Dict[int, str] = {}
+        self._by_bytes = False
+        self._default_weight = 1
+        self._total_weight = 0
+        self._credited_total = 0
+        self.progress: Progress | None = None
+        self._overall = None
+        # вход конвейера не ограничен (это просто список репозиториев),
+        # очередь fetch → push ограничена queue_size
+        self._fetch_q: queue.Queue = queue.Queue()
+        self._push_q: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        # время постановки в очередь fetch (id репозитория → perf_counter): ожидание считается от него
+        self._fetch_enqueued: Dict[int, float] = {}
+        # репозитории, которые сейчас переносят другие хосты (lease): перепроверяются позже
+        self._deferred: List[Dict] = []
+
+    # --- сводка ---
+
+    def _bump(self, key: str, n: int = 1):
+        with self._lock:
+            self.summary[key] += n
+
+    def _add_item(self, item: dict):
+        lfs = item.get("lfs") or {}
+        with self._lock:
+            self.summary["lfs_objects"] += lfs.get("objects", 0)
+            self.summary["lfs_bytes"] += lfs.get("bytes", 0)
+            self.summary["lfs_uploaded_bytes"] += lfs.get("uploaded_bytes", 0)
+            if self.report_writer is None:
+                self.summary["items"].append(item)
+        if self.report_writer is not None:
+            self.report_writer.write(item)
+
+    def _record_stage(self, stage: str, wait_s: float, busy_s: float):
+        with self._lock:
+            st = self.summary["pipeline"]["stages"][stage]
+            st["processed"] += 1
+            st["wait_s_total"] += wait_s
+            st["wait_s_max"] = max(st["wait_s_max"], wait_s)
+            st["busy_s_total"] += busy_s
+
+    def _record_depth(self, depth: int):
+        with self._lock:
+            self._depth_samples.append(depth)
+            pl = self.summary["pipeline"]
+            pl["queue_depth_max"] = max(pl["queue_depth_max"], depth)
+
+    def _close_summary(self) -> Dict:
+        summary = self.summary
+        pl = summary["pipeline"]
+        if self._depth_samples:
+            pl["queue_depth_avg"] = round(sum(self._depth_samples) / len(self._depth_samples), 2)
+        for st in pl["stages"].values():
+            st["wait_s_total"] = round(st["wait_s_total"], 2)
+            st["wait_s_max"] = round(st["wait_s_max"], 2)
+            st["busy_s_total"] = round(st["busy_s_total"], 2)
+        if self.api_rate is not None:
+            summary["api"] = dict(self.api_rate.stats)
+        if self.lease is not None:
+            summary["lease"] = {"holder": self.lease.holder, "lost": sorted(self.lease.lost)}
+        if self.report_writer is not None:
+            summary["items_file"] = self.report_writer.path
+            summary["run_id"] = self.report_writer.run_id
+        return summary
+
+    # --- прогресс и учёт репозитория ---
+
+    def _weight(self, r: Dict) -> int:
+        return (repo_size(r) or self._default_weight) if self._by_bytes else 1
+
+    def _credit(self, ctx: dict, upto: float):
+        """Засчитывает в общий прогресс долю веса репозитория (только вперёд, не больше веса)."""
+        upto = min(int(upto), ctx["weight"])
+        delta = upto - ctx["credited"]
+        if delta <= 0:
+            return
+        ctx["credited"] = upto
+        with self._lock:
+            self._credited_total += delta
+            done = self._credited_total
+        if self._by_bytes:
+            self.progress.update(
+                self._overall,
+                advance=delta,
+                description=f"{OVERALL_TITLE} [dim]{human_bytes(done)} / {human_bytes(self._total_weight)}[/dim]",
+            )
+        else:
+            self.progress.advance(self._overall, delta)
+
+    def _make_log(self, name: str):
+        def log(msg: str):
+            # при параллельной работе строки разных репозиториев перемешиваются
+            if self.parallel:
+                self.progress.console.print(f"[dim]\\[{name}][/dim]", msg)
+            else:
+                self.progress.console.print(msg)
+        return log
+
+    def _finish(self, ctx: dict, status: str | None = None, message: str | None = None):
+        item = ctx["item"]
+        if status is not None:
+            item["status"] = status
+        if message is not None:
+            item["message"] = message
+        item["duration_s"] = round(time.perf_counter() - ctx["started"], 2)
+        xfer = ctx.get("xfer") or {}
+        lfs_stats = item.get("lfs") or ctx.get("lfs_stats") or {}
+        item["bytes"] = {
+            "clone": sum(xfer.get("clone", [0, 0])),
+            "push": sum(xfer.get("push", [0, 0])),
+            "lfs_downloaded": lfs_stats.get("downloaded_bytes", 0),
+            "lfs_uploaded": lfs_stats.get("uploaded_bytes", 0),
+        }
+        self._add_item(item)
+        if self.lease is not None and ctx.get("key"):
+            self.lease.release(ctx["key"], ok=item["status"] != "FAILED")
+        if self.metrics is not None:
+            self.metrics.repo_finished(item["status"], item["bytes"], started=ctx.get("repo_task") is not None)
+        if self.workspace is not None and ctx.get("key"):
+            self.workspace.release(ctx["key"], ctx.get("repo_path"))
+        if ctx.get("repo_task") is not None:
+            self.progress.update(ctx["repo_task"], completed=REPO_STEPS)
+        self._credit(ctx, ctx["weight"])
+
+    def _fail(self, ctx: dict, message: str):
+        """Репозиторий упал после state.start: в отчёт и в state."""
+        self._bump("errors")
+        self._finish(ctx, "FAILED", message)
+        if self.state is not None:
+            self.state.mark_failed(ctx["key"], message)
+
+    @contextmanager
+    def _timed(self, ctx: dict, stage: str):
+        """Добавляет длительность блока к item["timings_s"][stage] (этап может идти несколько раз)."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            dt = time.perf_counter() - t0
+            timings = ctx["item"]["timings_s"]
+            timings[stage] = round(timings.get(stage, 0.0) + dt, 3)
+            if self.metrics is not None:
+                self.metrics.observe_stage(stage, dt)
+
+    def _count_bytes(self, ctx: dict, kind: str, n: int):
+        """Объём передачи по прогрессу git; новая команда начинает счёт с нуля — прошлую прибавляем."""
+        with self._lock:
+            done, current = ctx.setdefault("xfer", {}).setdefault(kind, [0, 0])
+            if n < current:
+                done += current
+            ctx["xfer"][kind] = [done, n]
+
+    def _progress_cb(self, ctx: dict):
+        """Отображает прогресс git (объекты, объём, скорость) в строке репозитория."""
+        def on_progress(p: dict):
+            if p.get("bytes") is not None and p["phase"] in ("Receiving objects", "Writing objects"):
+                self._count_bytes(ctx, "clone" if p["phase"] == "Receiving objects" else "push", p["bytes"])
+            parts = [f"{p['phase']} {p['percent']}%"]
+            if p.get("bytes") is not None:
+                parts.append(human_bytes(p["bytes"]))
+            if p.get("rate_bps") is not None:
+                parts.append(f"{human_bytes(p['rate_bps'])}/s")
+            self.progress.update(
+                ctx["repo_task"],
+                description=f"[white]{ctx['name']}[/white] [dim]{' · '.join(parts)}[/dim]",
+            )
+            # в байтовом режиме двигаем общий прогресс по ходу передачи: clone — первая
+            # половина веса репозитория, push — вторая
+            if self._by_bytes and p.get("bytes"):
+                if p["phase"] == "Receiving objects":
+                    self._credit(ctx, min(p["bytes"], ctx["weight"]) / 2)
+                elif p["phase"] == "Writing objects":
+                    self._credit(ctx, ctx["weight"] / 2 + min(p["bytes"], ctx["weight"]) / 2)
+        return on_progress
+
+    def _reset_description(self, ctx: dict):
+        self.progress.update(ctx["repo_task"], description=f"[white]{ctx['name']}[/white]")
+
+    def _mark(self, ctx: dict, stage: str, **fields):
+        if self.state is not None:
+            self.state.set_stage(ctx["key"], stage, **fields)
+
+    # --- проекты GitFlic ---
+
+    def project_payload(self, r: Dict) -> Dict:
+        name = r.get("name") or r.get("slug")
+        payload = {
+            "title": name,
+            "isPrivate": self.visibility_private,
+            "alias": self.naming_engine.repo_alias(r),
+            "ownerAlias": r.get("owner_alias") or self.owner_alias,
+            "ownerAliasType": self.owner_type,
+            "description": (r.get("description") or "")[:500],
+        }
+        if self.language_default:
+            payload["language"] = self.language_default
+        return payload
+
+    def needs_project(self, r: Dict) -> bool:
+        """Проект понадобится: репозиторий проходит фильтры и ещё не создан в прошлых прогонах."""
+        name = r.get("name") or r.get("slug")
+        if self.naming_engine.skip_reason(name) or id(r) in self._collided:
+            return False
+        if not ((self.use_ssh and r.get("clone_ssh")) or r.get("clone_http")):
+            return False
+        if self.resume and self.state is not None:
+            payload = self.project_payload(r)
+            saved = self.state.get_repo(repo_key(payload["ownerAlias"], payload["alias"]))
+            if saved and (saved.get("status") == STATUS_DONE or (
+                stage_index(saved.get("stage")) >= stage_index("created") and saved.get("dst_url")
+            )):
+                return False
+        return True
+
+    def _open_project(self, ctx: dict, r: Dict, saved: Dict | None, done_idx: int) -> Dict | None:
+        """Проект в GitFlic для репозитория: {transport URL} или None, если создать не удалось."""
+        log, item, repo_task = ctx["log"], ctx["item"], ctx["repo_task"]
+        payload = self.project_payload(r)
+        if done_idx >= stage_index("created") and saved.get("dst_url"):
+            log(f"[cyan]RESUME[/cyan] с этапа {saved['stage']}: проект в GitFlic уже создан")
+            self.progress.advance(repo_task)
+            return {"httpTransportUrl": saved["dst_url"], "sshTransportUrl": saved["dst_url"]}
+        if self.dry_run:
+            if self.project_index.lookup(ctx["owner"], ctx["alias"]) is not None:
+                log("[yellow]DRY-RUN[/yellow] Проект уже есть в GitFlic — будет переиспользован")
+                self._bump("exists")
+                item["exists"] = True
+            else:
+                log(f"[yellow]DRY-RUN[/yellow] Создание проекта в GitFlic: {payload}")
+                self._bump("created")
+                item["created"] = True
+            self.progress.advance(repo_task)
+            return {"httpTransportUrl": "<dry-run>", "sshTransportUrl": "<dry-run>"}
+
+        try:
+            with self._timed(ctx, "api_create"):
+                result, code, data = self.project_index.ensure(payload)
+        except Exception as e:
+            # сеть, разомкнутый автомат API — репозиторий должен попасть в отчёт и state
+            log(f"[red]Ошибка создания проекта GitFlic[/red]: {e}")
+            self._fail(ctx, f"Ошибка создания проекта: {str(e)[-500:]}")
+            return None
+        if result == "exists":
+            log("[cyan]Проект уже есть в GitFlic — переиспользую[/cyan]")
+            self._bump("exists")
+            item["exists"] = True
+        elif result == "created":
+            log(f"[green]Создан проект в GitFlic[/green]")
+            self._bump("created")
+            item["created"] = True
+            if self.state is not None:
+                # новый проект пуст: refs прошлых попыток в state неактуальны
+                self.state.set_pushed_refs(ctx["key"], {})
+        else:
+            log(f"[red]Ошибка создания проекта GitFlic [{code}][/red]: {data}")
+            self._fail(ctx, f"Ошибка создания проекта: {code}")
+            return None
+        self.progress.advance(repo_task)
+        return data
+
+    # --- стадия fetch ---
+
+    def _new_ctx(self, r: Dict) -> dict:
+        name = r.get("name") or r.get("slug")
+        alias = self.naming_engine.repo_alias(r)
+        repo_owner = r.get("owner_alias") or self.owner_alias
+        item = {
+            "project_key": r.get("project_key"),
+            "base_url": r.get("base_url"),
+            "repo": name,
+            "owner": repo_owner,
+            "alias": alias,
+            "created": False,
+            "lfs": None,
+            "duration_s": None,
+            "status": "PENDING",
+            "message": "",
+            "size_bytes": r.get("size_bytes"),
+            "wait_s": {},
+            "timings_s": {},
+        }
+        if self.lease is not None:
+            item["host"] = self.lease.holder
+        return {
+            "name": name,
+            "alias": alias,
+            "owner": repo_owner,
+            "key": repo_key(repo_owner, alias),
+            "project_key": r.get("project_key"),
+            "item": item,
+            "started": time.perf_counter(),
+            "log": self._make_log(name),
+            "repo_task": None,
+            "weight": self._weight(r),
+            "credited": 0,
+        }
+
+    def fetch_stage(self, r: Dict) -> dict | None:
+        """Фильтры, создание проекта, clone --mirror и lfs fetch. Возвращает ctx для push или None."""
+        self._bump("total")
+        ctx = self._new_ctx(r)
+        name, alias, log, item = ctx["name"], ctx["alias"], ctx["log"], ctx["item"]
+
+        skip_reason = self.naming_engine.skip_reason(name)
+        if skip_reason:
+            self._bump("skipped")
+            self._finish(ctx, "SKIPPED", skip_reason)
+            return None
+        if id(r) in self._collided:
+            log(f"[red]{self._collided[id(r)]}[/red]")
+            self._bump("errors")
+            self._finish(ctx, "FAILED", self._collided[id(r)])
+            return None
+
+        ctx["repo_task"] = self.progress.add_task(f"[white]{name}[/white]", total=REPO_STEPS)
+        if self.metrics is not None:
+            self.metrics.repo_started()
+
+        if not self.parallel:
+            self.progress.console.rule(f"[bold]Репозиторий: {name} → alias={alias}")
+        else:
+            log(f"[bold]Репозиторий → alias={alias}[/bold]")
+        src_url = r.get("clone_ssh") if self.use_ssh and r.get("clone_ssh") else r.get("clone_http")
+        if not src_url:
+            log(f"[red]Нет clone URL в Bitbucket для {name}[/red]")
+            self._bump("errors")
+            self._finish(ctx, "FAILED", "Нет clone URL в Bitbucket")
+            return None
+        if (not self.use_ssh) and src_url.startswith("http"):
+            src_url = with_https_creds(src_url, self.bb_git_user, self.bb_git_pass)
+        ctx["src_url"] = src_url
+
+        saved = self.state.get_repo(ctx["key"]) if (self.resume and self.state is not None) else None
+        done_idx = stage_index(saved.get("stage")) if saved else -1
+        if saved and saved.get("status") == STATUS_DONE:
+            self._bump("skipped")
+            log("[cyan]RESUME[/cyan] уже перенесён — пропускаю")
+            self._finish(ctx, "SKIPPED", "Уже перенесён (resume)")
+            return None
+        if done_idx >= 0:
+            item["resumed_from"] = saved["stage"]
+        if self.state is not None:
+            self.state.start(
+                ctx["key"],
+                repo=name,
+                alias=alias,
+                project_key=ctx["project_key"],
+                src_url=strip_creds(src_url),
+            )
+
+        created_json = self._open_project(ctx, r, saved, done_idx)
+        if created_json is None:
+            return None
+        if self.use_ssh:
+            dst_url = created_json.get("sshTransportUrl")
+        else:
+            dst_url = created_json.get("httpTransportUrl")
+            dst_url = with_https_creds(dst_url, self.gf_git_user, self.gf_git_pass)
+        ctx["dst_url"] = dst_url
+        if done_idx < stage_index("created"):
+            self._mark(ctx, "created", dst_url=strip_creds(dst_url))
+
+        repo_path = mirror_path(self.workdir, ctx["owner"], alias)
+        ctx["repo_path"] = repo_path
+        if done_idx >= stage_index("cloned") and not os.path.isdir(repo_path):
+            # зеркало не сохранилось — придётся клонировать заново
+            done_idx = stage_index("created")
+        ctx["done_idx"] = done_idx
+        try:
+            self._fetch_mirror(ctx, r)
+        except Exception as e:
+            log(f"[red]Ошибка переноса {name}[/red]: {e}")
+            self._fail(ctx, str(e))
+            return None
+        return ctx
+
+    def _fetch_mirror(self, ctx: dict, r: Dict):
+        """clone --mirror (или fetch сохранённого зеркала) и lfs fetch."""
+        log, repo_path, src_url, done_idx = ctx["log"], ctx["repo_path"], ctx["src_url"], ctx["done_idx"]
+        reuse = (self.keep_clones or self.workspace is not None) and os.path.isdir(repo_path)
+        if self.workspace is not None and not self.dry_run:
+            # резерв держится до конца переноса: зеркало в работе не вытесняется
+            evicted = self.workspace.reserve(ctx["key"], repo_path, repo_size(r))
+            if evicted:
+                log(f"[dim]Вытеснены зеркала (бюджет WORKDIR): {', '.join(evicted)}[/dim]")
+        if self.transfer == "relay" and done_idx < stage_index("pushed"):
+            # в режиме relay fetch и push идут порциями в стадии push
+            return
+        if done_idx >= stage_index("cloned"):
+            log(f"[cyan]RESUME[/cyan] зеркало уже склонировано: {repo_path}")
+        elif self.dry_run:
+            log(f"[yellow]DRY-RUN[/yellow] git clone --mirror {src_url} {repo_path}")
+        elif reuse:
+            log(f"[green]MIGRATING[/green] git fetch --prune origin ({repo_path})")
+            set_remote_url(repo_path, "origin", src_url)
+            with self._timed(ctx, "clone"):
+                update_mirror(repo_path, timeout=self.git_timeout, on_progress=self._progress_cb(ctx))
+        else:
+            if os.path.exists(repo_path):
+                # остатки прерванного прогона: clone --mirror в непустой каталог упадёт
+                shutil.rmtree(repo_path, ignore_errors=True)
+            references = []
+            if self.object_cache is not None:
+                references = self.object_cache.references_for(src_url, timeout=self.git_timeout)
+            log(
+                f"[green]MIGRATING[/green] git clone --mirror {src_url} {repo_path}"
+                + (" [dim](с кэшем объектов)[/dim]" if references else "")
+            )
+            with self._timed(ctx, "clone"):
+                clone_mirror(
+                    src_url, repo_path, git_ssl_no_verify=False,
+                    timeout=self.git_timeout, on_progress=self._progress_cb(ctx),
+                    references=references,
+                )
+            self._reset_description(ctx)
+        if self.object_cache is not None and not self.dry_run and done_idx < stage_index("cloned"):
+            try:
+                ctx["item"]["object_cache"] = self.object_cache.absorb(repo_path, ctx["key"], timeout=self.git_timeout)
+            except Exception as e:
+                # кэш — только оптимизация: зеркало остаётся самодостаточным
+                log(f"[yellow]Кэш объектов не обновлён[/yellow]: {e}")
+        if done_idx < stage_index("cloned"):
+            self._mark(ctx, "cloned")
+        self.progress.advance(ctx["repo_task"])
+
+        self._fetch_lfs(ctx)
+        self.progress.advance(ctx["repo_task"])
+
+    def _fetch_lfs(self, ctx: dict):
+        """
+        Находит LFS-объекты истории зеркала и докачивает отсутствующие в хранилище.
+        Полный скан истории — только если быстрая проверка вершин нашла признаки LFS.
+        """
+        repo_path, log, engine = ctx["repo_path"], ctx["log"], self.lfs_engine
+        objects = {}
+        with self._timed(ctx, "lfs_detect"):
+            if engine.available and os.path.isdir(repo_path) and engine.detect(repo_path):
+                objects = engine.scan(repo_path)
+        stats = new_lfs_stats(objects) if engine.available else None
+        if ctx["done_idx"] >= stage_index("lfs-fetched"):
+            pass
+        elif self.dry_run:
+            log("[yellow]DRY-RUN[/yellow] git lfs fetch --all")
+        else:
+            if objects:
+                log(
+                    f"[green]MIGRATING[/green] git lfs fetch --all "
+                    f"({len(objects)} объектов, {human_bytes(stats['bytes'])})"
+                )
+                with self._timed(ctx, "lfs_fetch"):
+                    engine.fetch(
+                        repo_path, stats, objects,
+                        timeout=self.git_timeout, on_progress=self._progress_cb(ctx),
+                    )
+                self._reset_description(ctx)
+            self._mark(ctx, "lfs-fetched")
+        ctx["lfs_objects"], ctx["lfs_stats"], ctx["has_lfs"] = objects, stats, bool(objects)
+
+    # --- стадия push ---
+
+    def push_stage(self, ctx: dict):
+        """push --mirror и lfs push в GitFlic, затем очистка клона."""
+        name, item, log, repo_task = ctx["name"], ctx["item"], ctx["log"], ctx["repo_task"]
+        relay = self.transfer == "relay" and ctx.get("done_idx", -1) < stage_index("pushed")
+        try:
+            if self.dry_run:
+                self._push_dry_run(ctx, relay)
+            else:
+                if relay:
+                    self._relay(ctx)
+                else:
+                    self._push_refs(ctx)
+                self.progress.advance(repo_task)
+                self._push_lfs(ctx)
+                self.progress.advance(repo_task)
+
+            with self._timed(ctx, "cleanup"):
+                self._cleanup(ctx)
+            self._finish(ctx, "OK", "Перенос завершён")
+            log(
+                f"[bold green]Успех[/bold green]: LFS={_lfs_summary(item['lfs'])}, "
+                f"время={item['duration_s']} c"
+            )
+        except Exception as e:
+            log(f"[red]Ошибка переноса {name}[/red]: {e}")
+            self._fail(ctx, str(e))
+
+    def _push_dry_run(self, ctx: dict, relay: bool):
+        log, item, repo_task, dst_url = ctx["log"], ctx["item"], ctx["repo_task"], ctx["dst_url"]
+        if relay:
+            log(f"[yellow]DRY-RUN[/yellow] relay {ctx['src_url']} → {dst_url} (порции по {self.relay_batch} refs)")
+            self.progress.advance(repo_task)
+            self.progress.advance(repo_task)
+            return
+        log(f"[yellow]DRY-RUN[/yellow] git remote add gitflic {dst_url}")
+        log(f"[yellow]DRY-RUN[/yellow] git push --mirror gitflic")
+        self.progress.advance(repo_task)
+        if ctx.get("has_lfs", False):
+            log(f"[yellow]DRY-RUN[/yellow] git lfs push --all gitflic")
+            self._bump("lfs_pushed")
+            item["lfs_pushed"] = True
+        item["lfs"] = ctx.get("lfs_stats")
+        self.progress.advance(repo_task)
+
+    def _relay(self, ctx: dict):
+        """fetch → push порциями refs внахлёст (relay_repository), затем lfs fetch."""
+        ctx["log"](f"[green]MIGRATING[/green] relay: fetch → push порциями по {self.relay_batch} refs")
+        # fetch и push в relay идут внахлёст — время учитывается как push
+        with self._timed(ctx, "push"):
+            pushed = relay_repository(
+                ctx["src_url"], ctx["repo_path"], ctx["dst_url"],
+                batch_refs=self.relay_batch,
+                timeout=self.git_timeout,
+                on_progress=self._progress_cb(ctx),
+                # успешные порции фиксируются сразу: сбой не теряет сделанное
+                on_batch=lambda refs: self.state.update_pushed_refs(ctx["key"], refs),
+            )
+        self._reset_description(ctx)
+        self.state.set_pushed_refs(ctx["key"], pushed)
+        self._mark(ctx, "cloned")
+        # LFS докачивается до отметки pushed: --resume не пропустит его
+        self._fetch_lfs(ctx)
+        self._mark(ctx, "pushed", synced_at=time.time())
+
+    def _push_refs(self, ctx: dict):
+        """push --mirror или порциями по push_batch refs; запушенные refs — в state."""
+        log, repo_path, key = ctx["log"], ctx["repo_path"], ctx["key"]
+        log(f"[green]MIGRATING[/green] git remote add gitflic {ctx['dst_url']}")
+        add_remote(repo_path, "gitflic", ctx["dst_url"])
+        if ctx.get("done_idx", -1) >= stage_index("pushed"):
+            log(f"[cyan]RESUME[/cyan] git push --mirror уже выполнен")
+            return
+        if self.push_batch:
+            changed, deleted = diff_refs(list_refs(repo_path), self.state.pushed_refs(key))
+            log(
+                f"[green]MIGRATING[/green] git push порциями по {self.push_batch} refs "
+                f"(осталось refs: {len(changed) + len(deleted)})"
+            )
+            with self._timed(ctx, "push"):
+                push_ref_batches(
+                    repo_path, "gitflic", changed, deleted,
+                    batch_refs=self.push_batch,
+                    jobs=self.push_batch_jobs,
+                    timeout=self.git_timeout,
+                    on_progress=self._progress_cb(ctx),
+                    on_batch=lambda ch, de: self.state.update_pushed_refs(key, ch, de),
+                )
+        else:
+            log(f"[green]MIGRATING[/green] git push --mirror gitflic")
+            with self._timed(ctx, "push"):
+                push_mirror(repo_path, "gitflic", timeout=self.git_timeout, on_progress=self._progress_cb(ctx))
+            self.state.set_pushed_refs(key, list_refs(repo_path))
+        self._reset_description(ctx)
+        self._mark(ctx, "pushed", synced_at=time.time())
+
+    def _push_lfs(self, ctx: dict):
+        item, stats = ctx["item"], ctx.get("lfs_stats")
+        if ctx.get("has_lfs", False):
+            ctx["log"](f"[green]MIGRATING[/green] git lfs push → gitflic (только отсутствующие на сервере)")
+            with self._timed(ctx, "lfs_push"):
+                self.lfs_engine.push(
+                    ctx["repo_path"], stats, ctx["lfs_objects"], "gitflic", ctx["dst_url"],
+                    timeout=self.git_timeout, on_progress=self._progress_cb(ctx),
+                )
+            self._reset_description(ctx)
+            self._bump("lfs_pushed")
+            item["lfs_pushed"] = True
+        item["lfs"] = stats
+        self._mark(ctx, "lfs-pushed")
+
+    def _cleanup(self, ctx: dict):
+        # зеркало упавшего репозитория остаётся на диске для --resume
+        repo_path = ctx.get("repo_path")
+        # с бюджетом WORKDIR зеркала остаются и вытесняются WorkdirManager по LRU
+        if repo_path and not self.dry_run and not self.keep_clones and self.workspace is None:
+            try:
+                shutil.rmtree(repo_path, ignore_errors=True)
+            except Exception:
+                pass
+
+    # --- воркеры ---
+
+    def _wait_api(self):
+        """Пока API GitFlic просит подождать или автомат разомкнут, новые репозитории не берутся."""
+        rate = self.api_rate
+        if rate is None:
+            return
+        rate.wait_available(on_wait=lambda pause: self.progress.console.print(
+            f"[yellow]{rate.name} недоступен или ограничивает запросы — "
+            f"приём новых репозиториев приостановлен (~{int(pause)} с)[/yellow]"
+        ))
+
+    def _lease_key(self, r: Dict) -> str:
+        return repo_key(r.get("owner_alias") or self.owner_alias, self.naming_engine.repo_alias(r))
+
+    def _enqueue(self, r: Dict):
+        self._fetch_enqueued[id(r)] = time.perf_counter()
+        self._fetch_q.put(r)
+
+    def _next_repo(self) -> Dict | None:
+        """Следующий репозиторий этого хоста; None — работы больше нет."""
+        while True:
+            self._wait_api()
+            try:
+                r = self._fetch_q.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    pending = self._deferred[:]
+                    self._deferred.clear()
+                if not pending:
+                    return None
+                # ждём, пока другие хосты закончат или их аренда истечёт
+                time.sleep(min(LEASE_POLL, self.lease.heartbeat_interval))
+                for p in pending:
+                    self._enqueue(p)
+                continue
+            if self.lease is None:
+                return r
+            verdict = self.lease.claim(self._lease_key(r))
+            if verdict == LEASE_BUSY:
+                with self._lock:
+                    self._deferred.append(r)
+                continue
+            if verdict == LEASE_FINISHED:
+                self._bump("other_hosts")
+                w = self._weight(r)
+                self._credit({"weight": w, "credited": 0}, w)
+                continue
+            return r
+
+    def _fetch_worker(self):
+        while True:
+            r = self._next_repo()
+            if r is None:
+                return
+            wait_s = time.perf_counter() - self._fetch_enqueued.pop(id(r), time.perf_counter())
+            t0 = time.perf_counter()
+            try:
+                ctx = self.fetch_stage(r)
+            except Exception as e:
+                # fetch_stage сам учитывает ошибки; сюда попадают только непредвиденные сбои
+                self.progress.console.print(f"[red]Непредвиденная ошибка fetch-воркера[/red]: {e}")
+                self._bump("errors")
+                if self.lease is not None:
+                    self.lease.release(self._lease_key(r), ok=False)
+                ctx = None
+            self._record_stage("fetch", wait_s, time.perf_counter() - t0)
+            if ctx is None:
+                continue
+            ctx["item"]["wait_s"]["fetch"] = round(wait_s, 2)
+            if self._push_q.full():
+                self.progress.update(ctx["repo_task"], description=f"[white]{ctx['name']}[/white] [dim](ожидает push)[/dim]")
+            ctx["enqueued"] = time.perf_counter()
+            self._push_q.put(ctx)
+            self._record_depth(self._push_q.qsize())
+
+    def _push_worker(self):
+        while True:
+            ctx = self._push_q.get()
+            if ctx is None:
+                return
+            wait_s = time.perf_counter() - ctx["enqueued"]
+            ctx["item"]["wait_s"]["push"] = round(wait_s, 2)
+            self._reset_description(ctx)
+            t0 = time.perf_counter()
+            try:
+                self.push_stage(ctx)
+            except Exception as e:
+                self.progress.console.print(f"[red]Непредвиденная ошибка push-воркера[/red]: {e}")
+                self._bump("errors")
+                if self.lease is not None:
+                    self.lease.release(ctx["key"], ok=False)
+            self._record_stage("push", wait_s, time.perf_counter() - t0)
+
+    def run(self, repos: List[Dict]) -> Dict:
+        """Переносит repos и возвращает сводку (элементы — в report_writer, если он задан)."""
+        # коллизии alias — по всему списку заранее, а не на push второго репозитория
+        for group in self.naming_engine.collisions(repos, self.owner_alias).values():
+            for r in group:
+                self._collided[id(r)] = collision_message(r, group)
+
+        # LPT: самые долгие (крупные) репозитории стартуют первыми, чтобы не растягивать хвост прогона;
+        # sorted стабилен, поэтому без размеров сохраняется порядок листинга
+        repos = sorted(repos, key=repo_size, reverse=True)
+        known_sizes = [repo_size(r) for r in repos if r.get("size_bytes")]
+        self._by_bytes = bool(known_sizes)
+        # репозиториям без размера приписываем средний известный размер
+        self._default_weight = (sum(known_sizes) // len(known_sizes)) if self._by_bytes else 1
+        self._total_weight = sum(self._weight(r) for r in repos)
+
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TaskProgressColumn(),            # N/N (xx%)
+            TimeElapsedColumn(),
+            TimeRemainingColumn(),
+            console=console,
+            transient=False,
+        ) as progress:
+            self.progress = progress
+            self._overall = progress.add_task(OVERALL_TITLE, total=self._total_weight)
+            for r in repos:
+                self._enqueue(r)
+            if not self.dry_run and self.lease is None:
+                # проекты создаются заранее и параллельно, пока fetch-воркеры клонируют
+                self.project_index.create_ahead([self.project_payload(r) for r in repos if self.needs_project(r)])
+            if self.metrics is not None:
+                self.metrics.attach_rate(self.api_rate)
+                self.metrics.set_planned(len(repos))
+
+            fetchers = [
+                threading.Thread(target=self._fetch_worker, name=f"fetch-{i}", daemon=True)
+                for i in range(self.fetch_jobs)
+            ]
+            pushers = [
+                threading.Thread(target=self._push_worker, name=f"push-{i}", daemon=True)
+                for i in range(self.push_jobs)
+            ]
+            try:
+                for t in fetchers + pushers:
+                    t.start()
+                for t in fetchers:
+                    t.join()
+                for _ in pushers:
+                    self._push_q.put(None)
+                for t in pushers:
+                    t.join()
+            finally:
+                self.project_index.shutdown()
+                if self.metrics is not None:
+                    self.metrics.flush(force=True)
+
+        return self._close_summary()
+
+
 def migrate_repositories(
     repos: List[Dict],
     owner_alias: str,
@@ -44,209 +952,41 @@ def migrate_repositories(
     gf_git_pass: str | None,
     bb_git_user: str | None,
     bb_git_pass: str | None,
+    naming_engine: NamingEngine | None = None,
+    report_path: str | None = None,
+    **options,
 ):
-    cfg = load_yaml("config.yml") if os.path.exists("config.yml") else {}
-    naming = cfg.get("naming", {})
-    filters = cfg.get("filters", {})
-    report_path = cfg.get("report", {}).get("path", "report.json")
-
-    os.makedirs(workdir, exist_ok=True)
-    summary = {
-        "total": 0,
-        "created": 0,
-        "exists": 0,
-        "lfs_pushed": 0,
-        "skipped": 0,
-        "errors": 0,
-        "items": [],
-    }
-
-    include_patterns = filters.get("include_patterns", [])
-    exclude_patterns = filters.get("exclude_patterns", [])
-
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TaskProgressColumn(),            # N/N (xx%)
-        TimeElapsedColumn(),
-        TimeRemainingColumn(),
-        console=console,
-        transient=False,
-    ) as progress:
-        overall = progress.add_task("[bold]Миграция репозиториев[/bold]", total=len(repos))
-
-        for r in repos:
-            started = time.perf_counter()
-            summary["total"] += 1
-            name = r.get("name") or r.get("slug")
-            alias = make_alias(r.get("slug") or name, naming)
-            description = (r.get("description") or "")[:500]
-
-            repo_task = progress.add_task(f"[white]{name}[/white]", total=5)
-
-            item = {
-                "repo": name,
-                "alias": alias,
-                "created": False,
-                "lfs": False,
-                "duration_s": None,
-                "status": "PENDING",
-                "message": "",
-            }
-
-            if include_patterns and not match_any(include_patterns, name):
-                summary["skipped"] += 1
-                item["status"] = "SKIPPED"
-                item["message"] = "Не прошёл include-фильтр"
-                item["duration_s"] = round(time.perf_counter() - started, 2)
-                summary["items"].append(item)
-                continue
-            if exclude_patterns and match_any(exclude_patterns, name):
-                summary["skipped"] += 1
-                item["status"] = "SKIPPED"
-                item["message"] = "Исключён exclude-фильтром"
-                item["duration_s"] = round(time.perf_counter() - started, 2)
-                summary["items"].append(item)   
-                continue
+    """
+    Переносит репозитории в GitFlic (см. MigrationPipeline) и сохраняет сводку в report_path.
+    repos может содержать репозитории разных проектов: владелец берётся из r["owner_alias"],
+    owner_alias — значение по умолчанию. naming_engine и report_path по умолчанию
+    берутся из config.yml; options — настройки конвейера (jobs, state, resume, lease, ...).
+    """
+    if naming_engine is None or report_path is None:
+        cfg = load_yaml("config.yml") if os.path.exists("config.yml") else {}
+        if naming_engine is None:
+            naming_engine = NamingEngine.from_config(cfg)
+        if report_path is None:
+            report_path = cfg.get("report", {}).get("path", "report.json")
 
-            progress.console.rule(f"[bold]Репозиторий: {name} → alias={alias}")
-            src_url = r.get("clone_ssh") if use_ssh and r.get("clone_ssh") else r.get("clone_http")
-            if not src_url:
-                console.print(f"[red]Нет clone URL в Bitbucket для {name}[/red]")
-                summary["errors"] += 1
-                item["status"] = "FAILED"
-                item["message"] = "Нет clone URL в Bitbucket"
-                item["duration_s"] = round(time.perf_counter() - started, 2)
-                summary["items"].append(item)
-                continue
-
-            if (not use_ssh) and src_url.startswith("http"):
-                src_url = with_https_creds(src_url, bb_git_user, bb_git_pass)
-
-            payload = {
-                "title": name,
-                "isPrivate": visibility_private,
-                "alias": alias,
-                "ownerAlias": owner_alias,
-                "ownerAliasType": owner_type,
-                "description": description,
-            }
-            
-            if language_default:
-                payload["language"] = language_default
-
-            if dry_run:
-                progress.console.print("[yellow]DRY-RUN[/yellow] Создание проекта в GitFlic:", payload)
-                created_ok, created_json = True, {
-                    "httpTransportUrl": "<dry-run>",
-                    "sshTransportUrl": "<dry-run>"
-                }
-                summary["created"] += 1
-                item["created"] = True
-                progress.advance(repo_task)
-            else:
-                ok, code, data = gf_client.create_project(payload)
-                if ok:
-                    progress.console.print(f"[green]Создан проект в GitFlic[/green]")
-                    created_ok, created_json = True, data
-                    summary["created"] += 1
-                    item["created"] = True
-                    progress.advance(repo_task)
-                else:
-                    progress.console.print(f"[red]Ошибка создания проекта GitFlic [{code}][/red]: {data}")
-                    summary["errors"] += 1
-                    item["status"] = "FAILED"
-                    item["message"] = f"Ошибка создания проекта: {code}"
-                    item["duration_s"] = round(time.perf_counter() - started, 2)
-                    summary["items"].append(item)
-                    progress.update(repo_task, completed=5)
-                    progress.advance(overall)
-                    continue
-
-            dst_url = None
-            if use_ssh:
-                dst_url = created_json.get("sshTransportUrl")
-            else:
-                dst_url = created_json.get("httpTransportUrl")
-                dst_url = with_https_creds(dst_url, gf_git_user, gf_git_pass)
-
-            repo_path = os.path.join(workdir, f"{alias}.git")
-            try:
-                if dry_run:
-                    progress.console.print(f"[yellow]DRY-RUN[/yellow] git clone --mirror {src_url} {repo_path}")
-                else:
-                    progress.console.print(f"[green]MIGRATING[/green] git clone --mirror {src_url} {repo_path}")
-                    clone_mirror(src_url, repo_path, git_ssl_no_verify=False)
-                
-                progress.advance(repo_task)
-
-                lfs_fetched = False
-                has_lfs = False
-
-                if dry_run:
-                    progress.console.print("[yellow]DRY-RUN[/yellow] git lfs fetch --all")
-                else:
-                    progress.console.print("[green]MIGRATING[/green] git lfs fetch --all")
-                    lfs_fetched = lfs_fetch_all(repo_path)
-                try:
-                    has_lfs = lfs_repo_has_content(repo_path)
-                except Exception:
-                    has_lfs = False
-
-                progress.advance(repo_task)
-
-                if dry_run:
-                    progress.console.print(f"[yellow]DRY-RUN[/yellow] git remote add gitflic {dst_url}")
-                    progress.console.print(f"[yellow]DRY-RUN[/yellow] git push --mirror gitflic")
-                    progress.advance(repo_task)
-                    if has_lfs:
-                        progress.console.print(f"[yellow]DRY-RUN[/yellow] git lfs push --all gitflic")
-                        summary["lfs_pushed"] += 1
-                    item["lfs"] = has_lfs
-                    progress.advance(repo_task)
-                else:
-                    progress.console.print(f"[green]MIGRATING[/green] git remote add gitflic {dst_url}")
-                    add_remote(repo_path, "gitflic", dst_url)
-                    progress.console.print(f"[green]MIGRATING[/green] git push --mirror gitflic")
-                    push_mirror(repo_path, "gitflic")
-                    progress.advance(repo_task)
-                    if has_lfs:
-                        progress.console.print(f"[green]MIGRATING[/green] git lfs push --all gitflic")
-                        ok2 = lfs_push_all(repo_path, "gitflic")
-                        if ok2:
-                            summary["lfs_pushed"] += 1
-                            item["lfs"] = True
-                        else:
-                            item["lfs"] = True
-                    else:
-                        item["lfs"] = False
-                    progress.advance(repo_task)
-
-                item["status"] = "OK"
-                item["message"] = "Перенос завершён"
-                item["duration_s"] = round(time.perf_counter() - started, 2)
-                progress.console.print(
-                    f"[bold green]Успех[/bold green]: LFS={'да' if item['lfs'] else 'нет'}, "
-                    f"время={item['duration_s']} c"
-                )
-
-            except Exception as e:
-                progress.console.print(f"[red]Ошибка переноса {name}[/red]: {e}")
-                summary["errors"] += 1
-                item["status"] = "FAILED"
-                item["message"] = str(e)
-                item["duration_s"] = round(time.perf_counter() - started, 2)
-                summary["items"].append(item)
-            finally:
-                progress.update(repo_task, completed=5)
-                progress.advance(overall)
-                if not dry_run and not keep_clones:
-                    try:
-                        import shutil
-                        shutil.rmtree(repo_path, ignore_errors=True)
-                    except Exception:
-                        pass
+    pipeline = MigrationPipeline(
+        owner_alias=owner_alias,
+        owner_type=owner_type,
+        visibility_private=visibility_private,
+        language_default=language_default,
+        use_ssh=use_ssh,
+        dry_run=dry_run,
+        workdir=workdir,
+        keep_clones=keep_clones,
+        gf_client=gf_client,
+        naming_engine=naming_engine,
+        gf_git_user=gf_git_user,
+        gf_git_pass=gf_git_pass,
+        bb_git_user=bb_git_user,
+        bb_git_pass=bb_git_pass,
+        **options,
+    )
+    summary = pipeline.run(repos)
 
     try:
         with open(report_path, "w", encoding="utf-8") as f:
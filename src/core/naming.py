@@ -0,0 +1,163 @@
+\
+import os
+import re
+from typing import Dict, Iterable, List
+
+from slugify import slugify as _slugify
+
+from src.core.utils import apply_replace_map, load_yaml
+
+# Статусы строк плана (bb2gf plan)
+PLAN_OK = "OK"
+PLAN_SKIPPED = "SKIPPED"
+PLAN_COLLISION = "COLLISION"
+
+
+# \1..\99 — номер группы сдвигается при объединении шаблонов
+_BACKREF = re.compile(r"\\[1-9]")
+
+
+def _compile_any(patterns: Iterable[str]):
+    """
+    Набор шаблонов re.search как один скомпилированный regex: (?:p1)|(?:p2)|...
+    Шаблоны с нумерованными обратными ссылками, глобальными флагами или одинаковыми
+    именами групп объединить нельзя — тогда остаётся список отдельно скомпилированных
+    шаблонов. Пустой набор — None.
+    """
+    patterns = [str(p) for p in patterns or [] if str(p) != ""]
+    if not patterns:
+        return None
+    compiled = [re.compile(p) for p in patterns]  # ошибка в шаблоне — сразу, а не на первом репозитории
+    if len(compiled) == 1:
+        return compiled[0]
+    if not any(_BACKREF.search(p) for p in patterns):
+        try:
+            return re.compile("|".join(f"(?:{p})" for p in patterns))
+        except re.error:
+            pass
+    return compiled
+
+
+def _search(matcher, text: str) -> bool:
+    if matcher is None:
+        return False
+    if isinstance(matcher, list):
+        return any(m.search(text) for m in matcher)
+    return matcher.search(text) is not None
+
+
+class NamingEngine:
+    """
+    Фильтры и именование репозиториев из config.yml, скомпилированные один раз на прогон:
+    include/exclude — по одному объединённому regex, alias кэшируется по имени;
+    replace_map применяется по ключам последовательно, в порядке config.yml (результат
+    замены участвует в следующих), как и раньше — alias уже перенесённых репозиториев
+    не меняется. Создаётся в main и передаётся в
+    migrate_repositories/sync_repositories, чтобы config.yml читался один раз.
+    """
+
+    def __init__(self, naming: Dict | None = None, filters: Dict | None = None) -> None:
+        naming = naming or {}
+        filters = filters or {}
+        self.replace_map = {str(k): str(v) for k, v in (naming.get("replace_map") or {}).items() if str(k)}
+        self.slugify = naming.get("slugify", True)
+        self.allow_unicode = naming.get("transliterate_ru", True)
+        self.lowercase = naming.get("lowercase", True)
+        self.include = _compile_any(filters.get("include_patterns"))
+        self.exclude = _compile_any(filters.get("exclude_patterns"))
+        self._aliases: Dict[str, str] = {}
+
+    @classmethod
+    def from_config(cls, cfg: Dict | None) -> "NamingEngine":
+        cfg = cfg or {}
+        return cls(cfg.get("naming", {}), cfg.get("filters", {}))
+
+    @classmethod
+    def load(cls, path: str = "config.yml") -> "NamingEngine":
+        return cls.from_config(load_yaml(path) if os.path.exists(path) else {})
+
+    def alias(self, name: str) -> str:
+        """alias проекта GitFlic для имени (slug) репозитория: replace_map, slugify, нижний регистр."""
+        name = name or ""
+        cached = self._aliases.get(name)
+        if cached is not None:
+            return cached
+        s = apply_replace_map(name, self.replace_map)
+        if self.slugify:
+            s = _slugify(s, allow_unicode=self.allow_unicode)
+        if self.lowercase:
+            s = s.lower()
+        # гонка потоков безопасна: значение детерминировано
+        self._aliases[name] = s
+        return s
+
+    def repo_alias(self, r: Dict) -> str:
+        return self.alias(r.get("slug") or r.get("name"))
+
+    def skip_reason(self, name: str) -> str | None:
+        """None — репозиторий проходит фильтры, иначе причина пропуска."""
+        if self.include is not None and not _search(self.include, name):
+            return "Не прошёл include-фильтр"
+        if _search(self.exclude, name):
+            return "Исключён exclude-фильтром"
+        return None
+
+    def collisions(self, repos: Iterable[Dict], owner_alias: str = "") -> Dict[tuple, List[Dict]]:
+        """
+        Репозитории, прошедшие фильтры, у которых совпал (владелец, alias):
+        {(owner, alias): [r1, r2, ...]}. Такие репозитории попали бы в один проект GitFlic.
+        """
+        groups: Dict[tuple, List[Dict]] = {}
+        for r in repos:
+            name = r.get("name") or r.get("slug")
+            if self.skip_reason(name):
+                continue
+            key = ((r.get("owner_alias") or owner_alias), self.repo_alias(r))
+            groups.setdefault(key, []).append(r)
+        return {key: rs for key, rs in groups.items() if len(rs) > 1}
+
+    def plan(self, repos: Iterable[Dict], owner_alias: str = "") -> List[Dict]:
+        """
+        План именования: по строке на репозиторий — project_key, repo, owner, alias,
+        status (OK / SKIPPED / COLLISION) и message. Коллизии ищутся по всему списку.
+        """
+        repos = list(repos)
+        rows = []
+        by_target: Dict[tuple, List[Dict]] = {}
+        for r in repos:
+            name = r.get("name") or r.get("slug")
+            row = {
+                "project_key": r.get("project_key"),
+                "repo": name,
+                "slug": r.get("slug"),
+                "owner": r.get("owner_alias") or owner_alias,
+                "alias": self.repo_alias(r),
+                "status": PLAN_OK,
+                "message": "",
+            }
+            reason = self.skip_reason(name)
+            if reason:
+                row["status"], row["message"] = PLAN_SKIPPED, reason
+            else:
+                by_target.setdefault((row["owner"], row["alias"]), []).append(row)
+            rows.append(row)
+        for group in by_target.values():
+            if len(group) < 2:
+                continue
+            for row in group:
+                row["status"] = PLAN_COLLISION
+                row["message"] = collision_message(row, group)
+        return rows
+
+
+def collision_message(repo: Dict, group: List[Dict], limit: int = 5) -> str:
+    """Текст для репозитория из группы коллизии: с кем совпал alias (первые limit)."""
+    others = [
+        f"{o['project_key']}/{o.get('repo') or o.get('name') or o.get('slug')}" if o.get("project_key")
+        else (o.get("repo") or o.get("name") or o.get("slug"))
+        for o in group if o is not repo
+    ]
+    text = ", ".join(others[:limit])
+    if len(others) > limit:
+        text += f" и ещё {len(others) - limit}"
+    return f"Коллизия alias: совпадает с {text}"
@@ -0,0 +1,83 @@
+\
+import os
+import shlex
+import threading
+from typing import Dict, List
+
+from src.core.state import StateStore
+from src.core.git_ops import (
+    run,
+    ls_remote,
+    root_commits,
+    list_refs,
+    add_alternate,
+    repack_local,
+)
+
+# Каталог кэшей внутри WORKDIR: <WORKDIR>/.objcache/<корневой коммит>.git
+CACHE_DIR = ".objcache"
+
+
+class ObjectCache:
+    """
+    Общий локальный кэш git-объектов для форков и близких копий одного репозитория.
+    Репозитории с общим корневым коммитом делят один bare-репозиторий в WORKDIR/.objcache:
+    - перед клонированием по вершинам refs источника (git ls-remote) ищется кэш, где эти
+      коммиты уже есть, и клон выполняется с --reference-if-able — общие объекты не скачиваются;
+    - после клонирования новые объекты зеркала переносятся в кэш, зеркало подключает кэш
+      через alternates и переупаковывается без заимствованных объектов (git repack -l).
+    Индекс «вершина → кэш» хранится в хранилище состояния.
+    """
+
+    def __init__(self, workdir: str, state: StateStore) -> None:
+        self.root_dir = os.path.join(workdir, CACHE_DIR)
+        self.state = state
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, root: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(root, threading.Lock())
+
+    def cache_path(self, root: str) -> str:
+        return os.path.join(self.root_dir, f"{root}.git")
+
+    def references_for(self, src_url: str, git_ssl_no_verify: bool = False, timeout: float | None = None) -> List[str]:
+        """Кэши, которые стоит передать в git clone --reference-if-able (пусто, если совпадений нет)."""
+        try:
+            tips = ls_remote(src_url, git_ssl_no_verify=git_ssl_no_verify, timeout=timeout)
+        except Exception:
+            return []
+        roots = self.state.object_cache_roots(tips.values())
+        return [self.cache_path(root) for root in roots if os.path.isdir(self.cache_path(root))]
+
+    def _ensure(self, root: str) -> str:
+        path = self.cache_path(root)
+        if not os.path.isdir(path):
+            os.makedirs(self.root_dir, exist_ok=True)
+            run(f"git init --bare -q {shlex.quote(path)}")
+            # кэш никогда не чистим автоматически: на его объекты ссылаются зеркала
+            run("git config gc.auto 0", cwd=path)
+        return path
+
+    def absorb(self, repo_path: str, namespace: str, timeout: float | None = None) -> str | None:
+        """
+        Переносит объекты зеркала в кэш его корневого коммита и подключает кэш к зеркалу.
+        namespace — уникальное имя репозитория (refs/cache/<namespace>/* удерживают объекты в кэше).
+        Возвращает корневой коммит или None для пустого репозитория.
+        """
+        roots = root_commits(repo_path)
+        if not roots:
+            return None
+        root = roots[0]
+        with self._lock(root):
+            path = self._ensure(root)
+            run(
+                f"git fetch -q --no-tags --no-write-fetch-head {shlex.quote(os.path.abspath(repo_path))} "
+                f"{shlex.quote(f'+refs/*:refs/cache/{namespace}/*')}",
+                cwd=path, timeout=timeout,
+            )
+            add_alternate(repo_path, path)
+        repack_local(repo_path, timeout=timeout)
+        self.state.add_object_cache_tips(root, list_refs(repo_path).values())
+        return root
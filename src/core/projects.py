@@ -0,0 +1,130 @@
+\
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+# Сколько проектов создаётся в GitFlic одновременно (опережая fetch-воркеры)
+CREATE_JOBS = 4
+
+# Адреса git проекта GitFlic, нужные для push
+TRANSPORT_KEYS = ("httpTransportUrl", "sshTransportUrl")
+
+# Результат ensure(): "exists" — проект уже был, "created" — создан, "failed" — ошибка
+ProjectResult = Tuple[str, int, dict | str]
+
+
+class ProjectIndex:
+    """
+    Индекс существующих проектов GitFlic по владельцам.
+    - Проекты владельца (команды/компании) загружаются одним листингом при первом
+      обращении и дальше ищутся в памяти: уже существующий проект переиспользуется
+      (его transport URL берутся из индекса), а не приводит к ошибке создания. Если
+      в элементе листинга нет transport URL, проект запрашивается целиком.
+    - Если листинг недоступен, проект ищется по одному (GET /project/{owner}/{alias}),
+      но только после неудачного POST /project — лишних запросов на новые проекты нет.
+    - create_ahead() создаёт недостающие проекты заранее, create_jobs запросами
+      параллельно в порядке очереди переноса; ensure() забирает готовый результат.
+    Безопасно для использования из нескольких потоков.
+    """
+
+    def __init__(self, gf_client, owner_type: str, create_jobs: int = CREATE_JOBS, use_listing: bool = True) -> None:
+        self.gf = gf_client
+        self.owner_type = owner_type
+        self.create_jobs = max(1, int(create_jobs or 1))
+        self.use_listing = use_listing
+        self._owners: Dict[str, Dict[str, dict] | None] = {}
+        self._owner_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], Future] = {}
+        self._executor: ThreadPoolExecutor | None = None
+
+    def _owner_lock(self, owner: str) -> threading.Lock:
+        with self._lock:
+            return self._owner_locks.setdefault(owner, threading.Lock())
+
+    def _load(self, owner: str) -> Dict[str, dict] | None:
+        """{alias: проект} владельца; None — листинг недоступен. Загружается один раз."""
+        if not self.use_listing:
+            return None
+        with self._owner_lock(owner):
+            if owner not in self._owners:
+                try:
+                    projects = self.gf.list_projects(owner, self.owner_type)
+                    self._owners[owner] = {
+                        (p.get("alias") or "").lower(): p for p in projects if p.get("alias")
+                    }
+                except Exception:
+                    self._owners[owner] = None
+            return self._owners[owner]
+
+    def _remember(self, owner: str, alias: str, project: dict) -> None:
+        with self._owner_lock(owner):
+            index = self._owners.get(owner)
+            if index is not None and isinstance(project, dict):
+                index[alias.lower()] = project
+
+    def lookup(self, owner: str, alias: str) -> dict | None:
+        """Проект из индекса (без запросов к API, если листинг владельца уже загружен)."""
+        index = self._load(owner)
+        if index is not None:
+            return index.get(alias.lower())
+        return None
+
+    def _fetch_one(self, owner: str, alias: str) -> dict | None:
+        try:
+            return self.gf.get_project(owner, alias)
+        except Exception:
+            return None
+
+    def _with_transport(self, owner: str, alias: str, project: dict) -> ProjectResult:
+        """Существующий проект с transport URL: элемент листинга может их не содержать."""
+        if all(project.get(k) for k in TRANSPORT_KEYS):
+            return "exists", 200, project
+        full = self._fetch_one(owner, alias)
+        if full is None or not any(full.get(k) for k in TRANSPORT_KEYS):
+            return "failed", 0, f"Проект {owner}/{alias} существует, но его transport URL не получены"
+        self._remember(owner, alias, full)
+        return "exists", 200, full
+
+    def _ensure_one(self, payload: Dict) -> ProjectResult:
+        owner, alias = payload["ownerAlias"], payload["alias"]
+        existing = self.lookup(owner, alias)
+        if existing is not None:
+            return self._with_transport(owner, alias, existing)
+        ok, code, data = self.gf.create_project(payload)
+        if ok:
+            self._remember(owner, alias, data)
+            return "created", code, data
+        # проект мог появиться после листинга (или листинг недоступен): ошибка
+        # создания из-за существующего alias — не ошибка переноса
+        existing = self._fetch_one(owner, alias)
+        if existing is not None:
+            self._remember(owner, alias, existing)
+            return "exists", 200, existing
+        return "failed", code, data
+
+    def create_ahead(self, payloads: List[Dict]) -> None:
+        """Запускает создание проектов в фоне, не дожидаясь очереди переноса."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.create_jobs, thread_name_prefix="gf-create")
+            for payload in payloads:
+                key = (payload["ownerAlias"], payload["alias"].lower())
+                if key not in self._pending:
+                    self._pending[key] = self._executor.submit(self._ensure_one, payload)
+
+    def ensure(self, payload: Dict) -> ProjectResult:
+        """Существующий или созданный проект: ("exists" | "created" | "failed", код, данные)."""
+        with self._lock:
+            fut = self._pending.pop((payload["ownerAlias"], payload["alias"].lower()), None)
+        if fut is not None:
+            return fut.result()
+        return self._ensure_one(payload)
+
+    def shutdown(self) -> None:
+        """Отменяет ещё не начатые фоновые создания (например, при прерывании прогона)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._pending.clear()
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,92 @@
+\
+import os
+import queue
+import shlex
+import threading
+from typing import Callable, Dict, List
+
+from src.core.git_ops import run, ls_remote, add_remote, fetch_refs, push_refs, list_refs, order_refs
+
+# Сколько refs переносить одной порцией fetch → push
+RELAY_BATCH_REFS = 100
+
+
+def relay_repository(
+    src_url: str,
+    staging_path: str,
+    dst_remote_url: str,
+    batch_refs: int = RELAY_BATCH_REFS,
+    git_ssl_no_verify: bool = False,
+    timeout: float | None = None,
+    on_progress: Callable | None = None,
+    on_batch: Callable | None = None,
+) -> Dict[str, str]:
+    """
+    Переносит репозиторий порциями refs вместо clone --mirror + push --mirror.
+    Пока порция N пушится в GitFlic, порция N+1 уже скачивается из Bitbucket, поэтому
+    время переноса ≈ max(fetch, push), а не их сумма, и каждая порция пушится, пока
+    её объекты ещё в кэше страниц. staging_path — временный bare-репозиторий (можно
+    уже существующее зеркало: тогда докачиваются только отсутствующие объекты).
+    on_batch(refs: dict) вызывается после успешного push каждой порции.
+    Возвращает {ref: sha} запушенных refs.
+    """
+    if not os.path.isdir(staging_path):
+        os.makedirs(os.path.dirname(os.path.abspath(staging_path)), exist_ok=True)
+        run(f"git init --bare -q {shlex.quote(staging_path)}")
+    add_remote(staging_path, "origin", src_url)
+    add_remote(staging_path, "gitflic", dst_remote_url)
+
+    remote_refs = ls_remote(src_url, git_ssl_no_verify=git_ssl_no_verify, timeout=timeout)
+    ordered = order_refs(remote_refs)
+    batch_refs = max(1, int(batch_refs or RELAY_BATCH_REFS))
+    batches = [ordered[i:i + batch_refs] for i in range(0, len(ordered), batch_refs)]
+
+    # очередь на одну порцию: fetch опережает push не более чем на шаг
+    fetched: queue.Queue = queue.Queue(maxsize=1)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    def fetcher():
+        try:
+            for batch in batches:
+                if stop.is_set():
+                    return
+                fetch_refs(
+                    staging_path, "origin", [f"+{ref}:{ref}" for ref in batch],
+                    git_ssl_no_verify=git_ssl_no_verify, timeout=timeout, on_progress=on_progress,
+                )
+                fetched.put(batch)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            fetched.put(None)
+
+    thread = threading.Thread(target=fetcher, name="relay-fetch", daemon=True)
+    thread.start()
+    pushed: Dict[str, str] = {}
+    try:
+        while True:
+            batch = fetched.get()
+            if batch is None:
+                break
+            push_refs(
+                staging_path, "gitflic", [f"+{ref}:{ref}" for ref in batch],
+                git_ssl_no_verify=git_ssl_no_verify, timeout=timeout, on_progress=on_progress,
+            )
+            local = list_refs(staging_path)
+            done = {ref: local[ref] for ref in batch if ref in local}
+            pushed.update(done)
+            if on_batch is not None:
+                on_batch(done)
+    finally:
+        stop.set()
+        # освобождаем fetcher, если он ждёт места в очереди
+        while thread.is_alive():
+            try:
+                fetched.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        thread.join()
+    if errors:
+        raise errors[0]
+    return pushed
@@ -0,0 +1,156 @@
+\
+import os
+import json
+import time
+import threading
+from typing import Dict, Iterable, List
+
+# Поток записей отчёта migrate (JSON Lines), путь по умолчанию
+REPORT_JSONL = "report.jsonl"
+
+# Типы записей: item — итог по репозиторию, project — результат листинга проекта,
+# run — параметры и счётчики прогона (пишется в конце)
+RECORD_TYPES = ("item", "project", "run")
+
+
+def new_run_id() -> str:
+    return time.strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+
+
+class ReportWriter:
+    """
+    Пошаговая запись отчёта в формате JSON Lines: каждая запись дописывается в файл,
+    как только репозиторий завершён, и не держится в памяти до конца прогона.
+    Буфер сбрасывается после каждой записи, fsync — не чаще раза в fsync_interval
+    секунд и при закрытии, поэтому после сбоя теряются максимум последние секунды.
+    Файл только дописывается: записи разных прогонов различаются по run_id.
+    Безопасно для использования из нескольких потоков.
+    """
+
+    def __init__(self, path: str, run_id: str | None = None, fsync_interval: float = 5.0) -> None:
+        self.path = path
+        self.run_id = run_id or new_run_id()
+        self.fsync_interval = max(0.0, float(fsync_interval))
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._f = open(path, "a", encoding="utf-8")
+        self._last_sync = time.monotonic()
+        self.count = 0
+
+    def write(self, record: Dict, record_type: str = "item") -> None:
+        line = json.dumps(
+            {"record": record_type, "run_id": self.run_id, "ts": round(time.time(), 3), **record},
+            ensure_ascii=False,
+        )
+        with self._lock:
+            self._f.write(line + "\n")
+            self._f.flush()
+            self.count += 1
+            now = time.monotonic()
+            if now - self._last_sync >= self.fsync_interval:
+                os.fsync(self._f.fileno())
+                self._last_sync = now
+
+    def close(self) -> None:
+        with self._lock:
+            if self._f.closed:
+                return
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._f.close()
+
+    def __enter__(self) -> "ReportWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_report(path: str) -> List[Dict]:
+    """Все записи файла; оборванная при сбое последняя строка пропускается."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def run_ids(records: Iterable[Dict]) -> List[str]:
+    """run_id в порядке появления в файле."""
+    return list(dict.fromkeys(r.get("run_id") for r in records if r.get("run_id")))
+
+
+def select_runs(records: List[Dict], run_id: str | None = None, all_runs: bool = False) -> List[Dict]:
+    """
+    Записи одного прогона (по умолчанию последнего) или всех прогонов. Для всех прогонов
+    по каждому репозиторию остаётся последняя запись: так отчёт после серии --resume
+    показывает итоговое состояние, а не каждую попытку.
+    """
+    if not all_runs:
+        wanted = run_id or (run_ids(records) or [None])[-1]
+        return [r for r in records if r.get("run_id") == wanted]
+    return latest_records(records)
+
+
+def latest_records(records: List[Dict]) -> List[Dict]:
+    """Последняя запись по каждому репозиторию (item) и проекту (project); записи run отбрасываются."""
+    latest: Dict[tuple, Dict] = {}
+    for r in records:
+        if r.get("record") == "item":
+            key = ("item", r.get("base_url"), r.get("project_key"), r.get("alias") or r.get("repo"))
+        elif r.get("record") == "project":
+            key = ("project", r.get("base_url"), r.get("project_key"))
+        else:
+            continue
+        latest.pop(key, None)  # сохраняем порядок последних записей
+        latest[key] = r
+    return list(latest.values())
+
+
+def merge_reports(paths: List[str], run_id: str | None = None, all_runs: bool = False) -> List[Dict]:
+    """
+    Записи из отчётов нескольких хостов (migrate с общим LEASE_DB): из каждого файла —
+    его последний прогон (или run_id, или все прогоны), затем по каждому репозиторию
+    остаётся самая поздняя по времени запись: если репозиторий упал на одном хосте
+    и был перенесён другим, в сводку попадает результат второго.
+    """
+    selected = []
+    for path in paths:
+        records = read_report(path)
+        selected.extend(records if all_runs else select_runs(records, run_id=run_id))
+    if len(paths) == 1 and not all_runs:
+        return selected
+    selected.sort(key=lambda r: r.get("ts") or 0)
+    return latest_records(selected)
+
+
+def project_summaries(records: List[Dict], summarize) -> List[Dict]:
+    """
+    Сводка по проектам: [{"project_key", "base_url", "summary"}]. summarize(items) —
+    счётчики по списку элементов (summarize_items из мигратора). Проекты без записи
+    project (например, отчёт прерванного прогона) берутся из элементов.
+    """
+    projects: Dict[tuple, Dict] = {}
+    items_by_project: Dict[tuple, List[Dict]] = {}
+    for r in records:
+        key = (r.get("project_key"), r.get("base_url"))
+        if r.get("record") == "project":
+            projects[key] = r
+        elif r.get("record") == "item":
+            items_by_project.setdefault(key, []).append(r)
+            projects.setdefault(key, {"project_key": key[0], "base_url": key[1]})
+    result = []
+    for key, proj in projects.items():
+        if proj.get("error"):
+            summary = {"total": 0, "errors": 1, "message": proj["error"]}
+        else:
+            summary = summarize(items_by_project.get(key, []))
+        result.append({"project_key": key[0], "base_url": key[1], "summary": summary})
+    return result
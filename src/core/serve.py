@@ -0,0 +1,376 @@
+\
+import os
+import hmac
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+from rich.console import Console
+
+from src.core.state import StateStore, repo_key, mirror_path
+from src.core.git_ops import with_https_creds, ls_remote
+from src.core.lfs import LfsEngine
+from src.core.naming import NamingEngine
+from src.core.sync import sync_mirror
+from src.core.verify import comparable_refs
+
+console = Console()
+
+# Пауза после последнего события по репозиторию перед синхронизацией, с: серия push склеивается
+COALESCE_DELAY = 5.0
+# Дольше этого событие не откладывается, даже если push идут непрерывно, с
+COALESCE_MAX_WAIT = 60.0
+# Период сверки с Bitbucket (ловит пропущенные события), с
+RECONCILE_INTERVAL = 6 * 3600.0
+# Максимальный размер тела webhook, байт
+MAX_PAYLOAD = 10 * 1024 * 1024
+
+REFS_CHANGED_EVENTS = ("repo:refs_changed",)
+PING_EVENT = "diagnostics:ping"
+
+
+def _log(msg: str) -> None:
+    console.print(f"[dim]{time.strftime('%H:%M:%S')}[/dim] {msg}", highlight=False)
+
+
+def verify_signature(secret: str, body: bytes, header: str | None) -> bool:
+    """Подпись webhook Bitbucket: X-Hub-Signature: sha256=<hex HMAC тела>."""
+    if not header or not header.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, header[len("sha256="):])
+
+
+def parse_refs_changed(payload: Dict) -> Dict | None:
+    """
+    Событие repo:refs_changed → {"project_key", "slug", "name", "refs"}; refs — множество
+    изменённых refs (пустое — список не передан, синхронизировать все). None — не то событие.
+    """
+    if payload.get("eventKey") not in REFS_CHANGED_EVENTS:
+        return None
+    repo = payload.get("repository") or {}
+    project = repo.get("project") or {}
+    if not repo.get("slug") or not project.get("key"):
+        return None
+    refs = set()
+    for change in payload.get("changes") or []:
+        ref_id = (change.get("ref") or {}).get("id") or change.get("refId")
+        if ref_id:
+            refs.add(ref_id)
+    return {"project_key": project["key"], "slug": repo["slug"], "name": repo.get("name") or repo["slug"], "refs": refs}
+
+
+class MirrorQueue:
+    """
+    Очередь репозиториев на синхронизацию со склейкой событий: события по одному
+    репозиторию объединяются (множества refs складываются, None — «все refs»), а
+    синхронизация стартует через delay секунд после последнего события, но не позже
+    max_wait после первого. Один репозиторий никогда не синхронизируется двумя
+    воркерами сразу: события, пришедшие во время синхронизации, ждут её окончания.
+    handler(job, refs) вызывается в одном из workers потоков.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Dict, set | None], None],
+        workers: int = 4,
+        delay: float = COALESCE_DELAY,
+        max_wait: float = COALESCE_MAX_WAIT,
+    ) -> None:
+        self.handler = handler
+        self.delay = max(0.0, float(delay))
+        self.max_wait = max(self.delay, float(max_wait))
+        self._cond = threading.Condition()
+        self._pending: Dict[str, Dict] = {}
+        self._running: set[str] = set()
+        self._stopping = False
+        self.stats = {"received": 0, "coalesced": 0, "synced": 0, "failed": 0}
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"mirror-{i}", daemon=True)
+            for i in range(max(1, int(workers or 1)))
+        ]
+
+    def start(self) -> "MirrorQueue":
+        for t in self._threads:
+            t.start()
+        return self
+
+    def submit(self, key: str, job: Dict, refs: set | None) -> None:
+        now = time.monotonic()
+        with self._cond:
+            self.stats["received"] += 1
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = {
+                    "job": job,
+                    "refs": None if refs is None else set(refs),
+                    "first": now,
+                    "due": now + self.delay,
+                }
+            else:
+                self.stats["coalesced"] += 1
+                if entry["refs"] is not None:
+                    entry["refs"] = None if refs is None else entry["refs"] | set(refs)
+                entry["due"] = min(now + self.delay, entry["first"] + self.max_wait)
+            self._cond.notify()
+
+    def _next(self) -> Tuple[str, Dict] | None:
+        with self._cond:
+            while True:
+                if self._stopping:
+                    return None
+                now = time.monotonic()
+                ready = [
+                    (e["due"], k) for k, e in self._pending.items()
+                    if k not in self._running and e["due"] <= now
+                ]
+                if ready:
+                    _due, key = min(ready)
+                    self._running.add(key)
+                    return key, self._pending.pop(key)
+                waiting = [e["due"] for k, e in self._pending.items() if k not in self._running]
+                self._cond.wait(timeout=max(0.05, min(waiting) - now) if waiting else None)
+
+    def _worker(self):
+        while True:
+            picked = self._next()
+            if picked is None:
+                return
+            key, entry = picked
+            try:
+                self.handler(entry["job"], entry["refs"])
+                ok = True
+            except Exception as e:
+                _log(f"[red]{key}: ошибка синхронизации[/red]: {str(e)[-500:]}")
+                ok = False
+            with self._cond:
+                self._running.discard(key)
+                self.stats["synced" if ok else "failed"] += 1
+                self._cond.notify_all()
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {**self.stats, "pending": len(self._pending), "running": len(self._running)}
+
+    def stop(self) -> None:
+        """Останавливает приём из очереди; идущие синхронизации (и их push) доводятся до конца."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join()
+
+
+class MirrorService:
+    """
+    Непрерывное зеркалирование Bitbucket → GitFlic на период параллельной работы.
+    Принимает webhook repo:refs_changed, ставит затронутый репозиторий в MirrorQueue
+    и синхронизирует только изменённые refs (sync_mirror) по зеркалу из WORKDIR,
+    сохранённому migrate с KEEP_CLONES=true. Раз в reconcile_interval секунд refs
+    Bitbucket (ls-remote) сверяются с запушенными в state, и расходящиеся репозитории
+    тоже ставятся в очередь — так догоняются пропущенные события.
+    projects — [(base_url, project_key)]: события других проектов игнорируются;
+    list_repos(base_url, project_key) — листинг для сверки.
+    """
+
+    def __init__(
+        self,
+        workdir: str,
+        state: StateStore,
+        lfs_engine: LfsEngine,
+        naming_engine: NamingEngine,
+        projects: List[Tuple[str, str]],
+        list_repos: Callable[[str, str], List[Dict]],
+        owner_alias: str = "",
+        use_ssh: bool = False,
+        bb_git_user: str | None = None,
+        bb_git_pass: str | None = None,
+        gf_git_user: str | None = None,
+        gf_git_pass: str | None = None,
+        git_timeout: float | None = None,
+        push_batch: int | None = None,
+        push_batch_jobs: int = 1,
+        workers: int = 4,
+        delay: float = COALESCE_DELAY,
+        reconcile_interval: float = RECONCILE_INTERVAL,
+        secret: str | None = None,
+    ) -> None:
+        self.workdir = workdir
+        self.state = state
+        self.lfs_engine = lfs_engine
+        self.naming_engine = naming_engine
+        self.projects = list(projects)
+        self.project_keys = {str(k).lower() for _base, k in self.projects}
+        self.list_repos = list_repos
+        self.owner_alias = owner_alias
+        self.use_ssh = use_ssh
+        self.bb_git_user, self.bb_git_pass = bb_git_user, bb_git_pass
+        self.gf_git_user, self.gf_git_pass = gf_git_user, gf_git_pass
+        self.git_timeout = git_timeout
+        self.push_batch = push_batch
+        self.push_batch_jobs = push_batch_jobs
+        self.workers = max(1, int(workers or 1))
+        self.reconcile_interval = float(reconcile_interval or 0)
+        self.secret = secret or None
+        self.queue = MirrorQueue(self.sync, workers=self.workers, delay=delay)
+        self.reconciles = 0
+        self._stop = threading.Event()
+        self._reconciler: threading.Thread | None = None
+
+    def repo_job(self, project_key: str, slug: str, name: str | None = None) -> Tuple[Dict | None, str]:
+        """Задание синхронизации по репозиторию Bitbucket или (None, причина пропуска)."""
+        name = name or slug
+        if self.project_keys and str(project_key).lower() not in self.project_keys:
+            return None, f"проект {project_key} не обслуживается"
+        if self.naming_engine.skip_reason(name):
+            return None, "исключён фильтрами"
+        owner = (self.owner_alias or str(project_key)).strip().lower()
+        alias = self.naming_engine.alias(slug)
+        key = repo_key(owner, alias)
+        repo_path = mirror_path(self.workdir, owner, alias)
+        saved = self.state.get_repo(key)
+        if not saved or not saved.get("dst_url") or not saved.get("src_url") or not os.path.isdir(repo_path):
+            return None, f"{key}: нет сохранённого зеркала — выполните migrate с KEEP_CLONES=true"
+        src_url, dst_url = saved["src_url"], saved["dst_url"]
+        if (not self.use_ssh) and src_url.startswith("http"):
+            src_url = with_https_creds(src_url, self.bb_git_user, self.bb_git_pass)
+        if (not self.use_ssh) and dst_url.startswith("http"):
+            dst_url = with_https_creds(dst_url, self.gf_git_user, self.gf_git_pass)
+        return {"key": key, "repo": name, "repo_path": repo_path, "src_url": src_url, "dst_url": dst_url}, ""
+
+    def sync(self, job: Dict, refs: set | None) -> None:
+        started = time.perf_counter()
+        result = sync_mirror(
+            job["repo_path"], job["key"], job["src_url"], job["dst_url"], self.state, self.lfs_engine,
+            refs=refs,
+            git_timeout=self.git_timeout,
+            push_batch=self.push_batch,
+            push_batch_jobs=self.push_batch_jobs,
+        )
+        self.state.save_repo(job["key"], synced_at=time.time())
+        changed, deleted = result["changed"], result["deleted"]
+        if changed or deleted:
+            lfs = result.get("lfs") or {}
+            _log(
+                f"[green]{job['key']}[/green]: refs обновлено {len(changed)}, удалено {len(deleted)}"
+                + (f", LFS загружено {lfs.get('uploaded_objects', 0)}" if lfs else "")
+                + f" ({time.perf_counter() - started:.1f} с)"
+            )
+
+    def handle_event(self, payload: Dict) -> Tuple[int, str]:
+        """(HTTP-код, сообщение) для принятого webhook."""
+        event = parse_refs_changed(payload)
+        if event is None:
+            return 200, "событие пропущено"
+        job, reason = self.repo_job(event["project_key"], event["slug"], event["name"])
+        if job is None:
+            _log(f"[yellow]{event['project_key']}/{event['slug']}: {reason}[/yellow]")
+            return 200, reason
+        self.queue.submit(job["key"], job, event["refs"] or None)
+        return 202, f"{job['key']} в очереди"
+
+    def reconcile(self) -> int:
+        """Сверка refs Bitbucket с запушенными; возвращает число поставленных в очередь репозиториев."""
+        started = time.perf_counter()
+        jobs = []
+        for base_url, project_key in self.projects:
+            try:
+                repos = self.list_repos(base_url, project_key)
+            except Exception as e:
+                _log(f"[red]Сверка: не удалось получить репозитории {project_key}[/red]: {e}")
+                continue
+            for r in repos:
+                job, _reason = self.repo_job(project_key, r.get("slug") or r.get("name"), r.get("name"))
+                if job is not None:
+                    jobs.append(job)
+
+        def check(job: Dict) -> bool:
+            try:
+                remote = comparable_refs(ls_remote(job["src_url"], timeout=self.git_timeout))
+            except Exception as e:
+                _log(f"[red]Сверка {job['key']}[/red]: {str(e)[-300:]}")
+                return False
+            pushed = self.state.pushed_refs(job["key"])
+            refs = {ref for ref, sha in remote.items() if pushed.get(ref) != sha}
+            refs |= {ref for ref in pushed if ref not in remote}
+            if refs:
+                self.queue.submit(job["key"], job, refs)
+            return bool(refs)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="reconcile") as pool:
+            queued = sum(pool.map(check, jobs))
+        self.reconciles += 1
+        _log(
+            f"Сверка: репозиториев {len(jobs)}, расходятся {queued} "
+            f"({time.perf_counter() - started:.1f} с)"
+        )
+        return queued
+
+    def _reconcile_loop(self, on_start: bool):
+        if on_start and not self._stop.is_set():
+            self.reconcile()
+        while self.reconcile_interval > 0 and not self._stop.wait(self.reconcile_interval):
+            self.reconcile()
+
+    def _handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code: int, obj):
+                body = json.dumps(obj, ensure_ascii=False).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/") != "/healthz":
+                    return self._send(404, {"error": "not found"})
+                self._send(200, {"queue": service.queue.snapshot(), "reconciles": service.reconciles})
+
+            def do_POST(self):
+                if self.path.split("?", 1)[0].rstrip("/") != "/webhook":
+                    return self._send(404, {"error": "not found"})
+                length = int(self.headers.get("Content-Length") or 0)
+                if length > MAX_PAYLOAD:
+                    return self._send(413, {"error": "payload too large"})
+                body = self.rfile.read(length)
+                if service.secret and not verify_signature(service.secret, body, self.headers.get("X-Hub-Signature")):
+                    return self._send(401, {"error": "bad signature"})
+                if self.headers.get("X-Event-Key") == PING_EVENT:
+                    return self._send(200, {"message": "pong"})
+                try:
+                    payload = json.loads(body or b"{}")
+                except ValueError:
+                    return self._send(400, {"error": "invalid json"})
+                code, message = service.handle_event(payload if isinstance(payload, dict) else {})
+                self._send(code, {"message": message})
+
+        return Handler
+
+    def serve(self, host: str = "127.0.0.1", port: int = 8787, reconcile_on_start: bool = True) -> None:
+        """Блокирующий запуск: HTTP-приём webhook, воркеры очереди и периодическая сверка. Ctrl+C — остановка."""
+        server = ThreadingHTTPServer((host, port), self._handler())
+        server.daemon_threads = True
+        self.queue.start()
+        self._reconciler = threading.Thread(
+            target=self._reconcile_loop, args=(reconcile_on_start,), name="reconcile", daemon=True
+        )
+        self._reconciler.start()
+        _log(f"Приём webhook: http://{host}:{port}/webhook, состояние: http://{host}:{port}/healthz")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            _log("Остановка: новые события не принимаются, идущие синхронизации завершаются...")
+            self._stop.set()
+            server.server_close()
+            self.queue.stop()
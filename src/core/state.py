@@ -0,0 +1,233 @@
+\
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, Iterable
+
+STATE_FILE = "state.db"
+
+# Этапы переноса репозитория в порядке выполнения; в repos.stage хранится
+# последний успешно завершённый этап
+REPO_STAGES = ("created", "cloned", "lfs-fetched", "pushed", "lfs-pushed")
+
+STATUS_RUNNING = "running"
+STATUS_FAILED = "failed"
+STATUS_DONE = "done"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    key         TEXT PRIMARY KEY,
+    repo        TEXT,
+    alias       TEXT,
+    project_key TEXT,
+    src_url     TEXT,
+    dst_url     TEXT,
+    synced_at   REAL,
+    stage       TEXT,
+    status      TEXT,
+    message     TEXT,
+    updated_at  REAL
+);
+CREATE TABLE IF NOT EXISTS object_cache_tips (
+    sha  TEXT PRIMARY KEY,
+    root TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lfs_tips (
+    sha     TEXT PRIMARY KEY,
+    has_lfs INTEGER NOT NULL,
+    mode    TEXT
+);
+CREATE TABLE IF NOT EXISTS pushed_refs (
+    key  TEXT NOT NULL,
+    ref  TEXT NOT NULL,
+    sha  TEXT NOT NULL,
+    PRIMARY KEY (key, ref)
+);
+"""
+
+
+_REPO_COLUMNS = (
+    "key", "repo", "alias", "project_key", "src_url", "dst_url", "synced_at",
+    "stage", "status", "message", "updated_at",
+)
+
+
+def stage_index(stage: str | None) -> int:
+    """Порядковый номер этапа (-1, если этап ещё не пройден)."""
+    return REPO_STAGES.index(stage) if stage in REPO_STAGES else -1
+
+
+def repo_key(owner_alias: str, alias: str) -> str:
+    """Ключ репозитория в хранилище состояния: <ownerAlias>/<alias> в GitFlic."""
+    return f"{owner_alias}/{alias}"
+
+
+def mirror_path(workdir: str, owner_alias: str, alias: str) -> str:
+    """Путь к зеркалу в WORKDIR; каталог владельца разводит одноимённые репозитории разных проектов."""
+    return os.path.join(workdir, owner_alias, f"{alias}.git")
+
+
+class StateStore:
+    """
+    Локальное состояние миграции (SQLite-файл в WORKDIR).
+    Хранит последний пройденный этап каждого репозитория (для --resume после сбоя),
+    адреса зеркал и refs, успешно запушенные в GitFlic, — по ним `bb2gf sync`
+    вычисляет, что изменилось с прошлого прогона.
+    Безопасно для использования из нескольких потоков.
+    """
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._upgrade_schema()
+
+    def _upgrade_schema(self) -> None:
+        # state.db, созданный предыдущей версией, может не иметь новых колонок
+        have = {row[1] for row in self._db.execute("PRAGMA table_info(repos)")}
+        for col in _REPO_COLUMNS:
+            if col not in have:
+                col_type = "REAL" if col.endswith("_at") else "TEXT"
+                self._db.execute(f"ALTER TABLE repos ADD COLUMN {col} {col_type}")
+        # отрицательные результаты без mode получены прежней проверкой (только корневой
+        # .gitattributes) и при чтении не учитываются
+        if "mode" not in {row[1] for row in self._db.execute("PRAGMA table_info(lfs_tips)")}:
+            self._db.execute("ALTER TABLE lfs_tips ADD COLUMN mode TEXT")
+
+    @classmethod
+    def for_workdir(cls, workdir: str) -> "StateStore":
+        return cls(os.path.join(workdir, STATE_FILE))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def get_repo(self, key: str) -> Dict | None:
+        with self._lock:
+            cur = self._db.execute(
+                f"SELECT {', '.join(_REPO_COLUMNS)} FROM repos WHERE key = ?",
+                (key,),
+            )
+            row = cur.fetchone()
+        if not row:
+            return None
+        return dict(zip(_REPO_COLUMNS, row))
+
+    def save_repo(self, key: str, **fields) -> None:
+        fields = {k: v for k, v in fields.items() if v is not None}
+        fields.setdefault("updated_at", time.time())
+        cols = ["key"] + list(fields)
+        placeholders = ", ".join("?" for _ in cols)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in fields)
+        sql = (
+            f"INSERT INTO repos ({', '.join(cols)}) VALUES ({placeholders}) "
+            f"ON CONFLICT(key) DO UPDATE SET {updates}"
+        )
+        with self._lock:
+            self._db.execute(sql, [key] + list(fields.values()))
+
+    def set_stage(self, key: str, stage: str, **fields) -> None:
+        """Фиксирует успешное завершение этапа; после последнего этапа репозиторий считается перенесённым."""
+        status = STATUS_DONE if stage == REPO_STAGES[-1] else STATUS_RUNNING
+        self.save_repo(key, stage=stage, status=status, message="", **fields)
+
+    def start(self, key: str, **fields) -> None:
+        """Отмечает начало (или возобновление) переноса, не трогая пройденный этап."""
+        self.save_repo(key, status=STATUS_RUNNING, **fields)
+
+    def mark_failed(self, key: str, message: str) -> None:
+        self.save_repo(key, status=STATUS_FAILED, message=message[:2000])
+
+    def object_cache_roots(self, shas: Iterable[str]) -> list[str]:
+        """Кэши объектов (по корневому коммиту), в которых уже есть хотя бы один из коммитов shas."""
+        shas = list(dict.fromkeys(shas))
+        roots: Dict[str, int] = {}
+        with self._lock:
+            for i in range(0, len(shas), 500):
+                chunk = shas[i:i + 500]
+                cur = self._db.execute(
+                    f"SELECT root FROM object_cache_tips WHERE sha IN ({', '.join('?' for _ in chunk)})",
+                    chunk,
+                )
+                for (root,) in cur.fetchall():
+                    roots[root] = roots.get(root, 0) + 1
+        # сначала кэш с наибольшим числом совпавших вершин
+        return sorted(roots, key=roots.get, reverse=True)
+
+    def add_object_cache_tips(self, root: str, shas: Iterable[str]) -> None:
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO object_cache_tips (sha, root) VALUES (?, ?) ON CONFLICT(sha) DO NOTHING",
+                [(sha, root) for sha in set(shas)],
+            )
+
+    def lfs_tips(self, shas: Iterable[str], mode: str | None = None) -> Dict[str, bool]:
+        """
+        Сохранённые результаты проверки LFS по коммитам-вершинам. Отрицательный результат
+        учитывается, только если получен в режиме mode или в режиме full.
+        """
+        shas = list(dict.fromkeys(shas))
+        found: Dict[str, bool] = {}
+        with self._lock:
+            for i in range(0, len(shas), 500):
+                chunk = shas[i:i + 500]
+                cur = self._db.execute(
+                    f"SELECT sha, has_lfs, mode FROM lfs_tips WHERE sha IN ({', '.join('?' for _ in chunk)})",
+                    chunk,
+                )
+                for sha, v, m in cur.fetchall():
+                    if v or m == "full" or (m is not None and m == mode):
+                        found[sha] = bool(v)
+        return found
+
+    def save_lfs_tips(self, results: Dict[str, bool], mode: str | None = None) -> None:
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO lfs_tips (sha, has_lfs, mode) VALUES (?, ?, ?) "
+                "ON CONFLICT(sha) DO UPDATE SET has_lfs = excluded.has_lfs, mode = excluded.mode",
+                [(sha, int(v), mode) for sha, v in results.items()],
+            )
+
+    def pushed_refs(self, key: str) -> Dict[str, str]:
+        with self._lock:
+            cur = self._db.execute("SELECT ref, sha FROM pushed_refs WHERE key = ?", (key,))
+            return dict(cur.fetchall())
+
+    def set_pushed_refs(self, key: str, refs: Dict[str, str]) -> None:
+        """Полностью заменяет набор запушенных refs (после push --mirror)."""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute("DELETE FROM pushed_refs WHERE key = ?", (key,))
+                self._db.executemany(
+                    "INSERT INTO pushed_refs (key, ref, sha) VALUES (?, ?, ?)",
+                    [(key, ref, sha) for ref, sha in refs.items()],
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def update_pushed_refs(self, key: str, changed: Dict[str, str], deleted: Iterable[str] = ()) -> None:
+        """Частичное обновление: записывает изменённые refs и удаляет удалённые."""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT INTO pushed_refs (key, ref, sha) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key, ref) DO UPDATE SET sha = excluded.sha",
+                    [(key, ref, sha) for ref, sha in changed.items()],
+                )
+                self._db.executemany(
+                    "DELETE FROM pushed_refs WHERE key = ? AND ref = ?",
+                    [(key, ref) for ref in deleted],
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
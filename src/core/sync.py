@@ -0,0 +1,291 @@
+\
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict
+from rich.console import Console
+from rich.progress import (
+    Progress,
+    SpinnerColumn,
+    TextColumn,
+    BarColumn,
+    TaskProgressColumn,
+    TimeElapsedColumn,
+)
+
+from src.core.utils import load_yaml
+from src.core.state import StateStore, repo_key, mirror_path
+from src.core.git_ops import (
+    with_https_creds,
+    set_remote_url,
+    get_remote_url,
+    update_mirror,
+    list_refs,
+    ls_remote,
+    fetch_refs,
+    delete_refs,
+    add_remote,
+    push_ref_batches,
+    diff_refs,
+    PUSH_BATCH_REFS,
+)
+from src.core.lfs import LfsEngine, new_lfs_stats
+from src.core.naming import NamingEngine
+
+console = Console()
+
+def source_refs(url: str, timeout: float | None = None) -> Dict[str, str]:
+    """
+    Refs Bitbucket, которые попали бы в зеркало после git fetch --prune: ls-remote без
+    HEAD, remote-tracking веток и «очищенных» тегов (^{}).
+    """
+    return {
+        ref: sha for ref, sha in ls_remote(url, timeout=timeout).items()
+        if ref.startswith("refs/") and not ref.startswith("refs/remotes/") and not ref.endswith("^{}")
+    }
+
+def sync_mirror(
+    repo_path: str,
+    key: str,
+    src_url: str | None,
+    dst_url: str,
+    state: StateStore,
+    lfs_engine: LfsEngine,
+    refs=None,
+    dry_run: bool = False,
+    git_timeout: float | None = None,
+    push_batch: int | None = None,
+    push_batch_jobs: int = 1,
+) -> Dict:
+    """
+    Догоняет GitFlic по сохранённому зеркалу: обновляет зеркало из Bitbucket и пушит
+    refs, изменившиеся с последнего успешного push (по state), плюс их новые LFS-объекты.
+    refs — имена refs, о которых известно, что они изменились (webhook, сверка): тогда
+    из Bitbucket забираются только они (ls-remote + fetch), удалённые в Bitbucket
+    удаляются и в зеркале, а сравнение с state ограничено ими. None — все refs
+    (git fetch --prune).
+    dry_run — зеркало не трогается: изменения считаются по ls-remote Bitbucket.
+    Возвращает {"changed": {ref: sha}, "deleted": [ref], "lfs": статистика или None}.
+    """
+    pushed = all_pushed = state.pushed_refs(key)
+    if dry_run:
+        remote = source_refs(src_url or get_remote_url(repo_path, "origin"), timeout=git_timeout)
+        if refs is not None:
+            refs = set(refs)
+            remote = {ref: sha for ref, sha in remote.items() if ref in refs}
+            pushed = {ref: sha for ref, sha in pushed.items() if ref in refs}
+        changed, deleted = diff_refs(remote, pushed)
+        return {"changed": changed, "deleted": deleted, "lfs": None}
+
+    if src_url:
+        set_remote_url(repo_path, "origin", src_url)
+    if refs is None or not src_url:
+        update_mirror(repo_path, timeout=git_timeout)
+        local = list_refs(repo_path)
+    else:
+        refs = set(refs)
+        remote = {ref: sha for ref, sha in ls_remote(src_url, timeout=git_timeout).items() if ref in refs}
+        current = list_refs(repo_path)
+        fetch_refs(
+            repo_path, "origin",
+            [f"+{ref}:{ref}" for ref, sha in sorted(remote.items()) if current.get(ref) != sha],
+            timeout=git_timeout,
+        )
+        delete_refs(repo_path, sorted(ref for ref in refs if ref not in remote and ref in current))
+        local = {ref: sha for ref, sha in list_refs(repo_path).items() if ref in refs}
+        pushed = {ref: sha for ref, sha in pushed.items() if ref in refs}
+
+    changed, deleted = diff_refs(local, pushed)
+    result = {"changed": changed, "deleted": deleted, "lfs": None}
+    if not (changed or deleted):
+        return result
+
+    add_remote(repo_path, "gitflic", dst_url)
+    # LFS — до push refs: refs фиксируются в state после каждой порции, и при ошибке LFS
+    # после них следующий прогон не увидел бы изменений и не дослал бы объекты
+    if changed and lfs_engine.available:
+        # указатели всех новых коммитов changed (не только вершин), кроме уже запушенной истории
+        objects = lfs_engine.scan_range(
+            repo_path, sorted(set(changed.values())), sorted(set(all_pushed.values())), timeout=git_timeout,
+        )
+        if objects:
+            stats = new_lfs_stats(objects)
+            # ls-files/fetch по refs берут только вершины: недостающее докачивается по всей истории
+            lfs_engine.fetch(repo_path, stats, objects, timeout=git_timeout)
+            lfs_engine.push(repo_path, stats, objects, "gitflic", dst_url, only_objects=True, timeout=git_timeout)
+            result["lfs"] = stats
+
+    # фиксируем прогресс после каждой порции — повтор дошлёт только остаток
+    push_ref_batches(
+        repo_path, "gitflic", changed, deleted,
+        batch_refs=push_batch or PUSH_BATCH_REFS,
+        jobs=push_batch_jobs,
+        timeout=git_timeout,
+        on_batch=lambda ch, de: state.update_pushed_refs(key, ch, de),
+    )
+    return result
+
+def sync_repositories(
+    repos: List[Dict],
+    owner_alias: str,
+    use_ssh: bool,
+    dry_run: bool,
+    workdir: str,
+    gf_git_user: str | None,
+    gf_git_pass: str | None,
+    bb_git_user: str | None,
+    bb_git_pass: str | None,
+    jobs: int = 1,
+    state: StateStore | None = None,
+    git_timeout: float | None = None,
+    push_batch: int | None = None,
+    push_batch_jobs: int = 1,
+    lfs_engine: LfsEngine | None = None,
+    naming_engine: NamingEngine | None = None,
+    report_path: str | None = None,
+):
+    """
+    Инкрементальная синхронизация ранее перенесённых репозиториев.
+    Использует зеркала, сохранённые в WORKDIR (KEEP_CLONES=true): обновляет их через
+    git fetch --prune и пушит в GitFlic только refs, изменившиеся с последнего
+    успешного push (по данным хранилища состояния), плюс их новые LFS-объекты.
+    Refs пушатся порциями по push_batch (push_batch_jobs порций параллельно).
+    naming_engine и report_path (путь сводки migrate) по умолчанию берутся из config.yml.
+    """
+    if naming_engine is None or report_path is None:
+        cfg = load_yaml("config.yml") if os.path.exists("config.yml") else {}
+        if naming_engine is None:
+            naming_engine = NamingEngine.from_config(cfg)
+        if report_path is None:
+            report_path = cfg.get("report", {}).get("path", "report.json")
+    report_path = os.path.join(os.path.dirname(report_path), "sync_" + os.path.basename(report_path))
+
+    if state is None:
+        state = StateStore.for_workdir(workdir)
+    if lfs_engine is None:
+        lfs_engine = LfsEngine(workdir)
+    jobs = max(1, int(jobs or 1))
+
+    summary = {
+        "total": 0,
+        "synced": 0,
+        "unchanged": 0,
+        "refs_updated": 0,
+        "refs_deleted": 0,
+        "skipped": 0,
+        "errors": 0,
+        "items": [],
+    }
+    summary_lock = threading.Lock()
+
+    def bump(key: str, n: int = 1):
+        with summary_lock:
+            summary[key] += n
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TaskProgressColumn(),
+        TimeElapsedColumn(),
+        console=console,
+        transient=False,
+    ) as progress:
+        overall = progress.add_task("[bold]Синхронизация репозиториев[/bold]", total=len(repos))
+
+        def sync_one(r: Dict):
+            started = time.perf_counter()
+            bump("total")
+            name = r.get("name") or r.get("slug")
+            alias = naming_engine.repo_alias(r)
+            key = repo_key(owner_alias, alias)
+            repo_path = mirror_path(workdir, owner_alias, alias)
+            item = {
+                "repo": name,
+                "alias": alias,
+                "refs_updated": 0,
+                "refs_deleted": 0,
+                "lfs": None,
+                "duration_s": None,
+                "status": "PENDING",
+                "message": "",
+            }
+
+            def done(status: str, message: str):
+                item["status"] = status
+                item["message"] = message
+                item["duration_s"] = round(time.perf_counter() - started, 2)
+                with summary_lock:
+                    summary["items"].append(item)
+
+            if naming_engine.skip_reason(name):
+                bump("skipped")
+                return done("SKIPPED", "Исключён фильтрами")
+
+            saved = state.get_repo(key)
+            if not saved or not saved.get("dst_url") or not os.path.isdir(repo_path):
+                bump("skipped")
+                return done("SKIPPED", "Нет сохранённого зеркала — выполните migrate с KEEP_CLONES=true")
+
+            src_url = r.get("clone_ssh") if use_ssh and r.get("clone_ssh") else r.get("clone_http")
+            if (not use_ssh) and src_url and src_url.startswith("http"):
+                src_url = with_https_creds(src_url, bb_git_user, bb_git_pass)
+            dst_url = saved["dst_url"]
+            if (not use_ssh) and dst_url.startswith("http"):
+                dst_url = with_https_creds(dst_url, gf_git_user, gf_git_pass)
+
+            result = sync_mirror(
+                repo_path, key, src_url, dst_url, state, lfs_engine,
+                dry_run=dry_run,
+                git_timeout=git_timeout,
+                push_batch=push_batch,
+                push_batch_jobs=push_batch_jobs,
+            )
+            changed, deleted = result["changed"], result["deleted"]
+            if not changed and not deleted:
+                bump("unchanged")
+                if not dry_run:
+                    state.save_repo(key, synced_at=time.time())
+                return done("UNCHANGED", "Изменений нет")
+
+            progress.console.print(
+                f"[dim]\\[{name}][/dim] изменено refs: {len(changed)}, удалено: {len(deleted)}"
+            )
+            if dry_run:
+                bump("synced")
+                item["refs_updated"], item["refs_deleted"] = len(changed), len(deleted)
+                return done("OK", "DRY-RUN: push не выполнялся")
+            item["lfs"] = result["lfs"]
+
+            state.save_repo(key, synced_at=time.time())
+            item["refs_updated"], item["refs_deleted"] = len(changed), len(deleted)
+            bump("synced")
+            bump("refs_updated", len(changed))
+            bump("refs_deleted", len(deleted))
+            done("OK", "Синхронизировано")
+
+        def run_one(r: Dict):
+            name = r.get("name") or r.get("slug")
+            try:
+                sync_one(r)
+            except Exception as e:
+                progress.console.print(f"[red]Ошибка синхронизации {name}[/red]: {e}")
+                bump("errors")
+                with summary_lock:
+                    summary["items"].append({"repo": name, "status": "FAILED", "message": str(e)})
+            finally:
+                progress.advance(overall)
+
+        with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="sync") as pool:
+            for fut in as_completed([pool.submit(run_one, r) for r in repos]):
+                fut.result()
+
+    try:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    except Exception:
+        pass
+
+    return summary
@@ -2,35 +2,36 @@
 import os
 import re
 import yaml
-from slugify import slugify as _slugify
 
 def load_yaml(path: str):
     with open(path, "r", encoding="utf-8") as f:
         return yaml.safe_load(f) or {}
 
-def coalesce(*args):
-    for a in args:
-        if a is not None and a != "":
-            return a
-    return None
-
 def apply_replace_map(s: str, replace_map: dict) -> str:
     out = s
     for k, v in (replace_map or {}).items():
         out = out.replace(k, v)
     return out
 
-def make_alias(name: str, cfg_naming: dict) -> str:
-    s = name or ""
-    s = apply_replace_map(s, cfg_naming.get("replace_map", {}))
-    if cfg_naming.get("slugify", True):
-        s = _slugify(s, allow_unicode=cfg_naming.get("transliterate_ru", True))
-    if cfg_naming.get("lowercase", True):
-        s = s.lower()
-    return s
+def repo_size(r: dict) -> int:
+    """Оценка размера репозитория в байтах (0, если неизвестен)."""
+    return int(r.get("size_bytes") or 0)
+
+def human_bytes(n: int | float | None) -> str:
+    if n is None:
+        return "н/д"
+    n = float(n)
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if abs(n) < 1024 or unit == "TiB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
 
-def match_any(patterns, text: str) -> bool:
-    for p in patterns or []:
-        if re.search(p, text):
-            return True
-    return False
+def parse_size(text: str | None) -> int | None:
+    """'200G', '1.5 GiB', '512M', '1048576' -> байты (основание 1024); пусто или 0 -> None."""
+    if not text or not str(text).strip():
+        return None
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:i?B)?\s*", str(text), re.IGNORECASE)
+    if not m:
+        raise ValueError(f"Некорректный размер: {text!r}")
+    n = int(float(m.group(1)) * 1024 ** " KMGT".index(m.group(2).upper() or " "))
+    return n or None
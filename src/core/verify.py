@@ -0,0 +1,229 @@
+\
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Dict, Iterable
+from rich.console import Console
+from rich.progress import (
+    Progress,
+    SpinnerColumn,
+    TextColumn,
+    BarColumn,
+    TaskProgressColumn,
+    TimeElapsedColumn,
+)
+
+from src.core.git_ops import ls_remote, list_refs
+from src.core.lfs import LfsEngine
+
+console = Console()
+
+# Имя сводки проверки по умолчанию
+VERIFY_REPORT = "verify_report.json"
+
+# Сколько расхождений каждого вида сохраняется в отчёте (счётчики — полные)
+DIFF_LIST_LIMIT = 100
+
+VERIFY_MATCH = "MATCH"
+VERIFY_DIFF = "DIFF"
+VERIFY_ERROR = "ERROR"
+VERIFY_SKIPPED = "SKIPPED"
+
+
+def comparable_refs(refs: Dict[str, str], ignore_prefixes: Iterable[str] = ()) -> Dict[str, str]:
+    """
+    Refs для сравнения: без HEAD (зависит от ветки по умолчанию на сервере) и без
+    «очищенных» тегов ^{} — они однозначно следуют из SHA самого тега.
+    """
+    ignore = tuple(ignore_prefixes or ())
+    return {
+        ref: sha for ref, sha in refs.items()
+        if ref != "HEAD" and not ref.endswith("^{}") and not (ignore and ref.startswith(ignore))
+    }
+
+
+def compare_refs(src: Dict[str, str], dst: Dict[str, str]) -> Dict[str, list]:
+    """missing — есть только в Bitbucket, extra — только в GitFlic, changed — SHA различаются."""
+    return {
+        "missing": sorted(ref for ref in src if ref not in dst),
+        "extra": sorted(ref for ref in dst if ref not in src),
+        "changed": sorted(ref for ref in src if ref in dst and src[ref] != dst[ref]),
+    }
+
+
+def verify_repositories(
+    entries: List[Dict],
+    jobs: int = 8,
+    git_timeout: float | None = None,
+    lfs_engine: LfsEngine | None = None,
+    ignore_prefixes: Iterable[str] = (),
+    report_path: str | None = VERIFY_REPORT,
+):
+    """
+    Проверка перенесённых репозиториев без повторного клонирования.
+    entries — [{"repo", "alias", "project_key", "key", "src_url", "dst_url", "mirror"}]:
+    адреса уже с учётными данными, mirror — сохранённое зеркало в WORKDIR (или None).
+    Для каждого репозитория git ls-remote по Bitbucket и GitFlic выполняются
+    параллельно, после чего сравниваются имена и SHA всех refs.
+    LFS (если передан lfs_engine): когда refs совпали и сохранённое зеркало
+    соответствует Bitbucket, объекты зеркала проверяются на сервере GitFlic через
+    LFS batch API — содержимое не скачивается. Без зеркала LFS не проверяется.
+    """
+    jobs = max(1, int(jobs or 1))
+    summary = {
+        "total": 0,
+        "match": 0,
+        "diff": 0,
+        "errors": 0,
+        "skipped": 0,
+        "lfs_checked": 0,
+        "lfs_missing": 0,
+        "items": [],
+    }
+    summary_lock = threading.Lock()
+    check_lfs = lfs_engine is not None and lfs_engine.available
+
+    def bump(key: str, n: int = 1):
+        with summary_lock:
+            summary[key] += n
+
+    # ls-remote к GitFlic — в отдельном пуле, чтобы обе стороны опрашивались одновременно
+    remote_pool = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="verify-dst")
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TaskProgressColumn(),
+        TimeElapsedColumn(),
+        console=console,
+        transient=False,
+    ) as progress:
+        overall = progress.add_task("[bold]Проверка репозиториев[/bold]", total=len(entries))
+
+        def check_lfs_objects(entry: Dict, src_refs: Dict[str, str], item: Dict):
+            mirror = entry.get("mirror")
+            if not mirror or not os.path.isdir(mirror):
+                item["lfs"] = {"checked": False, "message": "Нет зеркала в WORKDIR"}
+                return
+            if comparable_refs(list_refs(mirror), ignore_prefixes) != src_refs:
+                item["lfs"] = {"checked": False, "message": "Зеркало устарело относительно Bitbucket"}
+                return
+            objects = lfs_engine.scan(mirror) if lfs_engine.detect(mirror) else {}
+            missing = lfs_engine.missing_on_server(entry["dst_url"], objects)
+            if missing is None:
+                item["lfs"] = {"checked": False, "objects": len(objects), "message": "LFS batch API недоступен"}
+                return
+            item["lfs"] = {
+                "checked": True,
+                "objects": len(objects),
+                "missing": len(missing),
+                "missing_oids": sorted(missing)[:DIFF_LIST_LIMIT],
+            }
+            bump("lfs_checked")
+            bump("lfs_missing", len(missing))
+
+        def ls_both(entry: Dict) -> tuple:
+            dst_future = remote_pool.submit(ls_remote, entry["dst_url"], timeout=git_timeout)
+            try:
+                src_raw = ls_remote(entry["src_url"], timeout=git_timeout)
+            except Exception as e:
+                wait([dst_future])  # не оставляем висящий запрос к GitFlic
+                raise RuntimeError(f"Bitbucket: {e}") from e
+            try:
+                dst_raw = dst_future.result()
+            except Exception as e:
+                raise RuntimeError(f"GitFlic: {e}") from e
+            return comparable_refs(src_raw, ignore_prefixes), comparable_refs(dst_raw, ignore_prefixes)
+
+        def verify_one(entry: Dict):
+            started = time.perf_counter()
+            bump("total")
+            item = {
+                "project_key": entry.get("project_key"),
+                "repo": entry.get("repo"),
+                "alias": entry.get("alias"),
+                "status": VERIFY_MATCH,
+                "message": "",
+                "refs_src": 0,
+                "refs_dst": 0,
+                "missing": 0,
+                "extra": 0,
+                "changed": 0,
+                "lfs": None,
+            }
+
+            def done(status: str, message: str = ""):
+                item["status"] = status
+                item["message"] = message
+                item["duration_s"] = round(time.perf_counter() - started, 2)
+                with summary_lock:
+                    summary["items"].append(item)
+
+            if not entry.get("src_url") or not entry.get("dst_url"):
+                bump("skipped")
+                return done(VERIFY_SKIPPED, entry.get("message") or "Нет адресов репозитория")
+
+            src, dst = ls_both(entry)
+            diff = compare_refs(src, dst)
+            item["refs_src"], item["refs_dst"] = len(src), len(dst)
+            for kind, refs in diff.items():
+                item[kind] = len(refs)
+                if refs:
+                    item[f"{kind}_refs"] = (
+                        [{"ref": r, "src": src[r], "dst": dst[r]} for r in refs[:DIFF_LIST_LIMIT]]
+                        if kind == "changed" else refs[:DIFF_LIST_LIMIT]
+                    )
+
+            if check_lfs and not any(diff.values()):
+                check_lfs_objects(entry, src, item)
+
+            problems = []
+            if item["missing"]:
+                problems.append(f"нет в GitFlic: {item['missing']}")
+            if item["extra"]:
+                problems.append(f"лишних: {item['extra']}")
+            if item["changed"]:
+                problems.append(f"другой SHA: {item['changed']}")
+            lfs_missing = (item["lfs"] or {}).get("missing", 0)
+            if lfs_missing:
+                problems.append(f"нет LFS-объектов: {lfs_missing}")
+            if problems:
+                bump("diff")
+                return done(VERIFY_DIFF, "; ".join(problems))
+            bump("match")
+            done(VERIFY_MATCH, f"refs: {len(src)}")
+
+        def run_one(entry: Dict):
+            try:
+                verify_one(entry)
+            except Exception as e:
+                progress.console.print(f"[red]Ошибка проверки {entry.get('repo')}[/red]: {e}")
+                bump("errors")
+                with summary_lock:
+                    summary["items"].append({
+                        "project_key": entry.get("project_key"),
+                        "repo": entry.get("repo"),
+                        "alias": entry.get("alias"),
+                        "status": VERIFY_ERROR,
+                        "message": str(e)[-500:],
+                    })
+            finally:
+                progress.advance(overall)
+
+        try:
+            with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="verify") as pool:
+                list(pool.map(run_one, entries))
+        finally:
+            remote_pool.shutdown(wait=True)
+
+    if report_path:
+        try:
+            with open(report_path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+        except Exception:
+            pass
+
+    return summary
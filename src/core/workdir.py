@@ -0,0 +1,161 @@
+\
+import os
+import shutil
+import time
+import threading
+from typing import Dict
+
+from src.core.state import StateStore
+from src.core.objcache import CACHE_DIR
+from src.core.lfs import LFS_STORE_DIR
+from src.core.utils import human_bytes
+
+# Общие каталоги WORKDIR: учитываются в занятом месте, но не вытесняются
+SHARED_DIRS = (CACHE_DIR, LFS_STORE_DIR)
+
+
+class DiskBudgetError(RuntimeError):
+    """Зеркало заведомо не помещается в бюджет WORKDIR или на диск."""
+
+
+def dir_size(path: str) -> int:
+    """Фактически занятое место на диске (байт) под каталогом."""
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for fn in files:
+            try:
+                st = os.lstat(os.path.join(root, fn))
+            except OSError:
+                continue
+            total += getattr(st, "st_blocks", 0) * 512 or st.st_size
+    return total
+
+
+class WorkdirManager:
+    """
+    Учёт места в WORKDIR с бюджетом.
+    Зеркала (<WORKDIR>/<owner>/<alias>.git) после переноса остаются на диске и
+    переиспользуются, пока укладываются в бюджет; когда новый клон не помещается,
+    вытесняются зеркала, которые дольше всего не синхронизировались (LRU по synced_at).
+    Клон, который не поместится даже после вытеснения всех свободных зеркал,
+    отклоняется до старта (DiskBudgetError) — вместо ENOSPC посреди clone.
+    Кэш объектов (.objcache) и общее LFS-хранилище (.lfs-objects) учитываются
+    в занятом месте, но не вытесняются; их размер измеряется вне блокировки один раз
+    на reserve, а не на каждой итерации ожидания.
+    """
+
+    def __init__(self, workdir: str, budget_bytes: int, state: StateStore | None = None) -> None:
+        self.workdir = workdir
+        self.budget = int(budget_bytes)
+        self.state = state
+        self._cond = threading.Condition()
+        self._mirrors: Dict[str, dict] = {}   # key -> {path, size, last_used}
+        self._active: Dict[str, int] = {}     # key -> зарезервировано байт
+        self._waiting: set[str] = set()
+        self.evicted: list[str] = []
+        os.makedirs(workdir, exist_ok=True)
+        self._scan()
+        self._shared = self._shared_size()
+
+    def _last_used(self, key: str, path: str) -> float:
+        saved = self.state.get_repo(key) if self.state is not None else None
+        if saved and (saved.get("synced_at") or saved.get("updated_at")):
+            return saved.get("synced_at") or saved.get("updated_at")
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0.0
+
+    def _scan(self) -> None:
+        for owner in os.listdir(self.workdir):
+            owner_dir = os.path.join(self.workdir, owner)
+            if owner in SHARED_DIRS or not os.path.isdir(owner_dir):
+                continue
+            for name in os.listdir(owner_dir):
+                path = os.path.join(owner_dir, name)
+                if not name.endswith(".git") or not os.path.isdir(path):
+                    continue
+                key = f"{owner}/{name[:-len('.git')]}"
+                self._mirrors[key] = {
+                    "path": path,
+                    "size": dir_size(path),
+                    "last_used": self._last_used(key, path),
+                }
+
+    def _shared_size(self) -> int:
+        return sum(dir_size(os.path.join(self.workdir, d)) for d in SHARED_DIRS)
+
+    def _used(self) -> int:
+        idle = sum(m["size"] for k, m in self._mirrors.items() if k not in self._active)
+        return idle + sum(self._active.values()) + self._shared
+
+    def _evict_one(self) -> bool:
+        idle = [(m["last_used"], k) for k, m in self._mirrors.items() if k not in self._active]
+        if not idle:
+            return False
+        _, key = min(idle)
+        m = self._mirrors.pop(key)
+        shutil.rmtree(m["path"], ignore_errors=True)
+        self.evicted.append(key)
+        return True
+
+    def reserve(self, key: str, path: str, estimate: int) -> list[str]:
+        """
+        Резервирует место под зеркало key (estimate — ожидаемый размер в байтах).
+        При нехватке вытесняет давно не использованные зеркала; если место занято
+        другими идущими переносами — ждёт их завершения. Возвращает вытесненные ключи.
+        """
+        estimate = max(0, int(estimate or 0))
+        # обход общих каталогов долгий — не под блокировкой
+        shared = self._shared_size()
+        with self._cond:
+            self._shared = shared
+            evicted_before = len(self.evicted)
+            current = self._mirrors.get(key, {}).get("size", 0) if os.path.isdir(path) else 0
+            need = max(estimate, current)
+            if need > self.budget:
+                raise DiskBudgetError(
+                    f"Зеркало ~{human_bytes(need)} больше бюджета WORKDIR {human_bytes(self.budget)}"
+                )
+            # пока ждём места, своё зеркало не вытесняется и не учитывается дважды
+            self._active[key] = 0
+            try:
+                while True:
+                    free = shutil.disk_usage(self.workdir).free - sum(self._active.values())
+                    fits_budget = self._used() + need <= self.budget
+                    fits_disk = free >= need - current
+                    if fits_budget and fits_disk:
+                        break
+                    if self._evict_one():
+                        continue
+                    running = [k for k in self._active if k != key and k not in self._waiting]
+                    if not running:
+                        raise DiskBudgetError(
+                            f"Недостаточно места для зеркала ~{human_bytes(need)}: "
+                            f"свободно на диске {human_bytes(max(free, 0))}, "
+                            f"бюджет {human_bytes(self.budget)}"
+                        )
+                    # место освободится, когда завершатся идущие переносы
+                    self._waiting.add(key)
+                    self._cond.wait()
+                    self._waiting.discard(key)
+            except BaseException:
+                self._active.pop(key, None)
+                self._waiting.discard(key)
+                self._cond.notify_all()
+                raise
+            self._active[key] = need
+            return self.evicted[evicted_before:]
+
+    def release(self, key: str, path: str | None = None) -> None:
+        """Снимает резерв; оставшееся на диске зеркало учитывается по фактическому размеру."""
+        size = dir_size(path) if path and os.path.isdir(path) else None
+        with self._cond:
+            if key not in self._active:
+                return
+            self._active.pop(key)
+            if size is not None:
+                self._mirrors[key] = {"path": path, "size": size, "last_used": time.time()}
+            else:
+                self._mirrors.pop(key, None)
+            self._cond.notify_all()
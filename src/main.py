@@ -1,5 +1,8 @@
 \
 import os
+import re
+import csv
+import sys
 import json
 from urllib.parse import urlparse
 import typer
@@ -12,8 +15,28 @@ from rich.panel import Panel
 
 from src.clients.bitbucket_server import BitbucketServerClient
 from src.clients.gitflic import GitFlicClient
-from src.core.migrator import migrate_repositories
-from src.core.utils import load_yaml
+from src.clients.ratelimit import RateController
+from src.core.migrator import migrate_repositories, summarize_items
+from src.core.discovery import discover_targets, build_work_queue, print_discovery
+from src.core.sync import sync_repositories
+from src.core.serve import MirrorService, COALESCE_DELAY, RECONCILE_INTERVAL
+from src.core.state import StateStore, repo_key, mirror_path
+from src.core.objcache import ObjectCache
+from src.core.workdir import WorkdirManager
+from src.core.lfs import LfsEngine
+from src.core.projects import ProjectIndex, CREATE_JOBS
+from src.core.metrics import MetricsExporter, TIMED_STAGES
+from src.core.report import (
+    ReportWriter, REPORT_JSONL, read_report, run_ids, select_runs, merge_reports, project_summaries,
+)
+from src.core.naming import NamingEngine, PLAN_COLLISION, PLAN_SKIPPED
+from src.core.inventory import InventoryStore, diff_inventory, delta_repos, snapshot_after_run
+from src.core.lease import LeaseStore, LEASE_TTL
+from src.core import bandwidth
+from src.core.bandwidth import BandwidthGovernor
+from src.core.verify import verify_repositories, VERIFY_REPORT, VERIFY_MATCH, VERIFY_SKIPPED
+from src.core.git_ops import with_https_creds
+from src.core.utils import load_yaml, parse_size, human_bytes
 
 app = typer.Typer(
     help="Bitbucket Server/DC → GitFlic migrator",
@@ -104,23 +127,8 @@ def parse_project_url(project_url: str):
         raise ValueError(f"Не удалось извлечь PROJECT_KEY из URL: {project_url}")
     return base, project_key
 
-@app.command()
-def migrate(
-    project_url: list[str] = typer.Option(
-        None, "--project-url", "-u", help="URL проекта Bitbucket (можно несколько)"
-    ),
-    project_key: list[str] = typer.Option(
-        None, "--project-key", "-k", help="Ключ проекта (можно несколько, используется с BITBUCKET_BASE_URL)"
-    ),
-    dry_run: bool = typer.Option(None, help="Сухой прогон (переопределяет DRY_RUN из .env)"),
-):
-    load_dotenv()
-
-    env = os.environ
-    cfg = load_yaml("config.yml") if os.path.exists("config.yml") else {}
-
-    targets = build_targets(env, list(project_url or []), list(project_key or []))
-    
+def require_targets(env, cli_urls, cli_keys) -> list[tuple[str, str]]:
+    targets = build_targets(env, list(cli_urls or []), list(cli_keys or []))
     if not targets:
         typer.echo(
             "Укажите один или несколько --project-url / --project-key, "
@@ -128,16 +136,65 @@ def migrate(
             err=True
         )
         raise typer.Exit(2)
+    return targets
 
-    owner_type = (env.get("GITFLIC_OWNER_ALIAS_TYPE") or "TEAM").upper()
-    if owner_type not in ("TEAM", "COMPANY"):
-        typer.echo("GITFLIC_OWNER_ALIAS_TYPE должен быть TEAM или COMPANY", err=True)
-        raise typer.Exit(2)
-    
+def resolve_global_owner_alias(env, targets: list[tuple[str, str]]) -> str:
     global_owner_alias = (env.get("GITFLIC_OWNER_ALIAS") or "").strip().lower()
     if len(targets) > 1 and global_owner_alias:
         console.print("[yellow]GITFLIC_OWNER_ALIAS задан, но проектов больше одного — игнорирую и использую project_key в lower[/yellow]")
         global_owner_alias = ""
+    return global_owner_alias
+
+def make_naming_engine(cfg: dict) -> NamingEngine:
+    try:
+        return NamingEngine.from_config(cfg)
+    except re.error as e:
+        typer.echo(f"config.yml: некорректный шаблон filters ({e.pattern!r}): {e}", err=True)
+        raise typer.Exit(2)
+
+def print_collisions(rows: list[dict], limit: int = 20) -> int:
+    """Таблица репозиториев с совпавшим alias; возвращает их число."""
+    collided = [row for row in rows if row["status"] == PLAN_COLLISION]
+    if not collided:
+        return 0
+    tbl = Table(title="Коллизии alias", box=box.SIMPLE_HEAVY)
+    for col in ("Проект", "Репозиторий", "Владелец", "Alias"):
+        tbl.add_column(col)
+    for row in sorted(collided, key=lambda x: (x["owner"], x["alias"]))[:limit]:
+        tbl.add_row(row["project_key"] or "", row["repo"], row["owner"], row["alias"])
+    console.print(tbl)
+    if len(collided) > limit:
+        console.print(f"[dim]... и ещё {len(collided) - limit} (полный список: bb2gf plan)[/dim]")
+    return len(collided)
+
+def make_rate_controller(env, name: str) -> RateController:
+    """
+    API_MAX_CONCURRENCY — верхний предел одновременных запросов к серверу,
+    API_LATENCY_TARGET — ответ медленнее (с) уменьшает лимит,
+    API_BREAKER_FAILURES / API_BREAKER_COOLDOWN — сбоев подряд до размыкания и пауза (с).
+    """
+    return RateController(
+        name,
+        max_concurrency=int(env.get("API_MAX_CONCURRENCY") or 16),
+        latency_target=float(env.get("API_LATENCY_TARGET") or 5),
+        failure_threshold=int(env.get("API_BREAKER_FAILURES") or 5),
+        cooldown=float(env.get("API_BREAKER_COOLDOWN") or 30),
+    )
+
+def make_bb_client_factory(env):
+    """
+    Возвращает (get_bb_client, bb_git_user, bb_git_pass).
+    get_bb_client кэширует клиент Bitbucket на каждый base URL.
+    """
+    # Bitbucket auth
+    auth_type = (env.get("BITBUCKET_AUTH_TYPE") or "BASIC").upper()
+    bb_username = env.get("BITBUCKET_USERNAME") or ""
+    bb_password = env.get("BITBUCKET_PASSWORD") or ""
+    bb_token = env.get("BITBUCKET_TOKEN") or ""
+    bb_git_user = env.get("BITBUCKET_GIT_USERNAME") or bb_username
+    bb_git_pass = bb_password if auth_type == "BASIC" else (env.get("BITBUCKET_GIT_PASSWORD") or bb_token)
+    verify_tls = env.get("BITBUCKET_VERIFY_TLS", "true").lower() == "true"
+    ca_cert = env.get("BITBUCKET_CA_CERT") or None
 
     bb_clients: dict[str, BitbucketServerClient] = {}
     def get_bb_client(base_url: str) -> BitbucketServerClient:
@@ -150,101 +207,63 @@ def migrate(
                 token=bb_token,
                 verify=verify_tls,
                 ca_cert=ca_cert,
+                rate=make_rate_controller(env, f"Bitbucket {base_url}"),
             )
         return bb_clients[base_url]
 
+    return get_bb_client, bb_git_user, bb_git_pass
 
-    # Bitbucket auth
-    auth_type = (env.get("BITBUCKET_AUTH_TYPE") or "BASIC").upper()
-    bb_username = env.get("BITBUCKET_USERNAME") or ""
-    bb_password = env.get("BITBUCKET_PASSWORD") or ""
-    bb_token = env.get("BITBUCKET_TOKEN") or ""
-    bb_git_user = env.get("BITBUCKET_GIT_USERNAME") or bb_username
-    bb_git_pass = bb_password if auth_type == "BASIC" else (env.get("BITBUCKET_GIT_PASSWORD") or bb_token)
-    verify_tls = env.get("BITBUCKET_VERIFY_TLS", "true").lower() == "true"
-    ca_cert = env.get("BITBUCKET_CA_CERT") or None
+def env_git_timeout(env) -> float | None:
+    """GIT_COMMAND_TIMEOUT — лимит (с) на одну git-команду; 0 или пусто — без лимита."""
+    val = float(env.get("GIT_COMMAND_TIMEOUT") or 0)
+    return val if val > 0 else None
 
-    # GitFlic API
-    gf_base = (env.get("GITFLIC_API_BASE_URL") or "http://localhost:8080/rest-api").rstrip("/")
-    gf_token = env.get("GITFLIC_API_TOKEN")
-    if not gf_token:
-        typer.echo("Не задан GITFLIC_API_TOKEN", err=True)
-        raise typer.Exit(2)
+def env_push_batch(env, push_batch: int | None) -> tuple[int, int]:
+    """PUSH_BATCH_REFS (0 — один push --mirror) и PUSH_BATCH_JOBS (параллельных порций)."""
+    if push_batch is None:
+        push_batch = int(env.get("PUSH_BATCH_REFS") or 0)
+    return max(0, push_batch), max(1, int(env.get("PUSH_BATCH_JOBS") or 1))
 
-    # Git push credentials
-    use_ssh = (env.get("USE_SSH", "false").lower() == "true")
-    gf_git_user = env.get("GITFLIC_GIT_USERNAME")
-    gf_git_pass = env.get("GITFLIC_GIT_PASSWORD")
-
-    # Options
-    visibility_private = (env.get("VISIBILITY_PRIVATE", "true").lower() == "true")
-    raw_lang = (env.get("LANGUAGE_DEFAULT") or "").strip()
-    language_default = raw_lang or None  # None = не передавать поле language
-    env_dry_run = (env.get("DRY_RUN", "false").lower() == "true")
-    if dry_run is None:
-        dry_run = env_dry_run
-
-    workdir = env.get("WORKDIR", "/tmp/migrate-bb-to-gf")
-    keep_clones = (env.get("KEEP_CLONES", "false").lower() == "true")
-
-    gf = GitFlicClient(base_url=gf_base, api_token=gf_token)
+def make_lfs_engine(env, workdir: str, state: StateStore | None = None) -> LfsEngine:
+    """
+    LFS_CONCURRENCY — параллельных передач на репозиторий, LFS_SHARED_STORE — общее
+    хранилище объектов, LFS_DETECT — tips или full (см. LfsEngine.detect).
+    """
+    engine = LfsEngine(
+        workdir,
+        concurrency=int(env.get("LFS_CONCURRENCY") or 8),
+        shared_store=(env.get("LFS_SHARED_STORE", "true").lower() == "true"),
+        state=state,
+        detect_mode=(env.get("LFS_DETECT") or "tips").lower(),
+    )
+    if not engine.available:
+        console.print("[yellow]git-lfs не найден — LFS-объекты переноситься не будут[/yellow]")
+    return engine
 
-    # Init clients
+def print_report(records: list[dict]) -> dict:
+    """
+    Таблица по проектам, сводная панель и время по этапам по записям отчёта JSON Lines.
+    Возвращает {"projects": [...], "totals": {...}} для report_all.json.
+    """
     global_report = {
-        "projects": [],
-        "totals": {"total": 0, "created": 0, "exists": 0, "lfs_pushed": 0, "skipped": 0, "errors": 0}
+        "projects": project_summaries(records, summarize_items),
+        "totals": {
+            "total": 0, "created": 0, "exists": 0, "lfs_pushed": 0, "skipped": 0, "errors": 0,
+            "lfs_objects": 0, "lfs_bytes": 0, "lfs_uploaded_bytes": 0,
+        }
     }
-
-    for bb_base, key in targets:
-        owner_alias = (global_owner_alias or str(key)).strip().lower()
-
-        console.rule(f"[bold]Bitbucket → GitFlic: проект {key}[/bold]")
-        info_tbl = Table(show_header=False, box=None)
-        info_tbl.add_row("Bitbucket", f"{bb_base} (project={key})")
-        info_tbl.add_row("GitFlic API", gf_base)
-        info_tbl.add_row("ownerAlias / type", f"{owner_alias} / {owner_type}")
-        info_tbl.add_row("Visibility", "private" if visibility_private else "public")
-        info_tbl.add_row("Language", language_default or "")
-        info_tbl.add_row("Dry run", str(dry_run))
-        info_tbl.add_row("Workdir", workdir)
-        info_tbl.add_row("Use SSH", str(use_ssh))
-        console.print(info_tbl)
-
-        bb = get_bb_client(bb_base)
-        repos = bb.list_repositories(project_key=key)
-        if not repos:
-            console.print(f"[yellow]Репозитории не найдены для проекта {key}[/yellow]")
-            proj_report = {"project_key": key, "base_url": bb_base, "summary": {"total": 0}}
-            global_report["projects"].append(proj_report)
-            continue
-
-        report = migrate_repositories(
-            repos=repos,
-            owner_alias=owner_alias,
-            owner_type=owner_type,
-            visibility_private=visibility_private,
-            language_default=language_default,
-            use_ssh=use_ssh,
-            dry_run=dry_run,
-            workdir=workdir,
-            keep_clones=keep_clones,
-            bb_client=bb,
-            gf_client=gf,
-            gf_git_user=gf_git_user,
-            gf_git_pass=gf_git_pass,
-            bb_git_user=bb_git_user,
-            bb_git_pass=bb_git_pass,
-        )
-
-        try:
-            with open(f"report_{key.lower()}.json", "w", encoding="utf-8") as f:
-                json.dump(report, f, ensure_ascii=False, indent=2)
-        except Exception:
-            pass
-
+    repos_listed = {
+        (r.get("project_key"), r.get("base_url")): r.get("repos")
+        for r in records if r.get("record") == "project"
+    }
+    for p in global_report["projects"]:
+        s = p["summary"]
+        if s.get("message"):
+            console.print(f"[red]Не удалось получить репозитории проекта {p['project_key']}[/red]: {s['message']}")
+        elif repos_listed.get((p["project_key"], p["base_url"])) == 0:
+            console.print(f"[yellow]Репозитории не найдены для проекта {p['project_key']}[/yellow]")
         for ksum in global_report["totals"].keys():
-            global_report["totals"][ksum] += int(report.get(ksum, 0))
-        global_report["projects"].append({"project_key": key, "base_url": bb_base, "summary": report})
+            global_report["totals"][ksum] += int(s.get(ksum, 0))
 
     console.rule("[bold]Итоги по проектам[/bold]")
 
@@ -252,6 +271,7 @@ def migrate(
     proj_tbl.add_column("Проект", style="bold")
     proj_tbl.add_column("Всего")
     proj_tbl.add_column("Создано")
+    proj_tbl.add_column("Существовал")
     proj_tbl.add_column("LFS")
     proj_tbl.add_column("Пропущено")
     proj_tbl.add_column("Ошибок")
@@ -261,7 +281,8 @@ def migrate(
             p.get("project_key", ""),
             str(s.get("total", 0)),
             str(s.get("created", 0)),
-            str(s.get("lfs_pushed", 0)),
+            str(s.get("exists", 0)),
+            f"{s.get('lfs_pushed', 0)} ({human_bytes(s.get('lfs_bytes', 0))})",
             str(s.get("skipped", 0)),
             str(s.get("errors", 0)),
         )
@@ -271,11 +292,364 @@ def migrate(
     all_line = (
         f"[bold]Всего:[/bold] {totals['total']}    "
         f"[green]Создано:[/green] {totals['created']}    "
-        f"[cyan]LFS загружено:[/cyan] {totals['lfs_pushed']}    "
+        f"[green]Существовал:[/green] {totals['exists']}    "
+        f"[cyan]LFS:[/cyan] {totals['lfs_pushed']} репоз., {totals['lfs_objects']} объектов, "
+        f"загружено {human_bytes(totals['lfs_uploaded_bytes'])}    "
         f"[yellow]Пропущено:[/yellow] {totals['skipped']}    "
         f"[red]Ошибок:[/red] {totals['errors']}"
     )
     console.print(Panel(all_line, title="Сводка по всем проектам", border_style="blue"))
+    print_stage_timings([r for r in records if r.get("record") == "item"])
+    return global_report
+
+def print_stage_timings(items: list[dict]) -> None:
+    """Суммарное время по этапам переноса — где прогон тратит время."""
+    totals = {stage: 0.0 for stage in TIMED_STAGES}
+    for it in items:
+        for stage, sec in (it.get("timings_s") or {}).items():
+            totals[stage] = totals.get(stage, 0.0) + sec
+    whole = sum(totals.values())
+    if not whole:
+        return
+    tbl = Table(title="Время по этапам", box=box.SIMPLE)
+    tbl.add_column("Этап")
+    tbl.add_column("Время, с", justify="right")
+    tbl.add_column("Доля", justify="right")
+    for stage, sec in totals.items():
+        tbl.add_row(stage, f"{sec:.1f}", f"{sec / whole:.0%}")
+    console.print(tbl)
+
+def report_path_from(env, cfg: dict, path: str | None = None) -> str:
+    return path or env.get("REPORT_JSONL") or cfg.get("report", {}).get("jsonl") or REPORT_JSONL
+
+def make_inventory(env, workdir: str) -> tuple[InventoryStore, float, float]:
+    """
+    Снимки inventory (INVENTORY_DIR, по умолчанию WORKDIR/inventory) и их сроки:
+    INVENTORY_MAX_AGE — снимок моложе (с) заменяет листинг Bitbucket (0 — всегда листинг),
+    INVENTORY_SIZES_MAX_AGE — до этого возраста размеры известных репозиториев берутся из снимка.
+    """
+    store = InventoryStore(env.get("INVENTORY_DIR") or InventoryStore.for_workdir(workdir).root)
+    return (
+        store,
+        float(env.get("INVENTORY_MAX_AGE") or 0),
+        float(env.get("INVENTORY_SIZES_MAX_AGE") or 86400),
+    )
+
+def print_inventory_diff(entry: dict, diff: dict, limit: int = 50) -> None:
+    """Изменения списка репозиториев проекта с прошлого снимка."""
+    if entry["previous"] is None:
+        console.print(f"[bold]{entry['project_key']}[/bold]: снимка нет — все {len(entry['repos'])} репозиториев новые")
+        return
+    console.print(
+        f"[bold]{entry['project_key']}[/bold]: "
+        f"[green]добавлено {len(diff['added'])}[/green], "
+        f"[red]удалено {len(diff['removed'])}[/red], "
+        f"[yellow]переименовано {len(diff['renamed'])}[/yellow], "
+        f"без изменений {diff['unchanged']}"
+    )
+    lines = (
+        [f"  [green]+[/green] {r['slug']}" for r in diff["added"]]
+        + [f"  [red]-[/red] {r['slug']}" for r in diff["removed"]]
+        + [f"  [yellow]~[/yellow] {pair['old']['slug']} → {pair['new']['slug']}" for pair in diff["renamed"]]
+    )
+    for line in lines[:limit]:
+        console.print(line, highlight=False)
+    if len(lines) > limit:
+        console.print(f"[dim]  ... и ещё {len(lines) - limit}[/dim]")
+
+def make_bandwidth(env, cfg: dict, limit: str | None = None) -> BandwidthGovernor | None:
+    """
+    Общий бюджет полосы на git- и LFS-передачи: раздел bandwidth в config.yml
+    (limit и окна времени); --bandwidth / BANDWIDTH_LIMIT переопределяют limit.
+    """
+    try:
+        return BandwidthGovernor.from_config(
+            cfg.get("bandwidth"),
+            limit=limit or env.get("BANDWIDTH_LIMIT"),
+            on_change=lambda msg: console.print(f"[cyan]{msg}[/cyan]", highlight=False),
+        )
+    except ValueError as e:
+        typer.echo(f"config.yml: bandwidth: {e}", err=True)
+        raise typer.Exit(2)
+
+def stop_bandwidth(governor: BandwidthGovernor | None) -> None:
+    if governor is not None:
+        governor.close()
+        bandwidth.install(None)
+
+def env_jobs(env, jobs: int | None) -> int:
+    if jobs is None:
+        jobs = int(env.get("MIGRATE_CONCURRENCY") or env.get("CONCURRENCY") or 1)
+    return jobs
+
+@app.command()
+def migrate(
+    project_url: list[str] = typer.Option(
+        None, "--project-url", "-u", help="URL проекта Bitbucket (можно несколько)"
+    ),
+    project_key: list[str] = typer.Option(
+        None, "--project-key", "-k", help="Ключ проекта (можно несколько, используется с BITBUCKET_BASE_URL)"
+    ),
+    dry_run: bool = typer.Option(None, help="Сухой прогон (переопределяет DRY_RUN из .env)"),
+    jobs: int = typer.Option(
+        None, "--jobs", "-j", help="Число параллельно мигрируемых репозиториев (переопределяет MIGRATE_CONCURRENCY из .env)"
+    ),
+    fetch_jobs: int = typer.Option(
+        None, "--fetch-jobs", help="Число одновременных clone/lfs fetch из Bitbucket (переопределяет FETCH_CONCURRENCY)"
+    ),
+    push_jobs: int = typer.Option(
+        None, "--push-jobs", help="Число одновременных push/lfs push в GitFlic (переопределяет PUSH_CONCURRENCY)"
+    ),
+    queue_size: int = typer.Option(
+        None, "--queue-size", help="Ёмкость очереди клонов, ожидающих push (переопределяет PIPELINE_QUEUE_SIZE)"
+    ),
+    resume: bool = typer.Option(
+        False, "--resume", help="Продолжить прерванную миграцию: пропустить перенесённые, упавшие продолжить с последнего этапа"
+    ),
+    object_cache: bool = typer.Option(
+        None, "--object-cache/--no-object-cache", help="Общий кэш объектов для форков (переопределяет OBJECT_CACHE из .env)"
+    ),
+    disk_budget: str = typer.Option(
+        None, "--disk-budget", help="Бюджет места в WORKDIR, напр. 200G (переопределяет WORKDIR_DISK_BUDGET из .env)"
+    ),
+    transfer: str = typer.Option(
+        None, "--transfer", help="Способ переноса: mirror (clone + push --mirror) или relay (порциями refs); переопределяет TRANSFER_MODE"
+    ),
+    push_batch: int = typer.Option(
+        None, "--push-batch", help="Пушить refs порциями такого размера вместо push --mirror (переопределяет PUSH_BATCH_REFS; 0 — выкл.)"
+    ),
+    metrics_file: str = typer.Option(
+        None, "--metrics-file", help="Файл метрик Prometheus (textfile), обновляется по ходу прогона (переопределяет METRICS_FILE)"
+    ),
+    lease_db: str = typer.Option(
+        None, "--lease-db", help="Общий файл аренды для запуска на нескольких хостах (переопределяет LEASE_DB)"
+    ),
+    delta: bool = typer.Option(
+        False, "--delta", help="Переносить только репозитории, добавленные или переименованные с прошлого снимка inventory"
+    ),
+    bandwidth_limit: str = typer.Option(
+        None, "--bandwidth", help="Общий лимит полосы на все передачи, байт/с, напр. 50M (переопределяет BANDWIDTH_LIMIT)"
+    ),
+):
+    load_dotenv()
+
+    env = os.environ
+    cfg = load_yaml("config.yml") if os.path.exists("config.yml") else {}
+    naming_engine = make_naming_engine(cfg)
+
+    targets = require_targets(env, project_url, project_key)
+
+    owner_type = (env.get("GITFLIC_OWNER_ALIAS_TYPE") or "TEAM").upper()
+    if owner_type not in ("TEAM", "COMPANY"):
+        typer.echo("GITFLIC_OWNER_ALIAS_TYPE должен быть TEAM или COMPANY", err=True)
+        raise typer.Exit(2)
+    
+    global_owner_alias = resolve_global_owner_alias(env, targets)
+    get_bb_client, bb_git_user, bb_git_pass = make_bb_client_factory(env)
+
+    # GitFlic API
+    gf_base = (env.get("GITFLIC_API_BASE_URL") or "http://localhost:8080/rest-api").rstrip("/")
+    gf_token = env.get("GITFLIC_API_TOKEN")
+    if not gf_token:
+        typer.echo("Не задан GITFLIC_API_TOKEN", err=True)
+        raise typer.Exit(2)
+
+    # Git push credentials
+    use_ssh = (env.get("USE_SSH", "false").lower() == "true")
+    gf_git_user = env.get("GITFLIC_GIT_USERNAME")
+    gf_git_pass = env.get("GITFLIC_GIT_PASSWORD")
+
+    # Options
+    visibility_private = (env.get("VISIBILITY_PRIVATE", "true").lower() == "true")
+    raw_lang = (env.get("LANGUAGE_DEFAULT") or "").strip()
+    language_default = raw_lang or None  # None = не передавать поле language
+    env_dry_run = (env.get("DRY_RUN", "false").lower() == "true")
+    if dry_run is None:
+        dry_run = env_dry_run
+
+    jobs = env_jobs(env, jobs)
+    if fetch_jobs is None:
+        fetch_jobs = int(env.get("FETCH_CONCURRENCY") or jobs)
+    if push_jobs is None:
+        push_jobs = int(env.get("PUSH_CONCURRENCY") or jobs)
+    if queue_size is None:
+        queue_size = int(env.get("PIPELINE_QUEUE_SIZE") or push_jobs)
+    if min(jobs, fetch_jobs, push_jobs, queue_size) < 1:
+        typer.echo("--jobs / --fetch-jobs / --push-jobs / --queue-size должны быть >= 1", err=True)
+        raise typer.Exit(2)
+
+    workdir = env.get("WORKDIR", "/tmp/migrate-bb-to-gf")
+    keep_clones = (env.get("KEEP_CLONES", "false").lower() == "true")
+
+    gf = GitFlicClient(base_url=gf_base, api_token=gf_token, rate=make_rate_controller(env, "GitFlic API"))
+    project_index = ProjectIndex(
+        gf,
+        owner_type,
+        create_jobs=int(env.get("GITFLIC_CREATE_CONCURRENCY") or CREATE_JOBS),
+        use_listing=(env.get("GITFLIC_PROJECT_INDEX", "true").lower() == "true"),
+    )
+    state = None if dry_run else StateStore.for_workdir(workdir)
+    if object_cache is None:
+        object_cache = (env.get("OBJECT_CACHE", "false").lower() == "true")
+    objcache = ObjectCache(workdir, state) if object_cache and state is not None else None
+    try:
+        budget = parse_size(disk_budget or env.get("WORKDIR_DISK_BUDGET"))
+    except ValueError as e:
+        typer.echo(f"--disk-budget / WORKDIR_DISK_BUDGET: {e}", err=True)
+        raise typer.Exit(2)
+    workspace = WorkdirManager(workdir, budget, state) if budget and not dry_run else None
+    lfs_engine = make_lfs_engine(env, workdir, state)
+    transfer = (transfer or env.get("TRANSFER_MODE") or "mirror").lower()
+    if transfer not in ("mirror", "relay"):
+        typer.echo("--transfer / TRANSFER_MODE должен быть mirror или relay", err=True)
+        raise typer.Exit(2)
+    push_batch, push_batch_jobs = env_push_batch(env, push_batch)
+    governor = make_bandwidth(env, cfg, bandwidth_limit)
+    metrics_file = metrics_file or env.get("METRICS_FILE")
+    metrics = MetricsExporter(metrics_file, interval=float(env.get("METRICS_INTERVAL") or 10)) if metrics_file else None
+    lease_db = lease_db or env.get("LEASE_DB")
+    lease = None
+    if lease_db and dry_run:
+        console.print("[yellow]Сухой прогон: LEASE_DB не используется[/yellow]")
+    elif lease_db:
+        lease = LeaseStore(lease_db, holder=env.get("LEASE_HOLDER") or None, ttl=float(env.get("LEASE_TTL") or LEASE_TTL))
+        if resume:
+            reopened = lease.reopen_failed()
+            if reopened:
+                console.print(f"[cyan]Упавших на хостах репозиториев возвращено в работу: {reopened}[/cyan]")
+        lease.start()
+
+    # Обнаружение: листинг всех проектов сразу, до начала переноса
+    console.rule("[bold]Bitbucket → GitFlic: обнаружение репозиториев[/bold]")
+    inventory, inventory_max_age, inventory_sizes_max_age = make_inventory(env, workdir)
+    discovered = discover_targets(
+        targets,
+        get_bb_client,
+        global_owner_alias=global_owner_alias,
+        workers=int(env.get("DISCOVERY_CONCURRENCY") or 8),
+        with_sizes=(env.get("BITBUCKET_FETCH_SIZES", "true").lower() == "true"),
+        inventory=inventory,
+        max_age=inventory_max_age,
+        sizes_max_age=inventory_sizes_max_age,
+    )
+    print_discovery(discovered, console)
+    work = build_work_queue(discovered)
+    collided = print_collisions(naming_engine.plan(work, global_owner_alias))
+    if delta:
+        # коллизии ищутся по всему списку, переносится только разница со снимком
+        for entry in discovered:
+            if not entry["error"]:
+                print_inventory_diff(entry, diff_inventory(entry["previous"], entry["repos"]))
+        work = build_work_queue([
+            {**entry, "repos": delta_repos(diff_inventory(entry["previous"], entry["repos"]))}
+            for entry in discovered
+        ])
+        console.print(f"[cyan]--delta: к переносу {len(work)} репозиториев[/cyan]")
+    if collided:
+        console.print(
+            f"[red]У {collided} репозиториев совпадает alias — они не будут перенесены.[/red] "
+            "Исправьте naming.replace_map в config.yml или переименуйте репозитории."
+        )
+
+    info_tbl = Table(show_header=False, box=None)
+    info_tbl.add_row("Bitbucket", ", ".join(sorted({base for base, _ in targets})))
+    info_tbl.add_row("GitFlic API", gf_base)
+    info_tbl.add_row("ownerAlias / type", f"{global_owner_alias or '<project_key>'} / {owner_type}")
+    info_tbl.add_row("Visibility", "private" if visibility_private else "public")
+    info_tbl.add_row("Language", language_default or "")
+    info_tbl.add_row("Dry run", str(dry_run))
+    info_tbl.add_row("Jobs (fetch / push / queue)", f"{fetch_jobs} / {push_jobs} / {queue_size}")
+    info_tbl.add_row("Workdir", workdir)
+    info_tbl.add_row("Resume", str(resume))
+    if delta:
+        info_tbl.add_row("Delta", "только новые и переименованные")
+    info_tbl.add_row("Use SSH", str(use_ssh))
+    if lease is not None:
+        info_tbl.add_row("Lease", f"{lease_db} ({lease.holder})")
+    if governor is not None:
+        info_tbl.add_row("Bandwidth", governor.describe())
+    console.print(info_tbl)
+
+    report_path = report_path_from(env, cfg)
+    writer = ReportWriter(report_path, fsync_interval=float(env.get("REPORT_FSYNC_INTERVAL") or 5))
+    for entry in discovered:
+        writer.write(
+            {
+                "project_key": entry["project_key"],
+                "base_url": entry["base_url"],
+                "repos": len(entry["repos"]),
+                "error": entry["error"],
+            },
+            "project",
+        )
+
+    if governor is not None:
+        bandwidth.install(governor.start())
+    try:
+        report = {}
+        if work:
+            report = migrate_repositories(
+                repos=work,
+                owner_alias=global_owner_alias,
+                owner_type=owner_type,
+                visibility_private=visibility_private,
+                language_default=language_default,
+                use_ssh=use_ssh,
+                dry_run=dry_run,
+                workdir=workdir,
+                keep_clones=keep_clones,
+                bb_client=None,
+                gf_client=gf,
+                gf_git_user=gf_git_user,
+                gf_git_pass=gf_git_pass,
+                bb_git_user=bb_git_user,
+                bb_git_pass=bb_git_pass,
+                jobs=jobs,
+                fetch_jobs=fetch_jobs,
+                push_jobs=push_jobs,
+                queue_size=queue_size,
+                state=state,
+                resume=resume,
+                git_timeout=env_git_timeout(env),
+                object_cache=objcache,
+                workspace=workspace,
+                transfer=transfer,
+                relay_batch=int(env.get("RELAY_BATCH_REFS") or 0) or None,
+                push_batch=push_batch,
+                push_batch_jobs=push_batch_jobs,
+                lfs_engine=lfs_engine,
+                project_index=project_index,
+                metrics=metrics,
+                report_writer=writer,
+                naming_engine=naming_engine,
+                report_path=cfg.get("report", {}).get("path", "report.json"),
+                lease=lease,
+            )
+        run_record = {"pipeline": report.get("pipeline"), "api": report.get("api"), "dry_run": dry_run}
+        if lease is not None:
+            run_record["host"] = lease.holder
+            run_record["other_hosts"] = report.get("other_hosts", 0)
+        if governor is not None:
+            run_record["bandwidth"] = dict(governor.stats)
+        writer.write(run_record, "run")
+    finally:
+        writer.close()
+        if lease is not None:
+            lease.close()
+        stop_bandwidth(governor)
+
+    records = select_runs(read_report(report_path), run_id=writer.run_id)
+    if not dry_run:
+        save_inventory_after_run(inventory, discovered, records)
+
+    global_report = print_report(records)
+    global_report["pipeline"] = report.get("pipeline")
+    console.print(f"[dim]Отчёт по репозиториям: {report_path} (run_id={writer.run_id})[/dim]")
+    if lease is not None:
+        console.print(
+            f"[dim]Перенесено другими хостами: {report.get('other_hosts', 0)}. "
+            "Общая сводка: bb2gf report -f <отчёт хоста 1> -f <отчёт хоста 2> ... --json report_all.json[/dim]"
+        )
 
     try:
         with open("report_all.json", "w", encoding="utf-8") as f:
@@ -283,16 +657,499 @@ def migrate(
     except Exception:
         pass
 
+def save_inventory_after_run(inventory: InventoryStore, discovered: list, records: list) -> None:
+    """
+    Снимки inventory после migrate. Упавшие в этом прогоне (записи item со статусом
+    FAILED в отчёте JSON Lines) остаются в снимке прежними — следующий --delta возьмёт их снова.
+    """
+    failed = {
+        (it.get("base_url"), it.get("project_key"), it.get("repo"))
+        for it in records if it.get("record") == "item" and it.get("status") == "FAILED"
+    }
+    for entry in discovered:
+        if entry["error"]:
+            continue
+        failed_repos = [
+            r for r in entry["repos"]
+            if (entry["base_url"], entry["project_key"], r.get("name") or r.get("slug")) in failed
+        ]
+        inventory.save(
+            entry["base_url"], entry["project_key"],
+            snapshot_after_run(entry["previous"], entry["repos"], failed_repos),
+            taken_at=entry["taken_at"],
+        )
+
+@app.command()
+def report(
+    paths: list[str] = typer.Option(
+        None, "--file", "-f",
+        help="Файл отчёта JSON Lines (по умолчанию REPORT_JSONL или report.jsonl); несколько — объединить отчёты хостов",
+    ),
+    run_id: str = typer.Option(None, "--run", help="run_id прогона (по умолчанию последний)"),
+    all_runs: bool = typer.Option(
+        False, "--all-runs", help="Все прогоны: по каждому репозиторию — последняя запись (итог серии --resume)"
+    ),
+    json_out: str = typer.Option(None, "--json", help="Сохранить сводку по проектам вместе с элементами в JSON-файл"),
+    list_runs: bool = typer.Option(False, "--list-runs", help="Показать прогоны в файле и выйти"),
+):
+    """Сводные таблицы по потоку записей migrate (JSON Lines) — в том числе прерванного прогона."""
+    load_dotenv()
+    cfg = load_yaml("config.yml") if os.path.exists("config.yml") else {}
+    paths = list(paths or []) or [report_path_from(os.environ, cfg)]
+    for path in paths:
+        if not os.path.exists(path):
+            typer.echo(f"Файл отчёта не найден: {path}", err=True)
+            raise typer.Exit(2)
+    if list_runs:
+        for path in paths:
+            records = read_report(path)
+            if len(paths) > 1:
+                console.print(f"[bold]{path}[/bold]")
+            for rid in run_ids(records):
+                n = sum(1 for r in records if r.get("run_id") == rid and r.get("record") == "item")
+                finished = any(r.get("run_id") == rid and r.get("record") == "run" for r in records)
+                console.print(f"{rid}  репозиториев: {n}" + ("" if finished else "  [yellow](не завершён)[/yellow]"))
+        return
+    selected = merge_reports(paths, run_id=run_id, all_runs=all_runs)
+    if not selected:
+        typer.echo("В отчёте нет записей выбранного прогона", err=True)
+        raise typer.Exit(1)
+    global_report = print_report(selected)
+    if json_out:
+        items = [r for r in selected if r.get("record") == "item"]
+        for p in global_report["projects"]:
+            p["summary"]["items"] = [
+                it for it in items
+                if it.get("project_key") == p["project_key"] and it.get("base_url") == p["base_url"]
+            ]
+        with open(json_out, "w", encoding="utf-8") as f:
+            json.dump(global_report, f, ensure_ascii=False, indent=2)
+        console.print(f"[green]Сводка сохранена[/green]: {json_out}")
+
+@app.command()
+def sync(
+    project_url: list[str] = typer.Option(
+        None, "--project-url", "-u", help="URL проекта Bitbucket (можно несколько)"
+    ),
+    project_key: list[str] = typer.Option(
+        None, "--project-key", "-k", help="Ключ проекта (можно несколько, используется с BITBUCKET_BASE_URL)"
+    ),
+    dry_run: bool = typer.Option(None, help="Сухой прогон: показать изменения без push"),
+    jobs: int = typer.Option(
+        None, "--jobs", "-j", help="Число параллельно синхронизируемых репозиториев (переопределяет MIGRATE_CONCURRENCY из .env)"
+    ),
+    bandwidth_limit: str = typer.Option(
+        None, "--bandwidth", help="Общий лимит полосы на все передачи, байт/с, напр. 50M (переопределяет BANDWIDTH_LIMIT)"
+    ),
+):
+    """Инкрементальная синхронизация: пушит в GitFlic только refs, изменившиеся с прошлого прогона."""
+    load_dotenv()
+
+    env = os.environ
+    cfg = load_yaml("config.yml") if os.path.exists("config.yml") else {}
+    naming_engine = make_naming_engine(cfg)
+    targets = require_targets(env, project_url, project_key)
+    global_owner_alias = resolve_global_owner_alias(env, targets)
+    get_bb_client, bb_git_user, bb_git_pass = make_bb_client_factory(env)
+
+    use_ssh = (env.get("USE_SSH", "false").lower() == "true")
+    gf_git_user = env.get("GITFLIC_GIT_USERNAME")
+    gf_git_pass = env.get("GITFLIC_GIT_PASSWORD")
+    if dry_run is None:
+        dry_run = (env.get("DRY_RUN", "false").lower() == "true")
+    jobs = env_jobs(env, jobs)
+    workdir = env.get("WORKDIR", "/tmp/migrate-bb-to-gf")
+    if not os.path.isdir(workdir):
+        typer.echo(f"Рабочая директория {workdir} не найдена — сначала выполните migrate с KEEP_CLONES=true", err=True)
+        raise typer.Exit(2)
+    state = StateStore.for_workdir(workdir)
+    push_batch, push_batch_jobs = env_push_batch(env, None)
+    lfs_engine = make_lfs_engine(env, workdir, state)
+
+    totals = {"total": 0, "synced": 0, "unchanged": 0, "refs_updated": 0, "refs_deleted": 0, "skipped": 0, "errors": 0}
+    sync_tbl = Table(box=box.SIMPLE_HEAVY)
+    sync_tbl.add_column("Проект", style="bold")
+    for col in ("Всего", "Синхр.", "Без изменений", "Refs обновлено", "Refs удалено", "Пропущено", "Ошибок"):
+        sync_tbl.add_column(col)
+
+    governor = make_bandwidth(env, cfg, bandwidth_limit)
+    if governor is not None:
+        console.print(f"[cyan]Полоса: {governor.describe()}[/cyan]", highlight=False)
+        bandwidth.install(governor.start())
+    try:
+        for bb_base, key in targets:
+            owner_alias = (global_owner_alias or str(key)).strip().lower()
+            console.rule(f"[bold]Синхронизация: проект {key}[/bold]")
+            repos = get_bb_client(bb_base).list_repositories(project_key=key)
+            report = sync_repositories(
+                repos=repos,
+                owner_alias=owner_alias,
+                use_ssh=use_ssh,
+                dry_run=dry_run,
+                workdir=workdir,
+                gf_git_user=gf_git_user,
+                gf_git_pass=gf_git_pass,
+                bb_git_user=bb_git_user,
+                bb_git_pass=bb_git_pass,
+                jobs=jobs,
+                state=state,
+                git_timeout=env_git_timeout(env),
+                push_batch=push_batch,
+                push_batch_jobs=push_batch_jobs,
+                lfs_engine=lfs_engine,
+                naming_engine=naming_engine,
+                report_path=cfg.get("report", {}).get("path", "report.json"),
+            )
+            for ksum in totals:
+                totals[ksum] += int(report.get(ksum, 0))
+            sync_tbl.add_row(key, *(str(report.get(k, 0)) for k in totals))
+    finally:
+        stop_bandwidth(governor)
+
+    console.print(sync_tbl)
+    console.print(Panel(
+        f"[bold]Всего:[/bold] {totals['total']}    "
+        f"[green]Синхронизировано:[/green] {totals['synced']}    "
+        f"Без изменений: {totals['unchanged']}    "
+        f"[yellow]Пропущено:[/yellow] {totals['skipped']}    "
+        f"[red]Ошибок:[/red] {totals['errors']}",
+        title="Сводка синхронизации", border_style="blue",
+    ))
+
+@app.command()
+def serve(
+    project_url: list[str] = typer.Option(
+        None, "--project-url", "-u", help="URL проекта Bitbucket (можно несколько)"
+    ),
+    project_key: list[str] = typer.Option(
+        None, "--project-key", "-k", help="Ключ проекта (можно несколько, используется с BITBUCKET_BASE_URL)"
+    ),
+    host: str = typer.Option(None, help="Адрес HTTP-приёма webhook (переопределяет SERVE_HOST, по умолчанию 127.0.0.1)"),
+    port: int = typer.Option(None, help="Порт HTTP-приёма webhook (переопределяет SERVE_PORT, по умолчанию 8787)"),
+    jobs: int = typer.Option(
+        None, "--jobs", "-j", help="Параллельно синхронизируемых репозиториев (переопределяет MIGRATE_CONCURRENCY из .env)"
+    ),
+    reconcile_on_start: bool = typer.Option(True, help="Сверить refs всех репозиториев сразу при запуске"),
+):
+    """Непрерывное зеркалирование: webhook repo:refs_changed из Bitbucket → push изменённых refs в GitFlic."""
+    load_dotenv()
+
+    env = os.environ
+    cfg = load_yaml("config.yml") if os.path.exists("config.yml") else {}
+    naming_engine = make_naming_engine(cfg)
+    targets = require_targets(env, project_url, project_key)
+    global_owner_alias = resolve_global_owner_alias(env, targets)
+    get_bb_client, bb_git_user, bb_git_pass = make_bb_client_factory(env)
+
+    workdir = env.get("WORKDIR", "/tmp/migrate-bb-to-gf")
+    if not os.path.isdir(workdir):
+        typer.echo(f"Рабочая директория {workdir} не найдена — сначала выполните migrate с KEEP_CLONES=true", err=True)
+        raise typer.Exit(2)
+    state = StateStore.for_workdir(workdir)
+    push_batch, push_batch_jobs = env_push_batch(env, None)
+    host = host or env.get("SERVE_HOST") or "127.0.0.1"
+    port = port or int(env.get("SERVE_PORT") or 8787)
+    secret = env.get("WEBHOOK_SECRET") or None
+    if not secret and host not in ("127.0.0.1", "localhost", "::1"):
+        console.print("[yellow]WEBHOOK_SECRET не задан — подпись webhook не проверяется[/yellow]")
+
+    service = MirrorService(
+        workdir=workdir,
+        state=state,
+        lfs_engine=make_lfs_engine(env, workdir, state),
+        naming_engine=naming_engine,
+        projects=targets,
+        list_repos=lambda base, key: get_bb_client(base).list_repositories(project_key=key),
+        owner_alias=global_owner_alias,
+        use_ssh=(env.get("USE_SSH", "false").lower() == "true"),
+        bb_git_user=bb_git_user,
+        bb_git_pass=bb_git_pass,
+        gf_git_user=env.get("GITFLIC_GIT_USERNAME"),
+        gf_git_pass=env.get("GITFLIC_GIT_PASSWORD"),
+        git_timeout=env_git_timeout(env),
+        push_batch=push_batch,
+        push_batch_jobs=push_batch_jobs,
+        workers=env_jobs(env, jobs),
+        delay=float(env.get("SERVE_COALESCE") or COALESCE_DELAY),
+        reconcile_interval=float(env.get("SERVE_RECONCILE_INTERVAL") or RECONCILE_INTERVAL),
+        secret=secret,
+    )
+    info = Table(box=box.SIMPLE_HEAVY, show_header=False)
+    info.add_row("Проекты", ", ".join(key for _base, key in targets))
+    info.add_row("Workdir", workdir)
+    info.add_row("Параллельно", str(service.workers))
+    info.add_row("Склейка событий", f"{service.queue.delay:g} с")
+    info.add_row("Сверка", f"каждые {service.reconcile_interval:g} с" if service.reconcile_interval > 0 else "выключена")
+    info.add_row("Подпись webhook", "проверяется" if secret else "не проверяется")
+    governor = make_bandwidth(env, cfg)
+    if governor is not None:
+        info.add_row("Полоса", governor.describe())
+    console.print(Panel(info, title="bb2gf serve", border_style="blue"))
+    if governor is not None:
+        bandwidth.install(governor.start())
+    try:
+        service.serve(host, port, reconcile_on_start=reconcile_on_start)
+    finally:
+        stop_bandwidth(governor)
+        state.close()
+
+@app.command()
+def verify(
+    path: str = typer.Option(None, "--file", "-f", help="Файл отчёта JSON Lines (по умолчанию REPORT_JSONL или report.jsonl)"),
+    run_id: str = typer.Option(None, "--run", help="run_id прогона (по умолчанию последний)"),
+    all_runs: bool = typer.Option(False, "--all-runs", help="Все прогоны: по каждому репозиторию — последняя запись"),
+    jobs: int = typer.Option(None, "--jobs", "-j", help="Параллельных проверок (переопределяет VERIFY_CONCURRENCY, по умолчанию 16)"),
+    lfs: bool = typer.Option(True, "--lfs/--no-lfs", help="Проверять наличие LFS-объектов в GitFlic (нужно зеркало в WORKDIR)"),
+    ignore_ref: list[str] = typer.Option(
+        None, "--ignore-ref", help="Не сравнивать refs с таким префиксом, напр. refs/pull-requests/ (можно несколько)"
+    ),
+    out: str = typer.Option(None, "--out", "-o", help=f"Файл отчёта о расхождениях (по умолчанию {VERIFY_REPORT})"),
+):
+    """Проверка перенесённых репозиториев: refs и SHA через git ls-remote, LFS — через batch API, без клонирования."""
+    load_dotenv()
+    env = os.environ
+    cfg = load_yaml("config.yml") if os.path.exists("config.yml") else {}
+    path = report_path_from(env, cfg, path)
+    if not os.path.exists(path):
+        typer.echo(f"Файл отчёта не найден: {path}", err=True)
+        raise typer.Exit(2)
+    workdir = env.get("WORKDIR", "/tmp/migrate-bb-to-gf")
+    if not os.path.isdir(workdir):
+        typer.echo(f"Рабочая директория {workdir} не найдена — адреса репозиториев берутся из state.db", err=True)
+        raise typer.Exit(2)
+    state = StateStore.for_workdir(workdir)
+    _get_bb_client, bb_git_user, bb_git_pass = make_bb_client_factory(env)
+    use_ssh = (env.get("USE_SSH", "false").lower() == "true")
+    gf_git_user = env.get("GITFLIC_GIT_USERNAME")
+    gf_git_pass = env.get("GITFLIC_GIT_PASSWORD")
+
+    items = [
+        r for r in select_runs(read_report(path), run_id=run_id, all_runs=all_runs)
+        if r.get("record") == "item" and r.get("status") != "SKIPPED"
+    ]
+    if not items:
+        typer.echo("В отчёте нет перенесённых репозиториев выбранного прогона", err=True)
+        raise typer.Exit(1)
+
+    entries = []
+    for it in items:
+        # отчёты до появления поля owner: владелец по умолчанию — project_key в lower
+        owner = it.get("owner") or str(it.get("project_key") or "").lower()
+        key = repo_key(owner, it.get("alias") or "")
+        entry = {"repo": it.get("repo"), "alias": it.get("alias"), "project_key": it.get("project_key"), "key": key}
+        saved = state.get_repo(key)
+        if not saved or not saved.get("src_url") or not saved.get("dst_url"):
+            entry["message"] = f"Нет адресов {key} в state.db"
+            entries.append(entry)
+            continue
+        src_url, dst_url = saved["src_url"], saved["dst_url"]
+        if (not use_ssh) and src_url.startswith("http"):
+            src_url = with_https_creds(src_url, bb_git_user, bb_git_pass)
+        if (not use_ssh) and dst_url.startswith("http"):
+            dst_url = with_https_creds(dst_url, gf_git_user, gf_git_pass)
+        entry.update(src_url=src_url, dst_url=dst_url, mirror=mirror_path(workdir, owner, it.get("alias") or ""))
+        entries.append(entry)
+
+    console.rule(f"[bold]Проверка: {len(entries)} репозиториев из {path}[/bold]")
+    summary = verify_repositories(
+        entries,
+        jobs=jobs or int(env.get("VERIFY_CONCURRENCY") or 16),
+        git_timeout=env_git_timeout(env),
+        lfs_engine=make_lfs_engine(env, workdir, state) if lfs else None,
+        ignore_prefixes=ignore_ref or [],
+        report_path=out or VERIFY_REPORT,
+    )
+
+    problems = [it for it in summary["items"] if it["status"] not in (VERIFY_MATCH, VERIFY_SKIPPED)]
+    if problems:
+        tbl = Table(title="Расхождения", box=box.SIMPLE_HEAVY)
+        for col in ("Проект", "Репозиторий", "Статус", "Сообщение"):
+            tbl.add_column(col)
+        for it in sorted(problems, key=lambda x: (x.get("project_key") or "", x.get("repo") or ""))[:50]:
+            tbl.add_row(it.get("project_key") or "", it.get("repo") or "", it["status"], it.get("message") or "")
+        console.print(tbl)
+        if len(problems) > 50:
+            console.print(f"[dim]... и ещё {len(problems) - 50}[/dim]")
+    console.print(Panel(
+        f"[bold]Всего:[/bold] {summary['total']}    "
+        f"[green]Совпадает:[/green] {summary['match']}    "
+        f"[red]Расхождений:[/red] {summary['diff']}    "
+        f"[red]Ошибок:[/red] {summary['errors']}    "
+        f"[yellow]Пропущено:[/yellow] {summary['skipped']}    "
+        f"[cyan]LFS проверено:[/cyan] {summary['lfs_checked']} репоз., нет объектов: {summary['lfs_missing']}",
+        title="Сводка проверки", border_style="blue",
+    ))
+    console.print(f"[dim]Отчёт о расхождениях: {out or VERIFY_REPORT}[/dim]")
+    if summary["diff"] or summary["errors"]:
+        raise typer.Exit(1)
+
+PLAN_FIELDS = ("project_key", "repo", "slug", "owner", "alias", "status", "message")
+
+@app.command()
+def plan(
+    project_url: list[str] = typer.Option(
+        None, "--project-url", "-u", help="URL проекта Bitbucket (можно несколько)"
+    ),
+    project_key: list[str] = typer.Option(
+        None, "--project-key", "-k", help="Ключ проекта (можно несколько, используется с BITBUCKET_BASE_URL)"
+    ),
+    fmt: str = typer.Option("table", "--format", help="Формат вывода: table, csv или json"),
+    output: str = typer.Option(None, "--output", "-o", help="Записать план в файл (по умолчанию — stdout)"),
+    problems: bool = typer.Option(False, "--problems", help="Только пропущенные фильтрами и коллизии"),
+):
+    """План именования: имя репозитория → alias в GitFlic, фильтры и коллизии alias (без изменений в GitFlic)."""
+    load_dotenv()
+    fmt = fmt.lower()
+    if fmt not in ("table", "csv", "json"):
+        typer.echo("--format должен быть table, csv или json", err=True)
+        raise typer.Exit(2)
+
+    env = os.environ
+    cfg = load_yaml("config.yml") if os.path.exists("config.yml") else {}
+    naming_engine = make_naming_engine(cfg)
+    targets = require_targets(env, project_url, project_key)
+    global_owner_alias = resolve_global_owner_alias(env, targets)
+    get_bb_client, _bb_git_user, _bb_git_pass = make_bb_client_factory(env)
+
+    # размеры для плана не нужны — только листинг
+    inventory, inventory_max_age, _sizes_max_age = make_inventory(env, env.get("WORKDIR", "/tmp/migrate-bb-to-gf"))
+    discovered = discover_targets(
+        targets,
+        get_bb_client,
+        global_owner_alias=global_owner_alias,
+        workers=int(env.get("DISCOVERY_CONCURRENCY") or 8),
+        with_sizes=False,
+        inventory=inventory,
+        max_age=inventory_max_age,
+    )
+    # сообщения — в stderr, чтобы не смешивать с планом в stdout
+    err = Console(stderr=True)
+    for entry in discovered:
+        if entry["error"]:
+            err.print(f"[red]{entry['project_key']}: {entry['error']}[/red]", highlight=False)
+    rows = naming_engine.plan(build_work_queue(discovered), global_owner_alias)
+    counts = {s: sum(1 for row in rows if row["status"] == s) for s in (PLAN_SKIPPED, PLAN_COLLISION)}
+    if problems:
+        rows = [row for row in rows if row["status"] != "OK"]
+
+    out = open(output, "w", encoding="utf-8", newline="") if output else sys.stdout
+    try:
+        if fmt == "csv":
+            w = csv.DictWriter(out, fieldnames=PLAN_FIELDS)
+            w.writeheader()
+            w.writerows(rows)
+        elif fmt == "json":
+            json.dump(rows, out, ensure_ascii=False, indent=2)
+            out.write("\n")
+        else:
+            tbl = Table(box=box.SIMPLE_HEAVY)
+            for col in ("Проект", "Репозиторий", "Владелец", "Alias", "Статус", "Сообщение"):
+                tbl.add_column(col)
+            style = {PLAN_SKIPPED: "yellow", PLAN_COLLISION: "red"}
+            for row in rows:
+                st = row["status"]
+                status = f"[{style[st]}]{st}[/{style[st]}]" if st in style else st
+                tbl.add_row(row["project_key"] or "", row["repo"], row["owner"], row["alias"], status, row["message"])
+            Console(file=out, width=None if out is sys.stdout else 200).print(tbl)
+    finally:
+        if output:
+            out.close()
+
+    total = sum(len(e["repos"]) for e in discovered)
+    err.print(
+        f"Репозиториев: {total}, пропущено фильтрами: {counts[PLAN_SKIPPED]}, "
+        f"с коллизией alias: {counts[PLAN_COLLISION]}" + (f"; план: {output}" if output else "")
+    )
+    if counts[PLAN_COLLISION] or any(e["error"] for e in discovered):
+        raise typer.Exit(1)
+
+inventory_app = typer.Typer(help="Снимки списка репозиториев проектов Bitbucket", add_completion=False)
+app.add_typer(inventory_app, name="inventory")
+
+@inventory_app.command("diff")
+def inventory_diff(
+    project_url: list[str] = typer.Option(
+        None, "--project-url", "-u", help="URL проекта Bitbucket (можно несколько)"
+    ),
+    project_key: list[str] = typer.Option(
+        None, "--project-key", "-k", help="Ключ проекта (можно несколько, используется с BITBUCKET_BASE_URL)"
+    ),
+    save: bool = typer.Option(False, "--save", help="Сохранить текущий список как новый снимок"),
+    json_out: str = typer.Option(None, "--json", help="Сохранить изменения в JSON-файл"),
+):
+    """Добавленные, удалённые и переименованные репозитории с прошлого снимка (снимок пишет migrate)."""
+    load_dotenv()
+
+    env = os.environ
+    targets = require_targets(env, project_url, project_key)
+    global_owner_alias = resolve_global_owner_alias(env, targets)
+    get_bb_client, _bb_git_user, _bb_git_pass = make_bb_client_factory(env)
+    inventory, _max_age, _sizes_max_age = make_inventory(env, env.get("WORKDIR", "/tmp/migrate-bb-to-gf"))
+
+    # всегда свежий листинг: сравнивать снимок с самим собой бессмысленно
+    discovered = discover_targets(
+        targets,
+        get_bb_client,
+        global_owner_alias=global_owner_alias,
+        workers=int(env.get("DISCOVERY_CONCURRENCY") or 8),
+        with_sizes=False,
+        inventory=inventory,
+    )
+    result, errors = [], 0
+    for entry in discovered:
+        if entry["error"]:
+            errors += 1
+            console.print(f"[red]{entry['project_key']}: {entry['error']}[/red]", highlight=False)
+            continue
+        diff = diff_inventory(entry["previous"], entry["repos"])
+        print_inventory_diff(entry, diff)
+        result.append({
+            "base_url": entry["base_url"],
+            "project_key": entry["project_key"],
+            "snapshot": entry["previous"] is not None,
+            "added": [r["slug"] for r in diff["added"]],
+            "removed": [r["slug"] for r in diff["removed"]],
+            "renamed": [{"old": pair["old"]["slug"], "new": pair["new"]["slug"]} for pair in diff["renamed"]],
+            "unchanged": diff["unchanged"],
+        })
+        if save:
+            inventory.save(entry["base_url"], entry["project_key"], entry["repos"], taken_at=entry["taken_at"])
+    if save:
+        console.print(f"[green]Снимки сохранены[/green]: {inventory.root}")
+    if json_out:
+        with open(json_out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        console.print(f"[green]Изменения сохранены[/green]: {json_out}")
+    if errors:
+        raise typer.Exit(1)
+
 @app.command("help")
 def help_cmd():
     """Краткая справка по командам."""
     typer.echo(
         "Использование:\n"
-        "  bb2gf migrate [ОПЦИИ]\n\n"
+        "  bb2gf migrate [ОПЦИИ]\n"
+        "  bb2gf sync [ОПЦИИ]       Догнать изменения в уже перенесённых репозиториях\n"
+        "  bb2gf serve [ОПЦИИ]      Приём webhook Bitbucket и push изменённых refs в GitFlic (параллельная работа)\n"
+        "  bb2gf inventory diff     Новые, удалённые и переименованные репозитории с прошлого migrate\n"
+        "  bb2gf plan [ОПЦИИ]       Имя → alias для всех репозиториев, фильтры и коллизии (--format csv|json, -o ФАЙЛ)\n"
+        "  bb2gf report [ОПЦИИ]     Сводка по отчёту report.jsonl (в том числе прерванного прогона)\n"
+        "  bb2gf verify [ОПЦИИ]     Сверка refs и LFS в Bitbucket и GitFlic по отчёту, без клонирования\n\n"
         "Опции migrate:\n"
         "  -u, --project-url TEXT   URL проекта Bitbucket (можно несколько)\n"
         "  -k, --project-key TEXT   Ключ проекта (можно несколько; требует BITBUCKET_BASE_URL в .env)\n"
-        "  --dry-run / --no-dry-run Сухой прогон (переопределяет DRY_RUN из .env)\n\n"
+        "  --dry-run / --no-dry-run Сухой прогон (переопределяет DRY_RUN из .env)\n"
+        "  -j, --jobs INTEGER       Число параллельных миграций (переопределяет MIGRATE_CONCURRENCY из .env)\n"
+        "  --fetch-jobs INTEGER     Одновременных clone из Bitbucket (по умолчанию = --jobs)\n"
+        "  --push-jobs INTEGER      Одновременных push в GitFlic (по умолчанию = --jobs)\n"
+        "  --queue-size INTEGER     Ёмкость очереди клонов, ожидающих push (по умолчанию = --push-jobs)\n"
+        "  --resume                 Продолжить прерванную миграцию с последнего завершённого этапа\n"
+        "  --object-cache           Общий кэш объектов для форков в WORKDIR/.objcache\n"
+        "  --disk-budget SIZE       Бюджет места в WORKDIR (напр. 200G); зеркала вытесняются по LRU\n"
+        "  --transfer MODE          mirror (по умолчанию) или relay: fetch и push порциями refs внахлёст\n"
+        "  --push-batch INTEGER     Пушить refs порциями (для репозиториев с десятками тысяч тегов)\n"
+        "  --delta                  Только репозитории, добавленные или переименованные с прошлого снимка\n"
+        "  --bandwidth RATE         Общий лимит полосы на все передачи, байт/с (напр. 50M)\n\n"
         "Примеры:\n"
         "  bb2gf migrate -u https://bitbucket/projects/SUP -u https://bitbucket/projects/MG\n"
         "  bb2gf migrate -k SUP -k MG   (при заданном BITBUCKET_BASE_URL в .env)\n"
@@ -0,0 +1,54 @@
+import os
+import subprocess
+
+import pytest
+
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "test",
+    "GIT_AUTHOR_EMAIL": "test@example.com",
+    "GIT_COMMITTER_NAME": "test",
+    "GIT_COMMITTER_EMAIL": "test@example.com",
+    "GIT_CONFIG_NOSYSTEM": "1",
+}
+
+
+def git(cwd: str, *args: str) -> str:
+    env = {**os.environ, **GIT_ENV}
+    return subprocess.run(
+        ["git", *args], cwd=cwd, env=env, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+@pytest.fixture
+def make_repo(tmp_path):
+    """Фабрика локальных репозиториев: рабочая копия с первым коммитом и голое зеркало (путь, url)."""
+
+    def make(name: str, files: dict | None = None):
+        work = tmp_path / "src" / name
+        work.mkdir(parents=True)
+        git(str(work), "init", "-q", "-b", "main")
+        for path, content in (files or {"README.md": name}).items():
+            target = work / path
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_text(content)
+        git(str(work), "add", "-A")
+        git(str(work), "commit", "-q", "-m", "init")
+        bare = tmp_path / "bb" / f"{name}.git"
+        git(str(tmp_path), "clone", "-q", "--bare", str(work), str(bare))
+        git(str(work), "remote", "add", "origin", str(bare))
+        return work, bare
+
+    return make
+
+
+@pytest.fixture
+def bare_dst(tmp_path):
+    """Пустые голые репозитории «GitFlic» по alias."""
+
+    def make(alias: str):
+        path = tmp_path / "gf" / f"{alias}.git"
+        path.mkdir(parents=True, exist_ok=True)
+        git(str(path), "init", "-q", "--bare")
+        return path
+
+    return make
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from src.clients.bitbucket_server import AsyncBitbucketServerClient
+from src.clients.gitflic import AsyncGitFlicClient
+from src.clients.ratelimit import RateController
+
+
+def _repo(n: int) -> dict:
+    return {
+        "id": n,
+        "name": f"Repo {n}",
+        "slug": f"repo-{n}",
+        "links": {"clone": [{"name": "http", "href": f"http://bb/scm/p/repo-{n}.git"}]},
+    }
+
+
+def _fast_rate(name: str) -> RateController:
+    rate = RateController(name, max_wait=5.0)
+    rate._delay = lambda attempt: 0.0
+    return rate
+
+
+def test_bitbucket_list_many_pages_through_rate_controller():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url)
+        key = request.url.path.split("/")[-2]
+        start = int(request.url.params["start"])
+        if key == "A" and len(calls) == 1:
+            return httpx.Response(503, headers={"Retry-After": "0"})
+        if start == 0:
+            return httpx.Response(200, json={"values": [_repo(1)], "isLastPage": False, "nextPageStart": 1})
+        return httpx.Response(200, json={"values": [_repo(2)], "isLastPage": True})
+
+    rate = _fast_rate("bb")
+
+    async def run():
+        async with AsyncBitbucketServerClient(
+            "http://bb", username="u", password="p", rate=rate, transport=httpx.MockTransport(handler)
+        ) as bb:
+            return await bb.list_many(["A", "B"])
+
+    result = asyncio.run(run())
+    assert [r["slug"] for r in result["A"]] == ["repo-1", "repo-2"]
+    assert [r["slug"] for r in result["B"]] == ["repo-1", "repo-2"]
+    assert result["A"][0]["clone_http"] == "http://bb/scm/p/repo-1.git"
+    assert rate.stats["throttled"] == 1
+    assert rate.stats["retries"] == 1
+    assert rate._in_flight == 0
+
+
+def test_bitbucket_client_error_not_retried():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(1)
+        return httpx.Response(404)
+
+    async def run():
+        async with AsyncBitbucketServerClient(
+            "http://bb", rate=_fast_rate("bb"), transport=httpx.MockTransport(handler)
+        ) as bb:
+            await bb.list_repositories("A")
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())
+    assert len(calls) == 1
+
+
+def test_gitflic_create_projects_retries_network_errors_and_respects_limit():
+    active, peak, failed = [0], [0], set()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        alias = request.read().decode()
+        if alias not in failed:
+            failed.add(alias)
+            raise httpx.ConnectError("reset", request=request)
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        return httpx.Response(200, json={"alias": alias})
+
+    rate = RateController("gf", max_concurrency=2, failure_threshold=10, max_wait=5.0)
+    rate._delay = lambda attempt: 0.0
+
+    async def run():
+        async with AsyncGitFlicClient("http://gf", "token", rate=rate, transport=httpx.MockTransport(handler)) as gf:
+            return await gf.create_projects([f"p{i}" for i in range(6)], concurrency=6)
+
+    results = asyncio.run(run())
+    assert all(ok for ok, _status, _data in results)
+    assert rate.stats["errors"] == 6
+    assert peak[0] <= 2
+    assert rate._in_flight == 0
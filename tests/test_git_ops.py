@@ -0,0 +1,19 @@
+from src.core.git_ops import cat_file_batch, cat_file_stream
+
+from conftest import git
+
+
+def test_cat_file_batch_reads_contents_and_missing(make_repo):
+    work, _bare = make_repo("cat", {"a.txt": "alpha\n", "b.bin": "\x00\n\n"})
+    blobs = cat_file_batch(str(work), ["HEAD:a.txt", "HEAD:b.bin", "HEAD:nope"])
+    assert blobs == {"HEAD:a.txt": b"alpha\n", "HEAD:b.bin": b"\x00\n\n", "HEAD:nope": None}
+
+
+def test_cat_file_stream_check_and_early_stop(make_repo):
+    work, _bare = make_repo("stream", {"a.txt": "alpha\n"})
+    head = git(str(work), "rev-parse", "HEAD")
+    seen = []
+    cat_file_stream(str(work), [head, "HEAD:a.txt"] * 500, lambda spec, data: seen.append(data) or len(seen) == 3, check=True)
+    assert len(seen) == 3
+    assert seen[0].split()[:2] == [head.encode(), b"commit"]
+    assert seen[1].split()[1:] == [b"blob", b"6"]
@@ -0,0 +1,86 @@
+from src.core.inventory import InventoryStore
+from src.core.migrator import migrate_repositories
+from src.core.naming import NamingEngine
+from src.core.report import ReportWriter, read_report, select_runs
+from src.main import save_inventory_after_run
+
+BASE_URL = "http://bb.example"
+
+
+class FakeGitFlic:
+    def __init__(self, bare_dst) -> None:
+        self.bare_dst = bare_dst
+
+    def list_projects(self, owner, owner_type):
+        return []
+
+    def get_project(self, owner, alias):
+        return None
+
+    def create_project(self, payload):
+        path = self.bare_dst(payload["alias"])
+        return True, 200, {"alias": payload["alias"], "httpTransportUrl": str(path), "sshTransportUrl": str(path)}
+
+
+def _repo(repo_id: int, name: str, url: str) -> dict:
+    return {
+        "id": repo_id,
+        "name": name,
+        "slug": name,
+        "description": "",
+        "clone_http": url,
+        "clone_ssh": None,
+        "project_key": "P",
+        "base_url": BASE_URL,
+        "owner_alias": "team",
+    }
+
+
+def test_failed_repo_stays_out_of_snapshot(tmp_path, monkeypatch, make_repo, bare_dst):
+    monkeypatch.chdir(tmp_path)
+    _work, bare = make_repo("good")
+    good = _repo(1, "good", str(bare))
+    # clone упадёт: такого репозитория нет
+    broken = _repo(2, "broken", str(tmp_path / "bb" / "missing.git"))
+    report_path = str(tmp_path / "report.jsonl")
+
+    with ReportWriter(report_path) as writer:
+        report = migrate_repositories(
+            repos=[good, broken],
+            owner_alias="team",
+            owner_type="TEAM",
+            visibility_private=True,
+            language_default="",
+            use_ssh=False,
+            dry_run=False,
+            workdir=str(tmp_path / "work"),
+            keep_clones=False,
+            bb_client=None,
+            gf_client=FakeGitFlic(bare_dst),
+            gf_git_user=None,
+            gf_git_pass=None,
+            bb_git_user=None,
+            bb_git_pass=None,
+            report_writer=writer,
+            naming_engine=NamingEngine(),
+            report_path=str(tmp_path / "report.json"),
+        )
+    assert report.get("items", []) == []  # с writer элементы идут только в JSON Lines
+
+    records = select_runs(read_report(report_path), run_id=writer.run_id)
+    statuses = {r["repo"]: r["status"] for r in records if r.get("record") == "item"}
+    assert statuses == {"good": "OK", "broken": "FAILED"}
+
+    inventory = InventoryStore(str(tmp_path / "inventory"))
+    discovered = [{
+        "base_url": BASE_URL,
+        "project_key": "P",
+        "repos": [good, broken],
+        "error": None,
+        "previous": None,
+        "taken_at": 1.0,
+    }]
+    save_inventory_after_run(inventory, discovered, records)
+
+    snap = inventory.load(BASE_URL, "P")
+    assert [r["slug"] for r in snap["repos"]] == ["good"]
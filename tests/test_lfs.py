@@ -0,0 +1,94 @@
+import hashlib
+
+import pytest
+
+from src.core import lfs
+from src.core.git_ops import list_refs
+from src.core.lfs import LfsEngine, LfsError
+from src.core.state import StateStore
+
+from conftest import git
+
+
+@pytest.fixture
+def fake_lfs(monkeypatch):
+    """Подменяет вызовы git-lfs: version → заданная строка, остальные команды записываются."""
+    calls = []
+
+    def install(version: str, ls_files: str = '{"files": []}'):
+        def run(cmd, **kwargs):
+            calls.append(cmd)
+            if cmd == "git lfs version":
+                return version
+            if "ls-files --json" in cmd:
+                return ls_files
+            if "ls-files --long --size" in cmd:
+                return "4d7a214614ab2935c943f9e0ff69d22eadbb8f32b1258daaa5e2ca24d17e2393 * big.bin (1.5 KB)\n"
+            return ""
+
+        monkeypatch.setattr(lfs, "run", run)
+        monkeypatch.setattr(lfs, "list_refs", lambda path: {"refs/heads/main": "0" * 40})
+        return calls
+
+    return install
+
+
+def test_scan_uses_json_on_new_git_lfs(tmp_path, fake_lfs):
+    calls = fake_lfs("git-lfs/3.4.1 (GitHub; linux amd64; go 1.21.5)", '{"files": [{"oid": "ab", "size": 7}]}')
+    assert LfsEngine(str(tmp_path)).scan(str(tmp_path)) == {"ab": 7}
+    assert not any("--long" in c for c in calls)
+
+
+def test_scan_falls_back_to_text_on_old_git_lfs(tmp_path, fake_lfs):
+    calls = fake_lfs("git-lfs/2.13.3 (GitHub; linux amd64; go 1.16)")
+    objects = LfsEngine(str(tmp_path)).scan(str(tmp_path))
+    assert objects == {"4d7a214614ab2935c943f9e0ff69d22eadbb8f32b1258daaa5e2ca24d17e2393": 1536}
+    assert not any("--json" in c for c in calls)
+
+
+def test_scan_error_is_not_mistaken_for_old_git_lfs(tmp_path, monkeypatch, fake_lfs):
+    fake_lfs("git-lfs/3.4.1")
+
+    def failing(cmd, **kwargs):
+        if cmd == "git lfs version":
+            return "git-lfs/3.4.1"
+        raise RuntimeError("Command failed: git lfs ls-files --json --all\nSTDERR:\nfatal: bad object")
+
+    monkeypatch.setattr(lfs, "run", failing)
+    with pytest.raises(LfsError):
+        LfsEngine(str(tmp_path)).scan(str(tmp_path))
+
+
+def _pointer_text(content: str) -> str:
+    oid = hashlib.sha256(content.encode()).hexdigest()
+    return f"version https://git-lfs.github.com/spec/v1\noid sha256:{oid}\nsize {len(content)}\n"
+
+
+def test_detect_finds_nested_gitattributes(tmp_path, make_repo):
+    work, _bare = make_repo("nested", {
+        "README.md": "x",
+        "assets/.gitattributes": "*.psd filter=lfs diff=lfs merge=lfs -text\n",
+    })
+    assert LfsEngine(str(tmp_path / "work")).detect(str(work))
+
+
+def test_detect_finds_pointers_in_history_without_attributes(tmp_path, monkeypatch, make_repo):
+    work, _bare = make_repo("history", {"README.md": "x", "big.bin": _pointer_text("payload")})
+    git(str(work), "rm", "-q", "big.bin")
+    git(str(work), "commit", "-q", "-m", "drop lfs")
+    monkeypatch.setattr(lfs, "POINTER_BATCH", 1)
+    assert LfsEngine(str(tmp_path / "work")).detect(str(work))
+
+
+def test_detect_plain_repo_and_stale_negative_cache(tmp_path, make_repo):
+    work, _bare = make_repo("plain", {"README.md": "x", "src/main.py": "print('hi')\n"})
+    state = StateStore(str(tmp_path / "state.db"))
+    engine = LfsEngine(str(tmp_path / "work"), state=state)
+    assert not engine.detect(str(work))
+
+    lfs_work, _ = make_repo("lfs", {"sub/.gitattributes": "*.bin filter=lfs\n"})
+    tip = list(list_refs(str(lfs_work)).values())[0]
+    # отрицательный результат прежней версии (без mode) не мешает новой проверке
+    state._db.execute("INSERT INTO lfs_tips (sha, has_lfs, mode) VALUES (?, 0, NULL)", (tip,))
+    assert engine.detect(str(lfs_work))
+    assert state.lfs_tips([tip], mode="tips") == {tip: True}
@@ -0,0 +1,55 @@
+from src.core.projects import ProjectIndex
+
+
+class FakeGitFlic:
+    def __init__(self, listing, projects) -> None:
+        self.listing = listing
+        self.projects = projects
+        self.get_calls = []
+        self.created = []
+
+    def list_projects(self, owner, owner_type):
+        return self.listing
+
+    def get_project(self, owner, alias):
+        self.get_calls.append((owner, alias))
+        return self.projects.get(alias)
+
+    def create_project(self, payload):
+        self.created.append(payload)
+        return False, 409, "exists"
+
+
+FULL = {
+    "alias": "repo",
+    "httpTransportUrl": "https://gf.example/team/repo.git",
+    "sshTransportUrl": "git@gf.example:team/repo.git",
+}
+
+
+def payload(alias: str) -> dict:
+    return {"ownerAlias": "team", "alias": alias}
+
+
+def test_existing_project_without_transport_urls_is_fetched():
+    gf = FakeGitFlic(listing=[{"alias": "repo", "title": "Repo"}], projects={"repo": FULL})
+    index = ProjectIndex(gf, "TEAM")
+    assert index.ensure(payload("repo")) == ("exists", 200, FULL)
+    assert gf.get_calls == [("team", "repo")]
+    assert gf.created == []
+    # полный проект запомнен в индексе: повторный запрос не нужен
+    assert index.ensure(payload("repo")) == ("exists", 200, FULL)
+    assert len(gf.get_calls) == 1
+
+
+def test_existing_project_with_transport_urls_used_from_listing():
+    gf = FakeGitFlic(listing=[FULL], projects={})
+    assert ProjectIndex(gf, "TEAM").ensure(payload("repo")) == ("exists", 200, FULL)
+    assert gf.get_calls == []
+
+
+def test_existing_project_without_transport_urls_fails_when_not_fetched():
+    gf = FakeGitFlic(listing=[{"alias": "repo"}], projects={})
+    result, _code, message = ProjectIndex(gf, "TEAM").ensure(payload("repo"))
+    assert result == "failed"
+    assert "transport URL" in message
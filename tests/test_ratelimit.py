@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+import requests
+
+from src.clients.ratelimit import RateController
+
+
+class _Resp:
+    def __init__(self, status_code: int, headers: dict | None = None) -> None:
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def test_non_network_exception_releases_slot():
+    rate = RateController("test", max_concurrency=1, max_wait=1.0)
+
+    def boom():
+        raise ValueError("hook")
+
+    with pytest.raises(ValueError):
+        rate.request(boom)
+    assert rate._in_flight == 0
+    assert rate.stats["errors"] == 0
+    # слот свободен: следующий запрос проходит сразу
+    assert rate.request(lambda: _Resp(200)).status_code == 200
+
+
+def test_non_network_exception_in_half_open_releases_probe():
+    rate = RateController("test", failure_threshold=1, cooldown=0.0, max_wait=2.0)
+    with pytest.raises(requests.ConnectionError):
+        rate.request(lambda: (_ for _ in ()).throw(requests.ConnectionError()), attempts=1)
+    assert rate.circuit_open
+
+    def boom():
+        raise ValueError("adapter")
+
+    with pytest.raises(ValueError):
+        rate.request(boom)
+    assert not rate._probing
+    # исход пробного запроса неизвестен — автомат остаётся разомкнутым до следующей пробы
+    assert rate.circuit_open
+    done = threading.Event()
+    threading.Thread(target=lambda: (rate.request(lambda: _Resp(200)), done.set())).start()
+    assert done.wait(1.0)
+    assert not rate.circuit_open
+
+
+def test_network_errors_retried_and_counted():
+    rate = RateController("test", max_attempts=3)
+    rate._delay = lambda attempt: 0.0
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise requests.ConnectionError()
+        return _Resp(200)
+
+    assert rate.request(flaky).status_code == 200
+    assert len(calls) == 3
+    assert rate.stats["errors"] == 2
+    assert rate._in_flight == 0
+
+
+def test_client_errors_not_retried():
+    rate = RateController("test")
+    calls = []
+    resp = rate.request(lambda: calls.append(1) or _Resp(404))
+    assert resp.status_code == 404
+    assert len(calls) == 1
+    assert rate.stats["errors"] == 0
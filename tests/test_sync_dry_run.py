@@ -0,0 +1,63 @@
+import pytest
+
+from src.core.git_ops import list_refs
+from src.core.lfs import LfsEngine
+from src.core.state import StateStore
+from src.core.sync import sync_mirror
+
+from conftest import git
+
+
+@pytest.fixture
+def synced(tmp_path, make_repo, bare_dst):
+    """Зеркало, перенесённое в GitFlic, и новые изменения в Bitbucket после переноса."""
+    work, bare = make_repo("repo")
+    for branch in ("old", "keep"):
+        git(str(work), "branch", branch)
+    git(str(work), "tag", "-a", "v1", "-m", "v1")
+    git(str(work), "push", "-q", "origin", "main", "old", "keep", "v1")
+
+    mirror = tmp_path / "work" / "team" / "repo.git"
+    git(str(tmp_path), "clone", "-q", "--mirror", str(bare), str(mirror))
+    dst = bare_dst("repo")
+    git(str(mirror), "push", "-q", "--mirror", str(dst))
+    state = StateStore(str(tmp_path / "state.db"))
+    state.set_pushed_refs("team/repo", list_refs(str(mirror)))
+
+    (work / "new.txt").write_text("new")
+    git(str(work), "add", "new.txt")
+    git(str(work), "commit", "-q", "-m", "new")
+    git(str(work), "branch", "feature")
+    git(str(work), "push", "-q", "origin", "main", "feature", ":old")
+    return work, bare, mirror, dst, state
+
+
+@pytest.mark.parametrize("from_origin", [False, True])
+def test_dry_run_reports_changes_without_touching_mirror(tmp_path, synced, from_origin):
+    work, bare, mirror, dst, state = synced
+    mirror_before, dst_before = list_refs(str(mirror)), list_refs(str(dst))
+    config_before = (mirror / "config").read_text()
+    pushed_before = state.pushed_refs("team/repo")
+    head = git(str(work), "rev-parse", "HEAD")
+
+    result = sync_mirror(
+        str(mirror), "team/repo", None if from_origin else str(bare), str(dst), state,
+        LfsEngine(str(tmp_path / "work")), dry_run=True,
+    )
+
+    assert result["changed"] == {"refs/heads/main": head, "refs/heads/feature": head}
+    assert result["deleted"] == ["refs/heads/old"]
+    assert list_refs(str(mirror)) == mirror_before
+    assert (mirror / "config").read_text() == config_before
+    assert list_refs(str(dst)) == dst_before
+    assert state.pushed_refs("team/repo") == pushed_before
+
+
+def test_dry_run_limited_to_known_refs(tmp_path, synced):
+    work, bare, mirror, dst, state = synced
+    result = sync_mirror(
+        str(mirror), "team/repo", str(bare), str(dst), state, LfsEngine(str(tmp_path / "work")),
+        refs=["refs/heads/feature", "refs/heads/keep"], dry_run=True,
+    )
+    assert list(result["changed"]) == ["refs/heads/feature"]
+    assert result["deleted"] == []
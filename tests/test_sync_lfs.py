@@ -0,0 +1,87 @@
+import hashlib
+
+from src.core.git_ops import list_refs
+from src.core import lfs
+from src.core.lfs import LfsEngine
+from src.core.state import StateStore
+from src.core.sync import sync_mirror
+
+from conftest import git
+
+
+def pointer(content: str) -> tuple:
+    oid = hashlib.sha256(content.encode()).hexdigest()
+    text = f"version https://git-lfs.github.com/spec/v1\noid sha256:{oid}\nsize {len(content)}\n"
+    return oid, len(content), text
+
+
+class RecordingLfs(LfsEngine):
+    """git-lfs не нужен: fetch/push только записывают, какие объекты им переданы."""
+
+    def __init__(self, workdir: str) -> None:
+        super().__init__(workdir)
+        self._available = True
+        self.fetched, self.pushed = {}, {}
+
+    def fetch(self, repo_path, stats, objects, refs=None, remote_name="origin", timeout=None, on_progress=None):
+        self.fetched.update(objects)
+        return stats
+
+    def push(self, repo_path, stats, objects, remote_name, remote_url, only_objects=False, timeout=None, on_progress=None):
+        self.pushed.update(objects)
+        return stats
+
+
+def commit_pointer(work, path: str, content: str) -> tuple:
+    oid, size, text = pointer(content)
+    (work / path).write_text(text)
+    git(str(work), "add", path)
+    git(str(work), "commit", "-q", "-m", f"{path}: {content}")
+    return oid, size
+
+
+def test_sync_uploads_lfs_objects_of_intermediate_commits_on_all_changed_refs(tmp_path, make_repo, bare_dst):
+    work, bare = make_repo("lfsrepo", {".gitattributes": "*.bin filter=lfs diff=lfs merge=lfs -text\n"})
+    old_oid, _size = commit_pointer(work, "old.bin", "already migrated")
+    for branch in ("b1", "b2", "b3"):
+        git(str(work), "branch", branch)
+    git(str(work), "push", "-q", "origin", "main", "b1", "b2", "b3")
+
+    mirror = tmp_path / "work" / "team" / "lfsrepo.git"
+    git(str(tmp_path), "clone", "-q", "--mirror", str(bare), str(mirror))
+    dst = bare_dst("lfsrepo")
+    git(str(mirror), "push", "-q", "--mirror", str(dst))
+    state = StateStore(str(tmp_path / "state.db"))
+    state.set_pushed_refs("team/lfsrepo", list_refs(str(mirror)))
+
+    expected = {}
+    for branch in ("b1", "b2", "b3"):
+        git(str(work), "checkout", "-q", branch)
+        # два коммита в один файл: промежуточный объект на вершине уже не виден
+        for step in ("v1", "v2"):
+            oid, size = commit_pointer(work, f"{branch}.bin", f"{branch} {step}")
+            expected[oid] = size
+    git(str(work), "push", "-q", "origin", "b1", "b2", "b3")
+
+    engine = RecordingLfs(str(tmp_path / "work"))
+    result = sync_mirror(str(mirror), "team/lfsrepo", str(bare), str(dst), state, engine)
+
+    assert sorted(result["changed"]) == ["refs/heads/b1", "refs/heads/b2", "refs/heads/b3"]
+    assert engine.fetched == expected
+    assert engine.pushed == expected
+    assert old_oid not in engine.pushed
+    assert result["lfs"]["objects"] == 6
+    assert state.pushed_refs("team/lfsrepo") == list_refs(str(mirror))
+
+
+def test_scan_range_ignores_history_already_pushed(tmp_path, monkeypatch, make_repo):
+    monkeypatch.setattr(lfs, "POINTER_BATCH", 2)  # несколько порций cat-file
+    work, _bare = make_repo("plain", {"README.md": "x"})
+    base = git(str(work), "rev-parse", "HEAD")
+    oid, size = commit_pointer(work, "a.bin", "new")
+    tip = git(str(work), "rev-parse", "HEAD")
+    engine = LfsEngine(str(tmp_path / "work"))
+    assert engine.scan_range(str(work), [tip], [base]) == {oid: size}
+    assert engine.scan_range(str(work), [tip], [tip]) == {}
+    # исключённая вершина, которой уже нет в зеркале, не ломает скан
+    assert engine.scan_range(str(work), [tip], ["0" * 40]) == {oid: size}